@@ -1,11 +1,32 @@
+import numpy as np
 import pandas as pd
 import os
+import sys
+import argparse
 from pathlib import Path
 from categorization import SMSCategorizer
+from instrumentation import RunInstrumentation, NULL_INSTRUMENTATION
+from error_analytics import ErrorAnalytics, error_mask, find_date_column, find_error_column
+from campaign_clusterer import IncrementalCampaignClusterer
+from heavy_hitters import TemplateTracker
+from preview import ReservoirSample, DEFAULT_SAMPLE_SIZE, preview_categories, sample_file, format_preview
+from work_queue import MANIFEST, WorkQueue, run_worker, merge_outputs, default_worker_id
+from checkpoint import BatchCheckpoint, CHECKPOINT_ROWS
+from result_store import ResultStore
+from excel_export import write_excel
 import warnings
 from datetime import datetime
 import glob
 
+# Messages categorized between progress lines
+PROGRESS_ROWS = 10_000
+
+# Heaviest templates printed per category
+SAMPLE_TEMPLATES = 3
+
+# Campaigns, templates and hours with fewer messages are left out of the printed error breakdowns
+ERROR_BREAKDOWN_MIN_MESSAGES = 20
+
 def find_text_column(df):
     """Find the most likely text column in a DataFrame"""
     text_col_candidates = [col for col in df.columns if 'text' in col.lower() or 'message' in col.lower() or 'sms' in col.lower()]
@@ -14,70 +35,225 @@ def find_text_column(df):
     else:
         return df.columns[0]  # Return first column if no obvious text column found
 
-def process_excel_file(file_path, categorizer):
-    """Process a single Excel file and return categorized results"""
+def process_excel_file(file_path, categorizer, instrumentation=None, rule_pack=None, rows=None, keep_empty=False):
+    """Process a single Excel file and return categorized results
+
+    ``rows`` = (start, stop) limits a CSV to that range of data rows (a queue shard).
+    ``keep_empty`` returns an empty results frame instead of None for a file without messages.
+    """
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    rule_pack = rule_pack or categorizer.rule_pack
     try:
         # Read the Excel file
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-        
-        # Find the text column
-        text_column = find_text_column(df)
-        
-        # Remove rows with missing text
-        df = df.dropna(subset=[str(text_column)])
-        
-        if len(df) == 0:
-            print(f"⚠️  No valid data found in {file_path}")
-            return None
-        
-        # Categorize messages
-        print(f"📝 Processing {len(df)} messages from {os.path.basename(file_path)}...")
-        
-        categories = []
-        for idx, message in enumerate(df[text_column]):
-            category = categorizer.pattern_based_categorization(
-                categorizer.preprocess_text(str(message))
-            )
-            categories.append(category)
-            
-            # Progress indicator for large files
-            if (idx + 1) % 100 == 0:
-                print(f"   Processed {idx + 1}/{len(df)} messages...")
-        
-        # Create results DataFrame
-        results_df = df[[text_column]].copy()
-        results_df['predicted_category'] = categories
-        results_df['source_file'] = os.path.basename(file_path)
-        results_df['processing_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        print(f"✅ Completed {os.path.basename(file_path)} - {len(results_df)} messages categorized")
-        return results_df
+        with instrumentation.stage('read', bytes_read=os.path.getsize(file_path)) as stage:
+            if file_path.endswith('.csv') and rows is not None:
+                start, stop = rows
+                df = pd.read_csv(file_path, skiprows=range(1, start + 1), nrows=stop - start)
+            elif file_path.endswith('.csv'):
+                df = pd.read_csv(file_path)
+            else:
+                df = pd.read_excel(file_path)
+            stage.rows = len(df)
+        return categorize_frame(df, file_path, categorizer, instrumentation, rule_pack, keep_empty)
         
     except Exception as e:
         print(f"❌ Error processing {file_path}: {str(e)}")
         return None
 
-def batch_categorize_sms(folder_path, output_file=None):
-    """Process all Excel/CSV files in a folder and combine results"""
+def categorize_frame(df, file_path, categorizer, instrumentation=None, rule_pack=None, keep_empty=False):
+    """Categorize the messages of a DataFrame read from ``file_path``
+
+    A frame without valid messages gives None, or an empty results frame with ``keep_empty``.
+    """
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    rule_pack = rule_pack or categorizer.rule_pack
+    # Find the text column
+    text_column = find_text_column(df)
     
-    # Initialize categorizer
-    print("🚀 Initializing SMS Categorizer...")
-    categorizer = SMSCategorizer()
+    # Remove rows with missing text
+    df = df.dropna(subset=[str(text_column)])
     
-    # Find all Excel and CSV files in the folder
+    if len(df) == 0:
+        print(f"⚠️  No valid data found in {file_path}")
+        if not keep_empty:
+            return None
+    
+    # Categorize messages
+    print(f"📝 Processing {len(df)} messages from {os.path.basename(file_path)}...")
+    
+    with instrumentation.stage('preprocess', rows=len(df)):
+        processed = [categorizer.preprocess_text(str(message)) for message in df[text_column]]
+    
+    # Through the categorizer's configured backend (rules or the distilled linear model)
+    categories = []
+    with instrumentation.stage('categorize', rows=len(df)):
+        for start in range(0, len(processed), PROGRESS_ROWS):
+            categories.extend(categorizer.categorize_processed(processed[start:start + PROGRESS_ROWS], rule_pack))
+            
+            # Progress indicator for large files
+            if len(processed) > PROGRESS_ROWS:
+                print(f"   Processed {len(categories)}/{len(df)} messages...")
+    
+    # Create results DataFrame (delivery errors and send times are kept for analytics)
+    error_column = find_error_column(df.columns)
+    date_column = find_date_column(df)
+    keep_columns = [text_column] + [c for c in (error_column, date_column) if c is not None]
+    results_df = df[keep_columns].copy()
+    results_df['predicted_category'] = categories
+    results_df['source_file'] = os.path.basename(file_path)
+    results_df['rule_pack_hash'] = rule_pack.short_hash
+    results_df['processing_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    print(f"✅ Completed {os.path.basename(file_path)} - {len(results_df)} messages categorized")
+    return results_df
+
+def process_file_checkpointed(file_path, categorizer, checkpoint, instrumentation=None, rule_pack=None,
+                              chunk_rows=CHECKPOINT_ROWS):
+    """Process a file chunk by chunk, committing every chunk to the checkpoint
+
+    Rows committed by an earlier, interrupted run are read back instead of being
+    categorized again. CSV files are streamed in ``chunk_rows`` chunks; Excel files
+    can't be streamed and are committed whole.
+    """
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    start, finished = checkpoint.progress(file_path)
+    results = checkpoint.load_results(file_path) if start else []
+    if finished:
+        print(f"⏭️  {os.path.basename(file_path)} already committed ({sum(map(len, results))} messages)")
+        return pd.concat(results, ignore_index=True) if results else None
+    if start:
+        print(f"↩️  Resuming {os.path.basename(file_path)} at row {start}")
+    
+    try:
+        if file_path.endswith('.csv'):
+            chunks = pd.read_csv(file_path, skiprows=range(1, start + 1), chunksize=chunk_rows)
+        else:
+            chunks = iter([pd.read_excel(file_path)])
+        # Read one chunk ahead so the last one can be committed as final
+        with instrumentation.stage('read') as stage:
+            chunk = next(chunks, None)
+            stage.rows = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            checkpoint.commit(file_path, None, start, 0, final=True)
+        while chunk is not None:
+            with instrumentation.stage('read') as stage:
+                next_chunk = next(chunks, None)
+                stage.rows = 0 if next_chunk is None else len(next_chunk)
+            chunk_results = categorize_frame(chunk, file_path, categorizer, instrumentation, rule_pack)
+            with instrumentation.stage('checkpoint', rows=len(chunk)):
+                checkpoint.commit(file_path, chunk_results, start, len(chunk), final=next_chunk is None)
+            if chunk_results is not None:
+                results.append(chunk_results)
+            start += len(chunk)
+            chunk = next_chunk
+    except Exception as e:
+        print(f"❌ Error processing {file_path} (committed up to row {start}): {str(e)}")
+        return None
+    return pd.concat(results, ignore_index=True) if results else None
+
+def find_input_files(folder_path):
+    """Return the Excel and CSV files in a folder"""
     folder = Path(folder_path)
     excel_files = []
     excel_files.extend(glob.glob(str(folder / "*.xlsx")))
     excel_files.extend(glob.glob(str(folder / "*.xls")))
     excel_files.extend(glob.glob(str(folder / "*.csv")))
+    return excel_files
+
+def preview_batch(folder_path, sample_size=DEFAULT_SAMPLE_SIZE, seed=None, match_timeout=None, rule_pack=None,
+                  confidence=0.95):
+    """Estimate the category mix of a folder from a uniform sample of its messages"""
+    print("🔎 Preview mode: sampling messages instead of categorizing every row")
+    categorizer = SMSCategorizer(match_timeout=match_timeout, rule_pack=rule_pack)
+    excel_files = find_input_files(folder_path)
+    if not excel_files:
+        print(f"❌ No Excel or CSV files found in {folder_path}")
+        return None
+    
+    # One reservoir across all files, so the sample is uniform over every message
+    reservoir = ReservoirSample(sample_size, seed)
+    for file_path in excel_files:
+        try:
+            sample_file(file_path, reservoir, find_text_column=find_text_column)
+        except Exception as e:
+            print(f"❌ Error sampling {file_path}: {str(e)}")
+    if reservoir.seen == 0:
+        print("❌ No messages found to sample")
+        return None
+    
+    preview = preview_categories(categorizer, reservoir.sample, reservoir.seen, confidence)
+    print(f"\n📊 Estimated Category Distribution ({len(excel_files)} files):")
+    for line in format_preview(preview):
+        print(f"   {line}")
+    return preview
+
+def batch_categorize_sms(folder_path, output_file=None, instrumentation=None, match_timeout=None,
+                         rule_pack=None, error_report=None, checkpoint_dir=None, resume=False,
+                         checkpoint_rows=CHECKPOINT_ROWS, sqlite_path=None, excel_file=None, backend='rules',
+                         linear_model=None, fresh=False):
+    """Process all Excel/CSV files in a folder and combine results
+
+    With ``checkpoint_dir`` every file (or chunk of a CSV) is committed to disk as
+    soon as it is categorized, and ``resume`` continues an interrupted run from the
+    last committed chunk. An existing checkpoint is never discarded implicitly: without
+    ``resume`` or ``fresh`` the run stops. ``sqlite_path`` also loads the results into a SQLite
+    ResultStore and ``excel_file`` also writes them as a workbook. ``backend='linear'``
+    categorizes with a trained DistilledLinearModel (``linear_model`` path), falling
+    back to the rules for low-confidence messages.
+    """
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    # Delivery error counts by category, template and hour, accumulated file by file.
+    # Campaign clustering pulls in scikit-learn and costs a pass per file, so the campaign
+    # breakdown is only built for an --error-report; one clusterer for the whole run
+    # keeps campaign IDs comparable across files
+    error_analytics = ErrorAnalytics()
+    clusterer = IncrementalCampaignClusterer() if error_report else None
+    # Top templates per category for this run only, in fixed memory however many files
+    template_tracker = TemplateTracker()
+    
+    # Initialize categorizer
+    print("🚀 Initializing SMS Categorizer...")
+    with instrumentation.stage('init'):
+        categorizer = SMSCategorizer(match_timeout=match_timeout, rule_pack=rule_pack, backend=backend,
+                                     linear_model=linear_model)
+    # Every file in the run is categorized with the same pack
+    pack = categorizer.rule_pack
+    print(f"📐 Rule pack: {pack.name} v{pack.version} ({pack.short_hash})")
+    if pack.lint:
+        severities = [finding['severity'] for finding in pack.lint]
+        print(f"🔍 Rule lint: {severities.count('error')} error(s), {severities.count('warning')} warning(s) "
+              f"about backtracking patterns - run python rule_lint.py for details")
+    
+    checkpoint = None
+    if checkpoint_dir:
+        checkpoint = BatchCheckpoint(checkpoint_dir)
+        if checkpoint.exists() and not (resume or fresh):
+            print(f"❌ {checkpoint_dir} holds the checkpoint of an unfinished run. Pass --resume to continue it "
+                  f"or --fresh to discard it and start over")
+            return None
+        if resume and checkpoint.exists():
+            try:
+                checkpoint.resume(folder_path, pack.short_hash)
+            except ValueError as e:
+                print(f"❌ Cannot resume: {e}")
+                return None
+            output_file = output_file or checkpoint.run['output_file']
+            print(f"↩️  Resuming from checkpoint {checkpoint_dir} ({len(checkpoint.records)} chunks committed)")
+        elif resume:
+            print(f"⚠️  No checkpoint found in {checkpoint_dir}, starting a new run")
+    
+    # Find all Excel and CSV files in the folder
+    excel_files = find_input_files(folder_path)
     
     if not excel_files:
         print(f"❌ No Excel or CSV files found in {folder_path}")
         return None
     
+    # Only started once there is something to process, so an empty run leaves an old checkpoint alone
+    if checkpoint is not None and checkpoint.run is None:
+        output_file = output_file_name(output_file)
+        checkpoint.start(folder_path, pack.short_hash, output_file)
+    
     print(f"📁 Found {len(excel_files)} files to process:")
     for file in excel_files:
         print(f"   - {os.path.basename(file)}")
@@ -89,10 +265,20 @@ def batch_categorize_sms(folder_path, output_file=None):
     for i, file_path in enumerate(excel_files, 1):
         print(f"\n📊 Processing file {i}/{len(excel_files)}: {os.path.basename(file_path)}")
         
-        results = process_excel_file(file_path, categorizer)
+        if checkpoint is not None:
+            results = process_file_checkpointed(file_path, categorizer, checkpoint, instrumentation, pack,
+                                                checkpoint_rows)
+        else:
+            results = process_excel_file(file_path, categorizer, instrumentation, pack)
         if results is not None:
             all_results.append(results)
             successful_files += 1
+            with instrumentation.stage('template_tracker', rows=len(results)):
+                templates = track_templates(template_tracker, results, categorizer)
+            error_column = find_error_column(results.columns)
+            if error_column is not None:
+                with instrumentation.stage('error_analytics', rows=len(results)):
+                    add_error_counts(error_analytics, results, error_column, categorizer, clusterer, templates)
     
     if not all_results:
         print("❌ No files were successfully processed")
@@ -100,59 +286,349 @@ def batch_categorize_sms(folder_path, output_file=None):
     
     # Combine all results
     print(f"\n🔄 Combining results from {successful_files} files...")
-    combined_df = pd.concat(all_results, ignore_index=True)
+    with instrumentation.stage('combine') as stage:
+        combined_df = pd.concat(all_results, ignore_index=True)
+        stage.rows = len(combined_df)
     
     # Add summary statistics
     print(f"📈 Total messages processed: {len(combined_df)}")
     print(f"📊 Categories found: {combined_df['predicted_category'].nunique()}")
     
+    if categorizer.timeout_stats['timeouts']:
+        stats = categorizer.timeout_stats
+        print(f"⏳ {stats['timeouts']} messages exceeded the matching budget "
+              f"({stats['fallback_matches']} categorized on truncated text, "
+              f"{stats['fallback_failures']} defaulted to 'Other')")
+    
+    if categorizer.backend == 'linear':
+        stats = categorizer.backend_stats
+        print(f"🧠 Linear model: {stats['model_predictions']} predicted, "
+              f"{stats['rule_fallbacks']} low-confidence messages sent to the rules")
+    
     # Show category distribution
     category_counts = combined_df['predicted_category'].value_counts()
     print("\n📊 Category Distribution:")
     for category, count in category_counts.items():
         percentage = (count / len(combined_df)) * 100
         print(f"   {category}: {count} ({percentage:.1f}%)")
+    print_sample_templates(template_tracker, category_counts.index)
     
-    # Save results
-    if output_file is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"batch_categorized_sms_{timestamp}.csv"
-    elif not output_file.endswith('.csv'):
-        output_file += '.csv'
+    if error_analytics.messages:
+        print(f"\n📡 Delivery errors: {error_analytics.errors} of {error_analytics.messages} "
+              f"messages ({error_analytics.error_rate * 100:.1f}%)")
+        for row in error_analytics.rates('category').itertuples(index=False):
+            print(f"   {row.category}: {row.errors}/{row.messages} ({row.error_rate * 100:.1f}%)")
+        if clusterer is not None:
+            error_analytics.relabel('campaign', clusterer.labels(error_analytics.rates('campaign')['campaign']))
+        for dimension, title in (('campaign', 'campaigns'), ('template', 'templates'), ('window', 'hours')):
+            worst = error_analytics.rates(dimension, min_messages=ERROR_BREAKDOWN_MIN_MESSAGES)
+            worst = worst[worst['errors'] > 0].sort_values('error_rate', ascending=False, kind='stable').head(5)
+            if len(worst):
+                print(f"   Highest error rates by {title} (at least {ERROR_BREAKDOWN_MIN_MESSAGES} messages):")
+                for row in worst.itertuples(index=False):
+                    key = str(getattr(row, dimension))
+                    key = key if len(key) <= 80 else key[:77] + '...'
+                    print(f"      {key}: {row.errors}/{row.messages} ({row.error_rate * 100:.1f}%)")
+        if error_report:
+            error_analytics.write_json(error_report)
+            print(f"📡 Error report written to: {error_report}")
     
-    combined_df.to_csv(output_file, index=False)
+    # Save results
+    output_file = output_file_name(output_file)
+    with instrumentation.stage('write', rows=len(combined_df)):
+        combined_df.to_csv(output_file, index=False)
     print(f"\n💾 Results saved to: {output_file}")
     print(f"📋 To open: Right-click the file → 'Open with' → Excel or Google Sheets")
     
+    if excel_file:
+        with instrumentation.stage('excel', rows=len(combined_df)):
+            write_excel_output(output_file, excel_file)
+    
+    if sqlite_path:
+        with instrumentation.stage('sqlite', rows=len(combined_df)):
+            rows = store_results(combined_df, sqlite_path, categorizer)
+        print(f"🗄️  {rows} messages stored in {sqlite_path}")
+    
+    if checkpoint is not None:
+        if successful_files == len(excel_files):
+            checkpoint.remove()
+        else:
+            # Failed files can be retried without redoing the ones that worked
+            print(f"♻️  Checkpoint kept in {checkpoint_dir}; rerun with --resume to retry the failed files")
+    
     return combined_df
+def write_excel_output(csv_file, excel_file, chunk_rows=100_000):
+    """Convert a results CSV to .xlsx chunk by chunk, splitting sheets at Excel's row limit"""
+    sheets = write_excel(excel_file, pd.read_csv(csv_file, chunksize=chunk_rows), 'predicted_category')
+    print(f"📗 Excel workbook saved to: {excel_file} ({len(sheets)} data sheet{'s' if len(sheets) > 1 else ''})")
+    return sheets
+
+def message_templates(categorizer, messages):
+    """Template of every message; each distinct message is templated once"""
+    codes, uniques = pd.factorize(pd.Series(messages).astype(str), sort=False)
+    templates = np.array([categorizer.extract_template(categorizer.preprocess_text(message)) for message in uniques],
+                         dtype=object)
+    return templates[codes]
+
+def track_templates(template_tracker, results, categorizer):
+    """Count a results frame's (category, template) pairs in a TemplateTracker; returns the templates"""
+    templates = message_templates(categorizer, results[find_text_column(results)])
+    template_tracker.add(results['predicted_category'], templates)
+    return templates
+
+def print_sample_templates(template_tracker, categories, sample_templates=SAMPLE_TEMPLATES):
+    """Print the heaviest templates of each category (estimated counts from the tracker)"""
+    print("\n📝 Sample Templates by Category:")
+    for category in categories:
+        top = template_tracker.top_templates(category, sample_templates)
+        if top:
+            print(f"   {category}:")
+            for template, count in top:
+                template = template if len(template) <= 100 else template[:97] + '...'
+                print(f"      [{count:,} msgs] {template}")
+
+def add_error_counts(error_analytics, results, error_column, categorizer, clusterer=None, templates=None):
+    """Count one file's delivery errors by category, template and send hour, and by campaign with a clusterer"""
+    if templates is None:
+        templates = message_templates(categorizer, results[find_text_column(results)])
+    campaigns = None
+    if clusterer is not None:
+        campaigns = clusterer.assign(templates, results['predicted_category'].to_numpy())
+    date_column = find_date_column(results)
+    error_analytics.add(results[error_column], category=results['predicted_category'], campaign=campaigns,
+                        template=templates, timestamps=results[date_column] if date_column is not None else None)
+
+def store_results(combined_df, sqlite_path, categorizer):
+    """Load batch results into a SQLite ResultStore, replacing earlier loads of the same files
+
+    Batch runs don't cluster campaigns, so the stored campaign_id is NULL.
+    """
+    text_column = find_text_column(combined_df)
+    templates = message_templates(categorizer, combined_df[text_column])
+    date_column = find_date_column(combined_df)
+    with ResultStore(sqlite_path) as store:
+        return store.add(combined_df, text_column, 'predicted_category', templates, 'source_file',
+                         date_column)
+
+def output_file_name(output_file=None):
+    """Default to a timestamped name and make sure the output is a CSV"""
+    if output_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"batch_categorized_sms_{timestamp}.csv"
+    if not output_file.endswith('.csv'):
+        return output_file + '.csv'
+    return output_file
+
+def run_distributed_worker(folder_path, queue_dir, match_timeout=None, rule_pack=None, shard_rows=None,
+                           worker_id=None, lease_seconds=120, heartbeat_seconds=15, backend='rules',
+                           linear_model=None):
+    """Work through a shared-directory queue of the folder's files alongside other hosts"""
+    worker_id = worker_id or default_worker_id()
+    categorizer = SMSCategorizer(match_timeout=match_timeout, rule_pack=rule_pack, backend=backend,
+                                 linear_model=linear_model)
+    pack = categorizer.rule_pack
+    queue = WorkQueue(queue_dir, lease_seconds, heartbeat_seconds)
+    # The first worker plans the shards; the rest check they run the same rules
+    manifest = queue.initialize(find_input_files(folder_path), pack.short_hash, shard_rows)
+    print(f"👷 Worker {worker_id} joined queue {queue_dir} ({len(manifest['shards'])} shards, "
+          f"rule pack {pack.short_hash})")
+    
+    def process_shard(shard):
+        rows = (shard['start'], shard['stop']) if shard['start'] is not None else None
+        # A shard without messages is finished with an empty output, not retried as a failure
+        return process_excel_file(shard['path'], categorizer, rule_pack=pack, rows=rows, keep_empty=True)
+    
+    def summarize_shard(results):
+        # Each shard's tracker goes into its completion record and is merged by --merge
+        template_tracker = TemplateTracker()
+        track_templates(template_tracker, results, categorizer)
+        return {'template_tracker': template_tracker.to_dict()}
+    
+    completed = run_worker(queue, process_shard, worker_id, summarize=summarize_shard)
+    print(f"👷 Worker {worker_id} completed {completed} shard(s); queue status: {queue.status()}")
+    return completed
+
+def merge_distributed(queue_dir, output_file=None, excel_file=None, allow_failed=False):
+    """Combine the per-shard outputs of a finished queue into one CSV
+
+    Shards that failed on every attempt block the merge unless ``allow_failed``, which
+    leaves them out of the output and lists them.
+    """
+    # Checked before WorkQueue creates its subdirectories in a folder that isn't a queue
+    if not os.path.exists(os.path.join(queue_dir, MANIFEST)):
+        print(f"❌ {queue_dir} is not a work queue (no {MANIFEST}); start workers with --queue --worker first")
+        return None
+    queue = WorkQueue(queue_dir)
+    status = queue.status()
+    if status.get('done', 0) + status.get('failed', 0) < status['total']:
+        print(f"❌ Queue not finished yet: {status}")
+        return None
+    failed = queue.failed()
+    if failed:
+        print(f"{'⚠️ ' if allow_failed else '❌'} {len(failed)} shard(s) failed on every attempt:")
+        for shard_id in failed:
+            print(f"   - {shard_id}")
+        if not allow_failed:
+            print("   Fix the input and rerun the workers, or pass --allow-failed to merge the other shards")
+            return None
+        print("   Merging the other shards without them")
+    output_file = output_file_name(output_file)
+    total, counts = merge_outputs(queue, output_file, skip=failed)
+    
+    print(f"📈 Total messages processed: {total}")
+    print("\n📊 Category Distribution:")
+    categories = sorted(counts, key=lambda category: -counts[category])
+    for category in categories:
+        percentage = (counts[category] / total) * 100 if total else 0
+        print(f"   {category}: {counts[category]} ({percentage:.1f}%)")
+    template_tracker = merge_template_trackers(queue, skip=failed)
+    if template_tracker is not None:
+        print_sample_templates(template_tracker, categories)
+    print(f"\n💾 Results saved to: {output_file}")
+    if excel_file:
+        write_excel_output(output_file, excel_file)
+    return total, counts
+
+def merge_template_trackers(queue, skip=()):
+    """Merge the TemplateTrackers in a queue's completion records (None if no shard has one)"""
+    merged = None
+    for shard in queue.manifest()['shards']:
+        record = queue.done_record(shard['id']) if shard['id'] not in skip else None
+        if record is None or 'template_tracker' not in record:
+            continue
+        tracker = TemplateTracker.from_dict(record['template_tracker'])
+        merged = tracker if merged is None else merged.merge(tracker)
+    return merged
+
 def error_column_percentage(df, error_column="ErrorName"):
     """Calculate the percentage of messages with a non-empty ErrorName."""
-    if error_column not in df.columns:
+    column = find_error_column(df.columns, error_column)
+    if column is None:
         return 0, 0, len(df)
-    error_count = df[error_column].notna().sum()
+    error_count = int(error_mask(df[column]).sum())
     total = len(df)
     percentage = (error_count / total) * 100 if total > 0 else 0
     return percentage, error_count, total
-def main():
+def parse_args(argv=None):
+    """Parse command line options for the batch categorizer"""
+    parser = argparse.ArgumentParser(description="Categorize every Excel/CSV file in a folder")
+    parser.add_argument('folder', nargs='?', default="SMS_categorizor/tyr",
+                        help="Folder containing the Excel/CSV exports")
+    parser.add_argument('-o', '--output', help="Output CSV file name")
+    parser.add_argument('--rules', help="YAML rule pack to use (default: rules/default.yaml)")
+    parser.add_argument('--match-timeout', type=float,
+                        help="Per-message rule matching budget in seconds (slow rows fall back to truncated text)")
+    parser.add_argument('--backend', default='rules', choices=['rules', 'linear'],
+                        help="Categorize with the rule engine or a distilled linear model (needs --linear-model)")
+    parser.add_argument('--linear-model', help="Trained DistilledLinearModel file for --backend linear")
+    restart = parser.add_mutually_exclusive_group()
+    restart.add_argument('--resume', action='store_true',
+                         help="Continue an interrupted run from its last committed chunk")
+    restart.add_argument('--fresh', action='store_true',
+                         help="Discard the checkpoint of an unfinished run and start over")
+    parser.add_argument('--checkpoint-dir', default='.batch_checkpoint',
+                        help="Where partial outputs and the progress journal are kept")
+    parser.add_argument('--checkpoint-rows', type=int, default=CHECKPOINT_ROWS,
+                        help="CSV rows categorized between checkpoints")
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help="Keep results in memory only until the run finishes")
+    parser.add_argument('--excel', help="Also write the results to this .xlsx file (split across sheets if needed)")
+    parser.add_argument('--sqlite', help="Also store the results in this SQLite database (indexed for queries; "
+                             "campaign_id is left empty)")
+    parser.add_argument('--queue', help="Shared directory used as a work queue by several hosts")
+    parser.add_argument('--worker', action='store_true',
+                        help="Process shards from --queue until none are left")
+    parser.add_argument('--merge', action='store_true',
+                        help="Combine the outputs of a finished --queue into one CSV")
+    parser.add_argument('--allow-failed', action='store_true',
+                        help="With --merge, leave out shards that failed on every attempt instead of refusing")
+    parser.add_argument('--shard-rows', type=int,
+                        help="Split CSV files into shards of this many rows (queue mode)")
+    parser.add_argument('--worker-id', help="Name of this worker (default: host-pid)")
+    parser.add_argument('--lease', type=float, default=120,
+                        help="Seconds without a heartbeat before a claim can be taken over")
+    parser.add_argument('--preview', action='store_true',
+                        help="Only estimate the category mix from a random sample of messages")
+    parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help="Number of messages to sample in preview mode")
+    parser.add_argument('--seed', type=int, help="Random seed for preview sampling")
+    parser.add_argument('--error-report',
+                        help="Write delivery error rates per category, campaign, template and hour as JSON "
+                             "to this path (campaigns are only clustered for the report)")
+    parser.add_argument('--report-json', help="Write a per-stage run report as JSON to this path")
+    parser.add_argument('--prometheus', help="Write the run report as a Prometheus textfile to this path")
+    parser.add_argument('--profile', choices=['cprofile', 'sampling'],
+                        help="Wrap the run in cProfile or the sampling profiler")
+    parser.add_argument('--profile-output', help="Where to dump the profiler output")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Track per-stage peak Python heap with tracemalloc (slower)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to run the batch categorizer"""
+    args = parse_args(argv)
     print("=" * 60)
     print("📱 BATCH SMS CATEGORIZER")
     print("=" * 60)
     
-    # Get folder path from user
-    folder_path = "SMS_categorizor/tyr"
+    folder_path = args.folder
     
     if not os.path.exists(folder_path):
         print("❌ Folder does not exist!")
         return
     
+    if args.backend == 'linear' and not args.linear_model:
+        print("❌ --backend linear needs a trained model: pass --linear-model")
+        return
+    
+    if args.queue and (args.worker or args.merge):
+        if args.worker:
+            run_distributed_worker(folder_path, args.queue, args.match_timeout, args.rules, args.shard_rows,
+                                   args.worker_id, args.lease, max(1.0, args.lease / 8), args.backend,
+                                   args.linear_model)
+        if args.merge:
+            merge_distributed(args.queue, args.output, args.excel, args.allow_failed)
+        return
+    
+    if args.preview:
+        preview = preview_batch(folder_path, args.sample_size, args.seed, args.match_timeout, args.rules)
+        if preview is None:
+            return
+        # The full run can be started straight from the preview
+        if not sys.stdin.isatty() or input("\nRun the full categorization now? [y/N] ").strip().lower() != 'y':
+            print("\n👋 Preview only - rerun without --preview for the full categorization")
+            return
+    
     # Optional output file name
-    output_file = input("Enter output file name (or press Enter for default): ").strip()
+    output_file = args.output
+    if output_file is None and sys.stdin.isatty() and not args.resume:
+        output_file = input("Enter output file name (or press Enter for default): ").strip()
     if not output_file:
         output_file = None
     
+    instrumentation = None
+    if args.report_json or args.prometheus or args.profile:
+        instrumentation = RunInstrumentation(
+            run_name='batch_sms_categorizer',
+            profiler=args.profile,
+            profile_output=args.profile_output,
+            trace_memory=args.trace_memory
+        )
+    
     # Process files
-    results = batch_categorize_sms(folder_path, output_file)
+    with (instrumentation or NULL_INSTRUMENTATION).run():
+        results = batch_categorize_sms(folder_path, output_file, instrumentation, args.match_timeout, args.rules,
+                                       args.error_report, None if args.no_checkpoint else args.checkpoint_dir,
+                                       args.resume, args.checkpoint_rows, args.sqlite, args.excel, args.backend,
+                                       args.linear_model, args.fresh)
+    
+    if instrumentation is not None:
+        if args.report_json:
+            instrumentation.write_json(args.report_json)
+            print(f"⏱️  Run report written to: {args.report_json}")
+        if args.prometheus:
+            instrumentation.write_prometheus(args.prometheus)
+            print(f"⏱️  Prometheus metrics written to: {args.prometheus}")
     
     if results is not None:
         print("\n🎉 Batch processing completed successfully!")
@@ -164,4 +640,4 @@ if __name__ == "__main__":
     # Suppress warnings
     warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
     
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,89 @@
+"""Memory benchmark: default vs compact analyze_sms_data result frames
+
+Builds a synthetic corpus from realistic Fido templates with varying names,
+amounts, dates and codes, runs analyze_sms_data both ways and reports the deep
+memory usage of the result frames. Usage:
+
+    python benchmarks/compact_frames.py [--rows 1000000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from categorization import SMSCategorizer  # noqa: E402
+
+TEMPLATES = [
+    "Hi {name}, Your due date: 2024-12-{day:02d}. Check the Fido app Help section for payment steps.",
+    "Hi {name} Your FIDO loan of {amount} GHS (minus 1.6% commitment fee) is now in your mobile wallet. Client ID: FID{code}.",
+    "Your Fido security code is {code}. Valid for 5 minutes.",
+    "Hello {name}, you have been offered a 50% DISCOUNT on your written off loan. Kindly pay Ghc{amount} in 4 weeks.",
+    "Hi {name}, Your Fido loan is due! Pay GHS{amount} by 2024-12-{day:02d} to stay eligible for future loans.",
+    "Hello {name}, your fidobiz loan amount of GHS {amount} is now {day} days overdue. Let's make a plan!",
+    "Top up your account now! {day}% bonus offer",
+    "Hi {name}, Loan fully repaid! Want an upgrade to GHc 7500? Join FidoBiz and submit your momo statement!",
+]
+NAMES = ['John', 'Mary', 'Peter', 'Sarah', 'James', 'Anna', 'Mike', 'Grace', 'David', 'Kofi', 'Ama', 'Yaw']
+
+
+def synthetic_messages(rows, seed=42):
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(
+            name=rng.choice(NAMES), amount=rng.randint(50, 5000),
+            day=rng.randint(1, 28), code=rng.randint(100000, 999999)
+        )
+        for _ in range(rows)
+    ]
+
+
+def run(messages, compact):
+    df = pd.DataFrame({'message': messages})
+    base = df.memory_usage(deep=True).sum()
+    categorizer = SMSCategorizer()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = categorizer.analyze_sms_data(df, text_column='message', compact=compact)
+    elapsed = time.perf_counter() - start
+    added = result.memory_usage(deep=True).sum() - base
+    return result, added, elapsed, categorizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.rows)
+    full, full_bytes, full_time, _ = run(messages, compact=False)
+    compact, compact_bytes, compact_time, categorizer = run(messages, compact=True)
+
+    # Same answers either way
+    assert (full['category'].astype(str).to_numpy() == compact['category'].astype(str).to_numpy()).all()
+    assert (full['template'].to_numpy() == categorizer.template_texts(compact).to_numpy()).all()
+    assert (full['campaign_id'].to_numpy() == compact['campaign_id'].to_numpy()).all()
+
+    print(f"rows: {args.rows:,}  unique templates: {len(categorizer.template_dictionary):,}")
+    print(f"{'mode':<10}{'added MB':>12}{'bytes/row':>12}{'seconds':>10}")
+    for mode, added, elapsed in (('default', full_bytes, full_time), ('compact', compact_bytes, compact_time)):
+        print(f"{mode:<10}{added / 1e6:>12.1f}{added / args.rows:>12.1f}{elapsed:>10.1f}")
+    # The shared template dictionary is memory the compact frame depends on, so count it
+    dictionary_bytes = sum(sys.getsizeof(t) for t in categorizer.template_dictionary.templates)
+    dictionary_bytes += sys.getsizeof(categorizer.template_dictionary.templates)
+    dictionary_bytes += sys.getsizeof(categorizer.template_dictionary.ids)
+    compact_total = compact_bytes + dictionary_bytes
+    print(f"{'+ dict':<10}{compact_total / 1e6:>12.1f}{compact_total / args.rows:>12.1f}")
+    print(f"reduction: {full_bytes / max(compact_total, 1):.1f}x including the template dictionary")
+    print("per-column (compact):")
+    print(compact.memory_usage(deep=True).drop('Index').to_string())
+
+
+if __name__ == "__main__":
+    main()
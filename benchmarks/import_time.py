@@ -0,0 +1,76 @@
+"""Cold-start import benchmark for the categorizer entry points
+
+Each module is imported in a fresh interpreter (so nothing is cached in
+sys.modules) and timed several times; the median is reported together with the
+heavy optional packages that ended up loaded. Usage:
+
+    python benchmarks/import_time.py [--runs 5] [--modules categorization main]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ['categorization', 'main', 'batch_sms_categorizer']
+HEAVY_PACKAGES = ['sklearn', 'scipy', 'matplotlib', 'seaborn', 'plotly', 'regex', 'torch']
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(f"{{elapsed:.6f}}|{{','.join(heavy)}}")
+"""
+
+
+def time_import(module, runs):
+    """Return (median seconds, heavy packages loaded) for importing a module cold"""
+    timings = []
+    heavy = ''
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_PACKAGES)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        elapsed, heavy = result.stdout.strip().splitlines()[-1].split('|')
+        timings.append(float(elapsed))
+    return statistics.median(timings), [name for name in heavy.split(',') if name]
+
+
+def top_imports(module, limit=10):
+    """Return the slowest cumulative imports reported by python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--top', type=int, default=8, help="Show the N slowest imports per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<26}{'median ms':>12}  heavy packages loaded")
+    for module in args.modules:
+        median, heavy = time_import(module, args.runs)
+        print(f"{module:<26}{median * 1000:>12.1f}  {', '.join(heavy) or '-'}")
+        if args.top:
+            for cumulative, name in top_imports(module, args.top):
+                print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
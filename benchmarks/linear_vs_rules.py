@@ -0,0 +1,79 @@
+"""Throughput benchmark: distilled linear backend vs pattern_based_categorization
+
+Trains a DistilledLinearModel on rule-engine labels of a synthetic corpus (Fido
+templates plus shuffled word mixes of them), then categorizes a held-out corpus
+with both backends and reports msgs/sec, agreement with the rules and the share
+of rows that fell back to the rules. Usage:
+
+    python benchmarks/linear_vs_rules.py [--train-rows 200000] [--test-rows 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from categorization import SMSCategorizer  # noqa: E402
+from compact_frames import synthetic_messages  # noqa: E402
+from linear_backend import train_linear_backend  # noqa: E402
+
+
+def mixed_messages(rows, seed):
+    """Template messages, with a third replaced by word mixes that trip several rules"""
+    rng = random.Random(seed)
+    messages = synthetic_messages(rows, seed)
+    words = " ".join(messages[:1000]).split()
+    for i in range(0, rows, 3):
+        messages[i] = " ".join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+    return messages
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--train-rows', type=int, default=200_000)
+    parser.add_argument('--test-rows', type=int, default=200_000)
+    parser.add_argument('--min-confidence', type=float, default=0.9)
+    parser.add_argument('--save', help="Write the trained model to this path")
+    args = parser.parse_args()
+
+    rules = SMSCategorizer()
+    train = mixed_messages(args.train_rows, seed=1)
+    model, train_seconds = timed(lambda: train_linear_backend(rules, train, min_confidence=args.min_confidence))
+    print(f"trained on {args.train_rows:,} messages in {train_seconds:.1f}s")
+    if args.save:
+        model.save(args.save)
+
+    test = mixed_messages(args.test_rows, seed=2)
+    processed = [rules.preprocess_text(message) for message in test]
+
+    # Per-message engine, as the batch runner and Streamlit jobs call it
+    expected, rule_seconds = timed(lambda: np.array(
+        [rules.pattern_based_categorization(text) for text in processed], dtype=object))
+
+    linear = SMSCategorizer(backend='linear', linear_model=model)
+    predicted, linear_seconds = timed(linear.categorize_processed, processed)
+    model_only, model_seconds = timed(lambda: model.predict(processed)[0])
+
+    fallbacks = linear.backend_stats['rule_fallbacks']
+    print(f"{'backend':<22}{'msgs/sec':>12}{'agreement':>12}")
+    print(f"{'rules':<22}{len(test) / rule_seconds:>12,.0f}{100.0:>11.2f}%")
+    print(f"{'linear + fallback':<22}{len(test) / linear_seconds:>12,.0f}"
+          f"{(predicted == expected).mean() * 100:>11.2f}%")
+    print(f"{'linear only':<22}{len(test) / model_seconds:>12,.0f}"
+          f"{(model_only == expected).mean() * 100:>11.2f}%")
+    print(f"rule fallbacks: {fallbacks:,} ({fallbacks / len(test) * 100:.1f}% of rows)")
+
+
+if __name__ == "__main__":
+    main()
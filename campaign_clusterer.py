@@ -0,0 +1,311 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the pickled state layout changes
+STATE_FORMAT = 1
+
+# Rows of a similarity product computed at a time; products stay sparse and only
+# entries above the threshold are kept, so memory doesn't grow with the campaign count
+SIMILARITY_BLOCK_ROWS = 4096
+
+
+class Campaign:
+    """Running centroid and member templates of one campaign"""
+
+    __slots__ = ('id', 'category', 'count', 'vector_sum', 'members')
+
+    def __init__(self, campaign_id, category, vector_sum, count, members):
+        self.id = campaign_id
+        self.category = category
+        self.vector_sum = vector_sum
+        self.count = count
+        # template -> message count, capped at max_members most frequent templates
+        self.members = members
+
+    @property
+    def label(self):
+        return max(self.members.items(), key=lambda x: x[1])[0] if self.members else ''
+
+
+class IncrementalCampaignClusterer:
+    """Assign messages to long-lived campaigns without refitting on history
+
+    Templates are embedded with a stateless HashingVectorizer, so vectors from
+    different days are directly comparable. Each category keeps its own campaign
+    centroids; a template joins the most similar campaign when the cosine similarity
+    reaches ``threshold``, and the remaining outliers open new campaigns (leader
+    clustering). Every ``maintenance_interval`` batches, near-duplicate campaigns
+    are merged and incoherent ones are split.
+
+    Campaign IDs are stable across batches; IDs retired by a merge resolve to the
+    surviving campaign through ``resolve``.
+    """
+
+    def __init__(self, threshold=0.5, merge_threshold=0.85, split_threshold=0.35, min_split_size=50,
+                 max_members=200, maintenance_interval=7, n_features=2 ** 18):
+        self.threshold = threshold
+        self.merge_threshold = merge_threshold
+        self.split_threshold = split_threshold
+        self.min_split_size = min_split_size
+        self.max_members = max_members
+        self.maintenance_interval = maintenance_interval
+        self.n_features = n_features
+        self.campaigns = {}
+        self.merged_into = {}
+        self.next_id = 0
+        self.batches = 0
+        self._vectorizer = None
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            # Imported lazily like the rest of the clustering stack
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._vectorizer = HashingVectorizer(
+                n_features=self.n_features,
+                stop_words='english',
+                ngram_range=(1, 2),
+                alternate_sign=False,
+                norm='l2'
+            )
+        return self._vectorizer
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_vectorizer'] = None
+        return state
+
+    def assign(self, templates, categories):
+        """Return a campaign ID for every (template, category) row, updating the centroids"""
+        frame = pd.DataFrame({'category': np.asarray(categories, dtype=object),
+                              'template': np.asarray(templates, dtype=object)})
+        codes = frame.groupby(['category', 'template'], sort=False).ngroup().to_numpy()
+        uniques = frame.drop_duplicates(['category', 'template'])
+        weights = np.bincount(codes, minlength=len(uniques))
+        unique_ids = np.empty(len(uniques), dtype=np.int64)
+
+        unique_categories = uniques['category'].to_numpy()
+        unique_templates = uniques['template'].to_numpy()
+        for category in pd.unique(unique_categories):
+            rows = np.flatnonzero(unique_categories == category)
+            unique_ids[rows] = self._assign_category(category, unique_templates[rows].tolist(), weights[rows])
+
+        self.batches += 1
+        if self.maintenance_interval and self.batches % self.maintenance_interval == 0:
+            self.maintain()
+            unique_ids = np.array([self.resolve(i) for i in unique_ids], dtype=np.int64)
+        return unique_ids[codes]
+
+    def _assign_category(self, category, templates, weights):
+        vectors = self.vectorizer.transform(templates)
+        assigned = np.full(len(templates), -1, dtype=np.int64)
+
+        existing = [c for c in self.campaigns.values() if c.category == category]
+        if existing:
+            existing_ids = np.array([c.id for c in existing], dtype=np.int64)
+            centroids_t = self._centroids(existing).T.tocsc()
+            for start in range(0, len(templates), SIMILARITY_BLOCK_ROWS):
+                stop = min(start + SIMILARITY_BLOCK_ROWS, len(templates))
+                similarity = self._above(vectors[start:stop] @ centroids_t, self.threshold)
+                # Sparse argmax also returns the first (oldest) campaign among ties
+                best = np.asarray(similarity.argmax(axis=1)).ravel()
+                matched = similarity.getnnz(axis=1) > 0
+                assigned[start:stop][matched] = existing_ids[best[matched]]
+
+        # Leader clustering of the outliers: each unmatched template opens a campaign
+        # and pulls in every other unmatched template similar enough to it
+        outliers = np.flatnonzero(assigned < 0)
+        if len(outliers):
+            outlier_vectors = vectors[outliers]
+            open_rows = np.ones(len(outliers), dtype=bool)
+            for i in range(len(outliers)):
+                if not open_rows[i]:
+                    continue
+                campaign_id = self._new_campaign(category)
+                similarity = self._above(outlier_vectors @ outlier_vectors[i].T, self.threshold).tocoo()
+                similar = np.zeros(len(outliers), dtype=bool)
+                similar[similarity.row] = True
+                members = open_rows & similar
+                members[i] = True
+                assigned[outliers[members]] = campaign_id
+                open_rows &= ~members
+
+        for campaign_id in np.unique(assigned):
+            rows = np.flatnonzero(assigned == campaign_id)
+            self._absorb(self.campaigns[campaign_id], vectors[rows], [templates[r] for r in rows], weights[rows])
+        return assigned
+
+    @staticmethod
+    def _above(similarity, threshold):
+        """Keep only the entries of a sparse similarity product that reach ``threshold``"""
+        similarity = similarity.tocsr()
+        similarity.data[similarity.data < threshold] = 0
+        similarity.eliminate_zeros()
+        similarity.sort_indices()
+        return similarity
+
+    def _centroids(self, campaigns):
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        return normalize(sparse.vstack([c.vector_sum for c in campaigns]).tocsr())
+
+    def _new_campaign(self, category):
+        from scipy import sparse
+        campaign_id = self.next_id
+        self.next_id += 1
+        self.campaigns[campaign_id] = Campaign(campaign_id, category, sparse.csr_matrix((1, self.n_features)), 0, {})
+        return campaign_id
+
+    def _absorb(self, campaign, vectors, templates, weights):
+        from scipy import sparse
+        weighted = sparse.csr_matrix(weights.reshape(1, -1).astype(float)) @ vectors
+        campaign.vector_sum = (campaign.vector_sum + weighted).tocsr()
+        campaign.count += int(weights.sum())
+        for template, weight in zip(templates, weights):
+            campaign.members[template] = campaign.members.get(template, 0) + int(weight)
+        self._trim_members(campaign)
+
+    def _trim_members(self, campaign):
+        if len(campaign.members) > self.max_members:
+            # The centroid keeps the full history; only the member list is bounded
+            top = sorted(campaign.members.items(), key=lambda x: -x[1])[:self.max_members]
+            campaign.members = dict(top)
+
+    def resolve(self, campaign_id):
+        """Follow merges to the campaign that currently holds ``campaign_id``"""
+        while campaign_id in self.merged_into:
+            campaign_id = self.merged_into[campaign_id]
+        return campaign_id
+
+    def labels(self, campaign_ids):
+        """Map campaign IDs (retired ones included) to '<current id>: <leading template>'"""
+        labels = {}
+        for campaign_id in campaign_ids:
+            current = self.resolve(campaign_id)
+            campaign = self.campaigns.get(current)
+            labels[campaign_id] = f"{current}: {campaign.label if campaign is not None else ''}"
+        return labels
+
+    def maintain(self):
+        """Merge near-duplicate campaigns and split incoherent ones
+
+        Returns (merges, splits) as lists of (retired_id, surviving_id) and
+        (original_id, new_id) pairs.
+        """
+        return self.merge_campaigns(), self.split_campaigns()
+
+    def merge_campaigns(self):
+        merges = []
+        categories = pd.unique(np.array([c.category for c in self.campaigns.values()], dtype=object))
+        for category in categories:
+            campaigns = sorted((c for c in self.campaigns.values() if c.category == category), key=lambda c: c.id)
+            if len(campaigns) < 2:
+                continue
+            centroids = self._centroids(campaigns)
+            centroids_t = centroids.T.tocsc()
+            pairs = []
+            for start in range(0, len(campaigns), SIMILARITY_BLOCK_ROWS):
+                block = self._above(centroids[start:start + SIMILARITY_BLOCK_ROWS] @ centroids_t,
+                                    self.merge_threshold).tocoo()
+                rows = block.row + start
+                upper = block.col > rows
+                pairs.append(np.column_stack([rows[upper], block.col[upper]]))
+            pairs = np.concatenate(pairs)
+            # Row-major order, as a scan of the upper triangle would visit them
+            pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+            for i, j in pairs:
+                # Always fold the newer campaign into the older one
+                keep, retire = self.resolve(campaigns[i].id), self.resolve(campaigns[j].id)
+                if keep == retire:
+                    continue
+                keep, retire = min(keep, retire), max(keep, retire)
+                survivor, retired = self.campaigns[keep], self.campaigns.pop(retire)
+                survivor.vector_sum = (survivor.vector_sum + retired.vector_sum).tocsr()
+                survivor.count += retired.count
+                for template, count in retired.members.items():
+                    survivor.members[template] = survivor.members.get(template, 0) + count
+                self._trim_members(survivor)
+                self.merged_into[retire] = keep
+                merges.append((retire, keep))
+        return merges
+
+    def split_campaigns(self, iterations=5):
+        splits = []
+        for campaign in list(self.campaigns.values()):
+            if campaign.count < self.min_split_size or len(campaign.members) < 2:
+                continue
+            templates = list(campaign.members)
+            weights = np.array([campaign.members[t] for t in templates], dtype=float)
+            vectors = self.vectorizer.transform(templates)
+            centroid = self._centroids([campaign])
+            similarity = (vectors @ centroid.T).toarray().ravel()
+            if np.average(similarity, weights=weights) >= self.split_threshold:
+                continue
+
+            # Weighted 2-means seeded with the heaviest member and the member least
+            # similar to it (heaviest first among ties)
+            first = int(weights.argmax())
+            to_first = (vectors @ vectors[first].T).toarray().ravel()
+            farthest = np.flatnonzero(to_first == to_first.min())
+            seeds = [first, int(farthest[weights[farthest].argmax()])]
+            if seeds[0] == seeds[1]:
+                continue
+            centres = self._centroids_from(vectors[seeds], np.ones(2))
+            for _ in range(iterations):
+                side = (vectors @ centres.T).toarray().argmax(axis=1)
+                if side.min() == side.max():
+                    break
+                centres = self._centroids_from(vectors, weights, side)
+            if side.min() == side.max():
+                continue
+
+            new_id = self._new_campaign(campaign.category)
+            new_campaign = self.campaigns[new_id]
+            moved = np.flatnonzero(side == 1)
+            kept = np.flatnonzero(side == 0)
+            campaign.members = {templates[i]: int(weights[i]) for i in kept}
+            campaign.vector_sum = self._weighted_sum(vectors[kept], weights[kept])
+            campaign.count = int(weights[kept].sum())
+            self._absorb(new_campaign, vectors[moved], [templates[i] for i in moved], weights[moved].astype(int))
+            splits.append((campaign.id, new_id))
+        return splits
+
+    def _weighted_sum(self, vectors, weights):
+        from scipy import sparse
+        return (sparse.csr_matrix(weights.reshape(1, -1)) @ vectors).tocsr()
+
+    def _centroids_from(self, vectors, weights, side=None):
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        if side is None:
+            return normalize(vectors)
+        rows = [self._weighted_sum(vectors[side == s], weights[side == s]) for s in (0, 1)]
+        return normalize(sparse.vstack(rows).tocsr())
+
+    def campaigns_frame(self):
+        """Return one row per live campaign: ID, category, message count and label"""
+        return pd.DataFrame([
+            {'campaign_id': c.id, 'category': c.category, 'message_count': c.count,
+             'templates': len(c.members), 'label': c.label}
+            for c in sorted(self.campaigns.values(), key=lambda c: c.id)
+        ], columns=['campaign_id', 'category', 'message_count', 'templates', 'label'])
+
+    def save(self, path):
+        """Pickle the clusterer state atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'format': STATE_FORMAT, 'clusterer': self}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('format') != STATE_FORMAT:
+            raise ValueError(f"Unsupported campaign clusterer state format in {path}")
+        return state['clusterer']
@@ -1,112 +1,155 @@
-import pandas as pd
+import os
 import numpy as np
+import pandas as pd
 import re
-from collections import Counter
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
+import time
+import warnings
+from instrumentation import NULL_INSTRUMENTATION
+from rule_profiler import PatternProfiler
+from rule_pack import RulePack, load_rule_pack, build_evaluation_plan
+from templates import TemplateDictionary, smallest_int_dtype
+from time_rollups import TimeRollup
+from linear_backend import DistilledLinearModel
+from heavy_hitters import TemplateTracker
+from result_store import ResultStore
+
+# Rule packs whose evaluation plans are kept at once (e.g. a pinned job's pack next to the active one)
+EVALUATION_PLANS = 4
+
 
 class SMSCategorizer:
-    def __init__(self):
-        self.categories = {
-            'OTP': [],
-            'Recovery': [],
-            'Mambu': [],
-            'Upsales': [],
-            'Other': []
-        }
-        
-        # Define pattern rules for each category based on actual templates
-        # Patterns are ordered by specificity (more specific patterns first)
-        self.patterns = {
-            'OTP': [
-                r'fido security code',
-                r'security code.*\d{4,8}',
-                r'your.*code.*is.*\d{4,8}',
-                r'^\d{4,8}$',  # Standalone code
-                r'security code with Fido is:\s*\d{6}.*Do not share this code with anyone.*For internal use: R/[A-Za-z0-9]+'
-            ],
-            'Recovery': [
-                 # High priority Recovery patterns
-                 r'discount.*offer',
-                 r'\d+%.*discount',
-                 r'written off loan',
-                 r'blacklist',
-                 r'overdue.*balance',
-                 r'discount.*amount',
-                 r'fidobiz.*loan.*overdue',
-                 r'fidobiz.*overdue',
-                 r'\d+\s+days overdue',
-                 r'exclusive.*discount',
-                 r'discount offer.*active',
-                 r'seize.*discount',
-                 r'discount offer ends',
-                 r'things are tough.*make a plan',
-                 r'pay.*installments.*flexible',
-                 # Lower priority
-                 r'early repayment reminder',
-                 r'paying early.*fidoscore',
-                 r'loan.*not due yet',
-                 r'preferred language',
-                 r'serve you better',
-                 r'happy holidays.*fido score',
-                 r'clear.*loan early',
-                 r'settle.*holiday'
-            ],
-            'Mambu': [
-    # NEW HIGH PRIORITY PATTERNS (to catch misclassified messages)
-    r'your payment is due on \d{2}-\d{2}-\d{4}',                    # Payment due with date format
-    r'want an upgrade to ghc \d+',                                   # Upgrade offer pattern
-    r'join fidobiz and submit your momo statement',                  # Fidobiz application process
-    r'hi \w+.*your payment is due',                                  # Greeting + payment due
-    r'payment.*due.*upgrade.*ghc',                                   # Payment due + upgrade offer
-    r'fidobiz.*momo statement.*thank you',                          # Fidobiz workflow ending
-    
-    # ENHANCED EXISTING PATTERNS (made more flexible)
-    r'payment.*due.*\d{2}-\d{2}-\d{4}',                            # More flexible payment due
-    r'upgrade.*ghc.*\d+',                                            # More flexible upgrade pattern
-    r'join.*fidobiz',                                                # Any fidobiz joining message
-    r'submit.*momo statement',                                       # Momo statement submission
-    r'hi \w+.*payment.*due',                                        # Personalized payment reminders
-    
-    # EXISTING HIGH PRIORITY PATTERNS (kept as-is)
-    r'fido loan.*ghs.*commitment fee',
-    r'loan.*ghs.*minus.*commitment fee',
-    r'sent to your mobile wallet',
-    r'mobile wallet.*client id',
-    r'your due date.*fido app',
-    r'fido loan is due.*pay ghs',
-    r'payment.*ghs.*confirmed.*loan schedule',
-    r'loan fully repaid',
-    r'repay your loan easily.*momo',
-    r'dial.*\*998#.*loan services',
-    r'account.*charged.*ghs.*daily interest',
-    r'lenders.*borrowers act.*court',
-    r'installment loan.*due.*fido app',
-    r'fido will never ask.*repay.*wallet',
-    r'make a payment.*button.*help section',
-    r'confirmation sms.*mtn.*fido',
-    r'repayment.*due.*tomorrow.*penalty',
-    r'settle.*debt.*lenders.*borrowers',
-    r'next payment due.*loan schedule',
-    r'current balance.*ghs.*interest',
-    
-    # EXISTING LOWER PRIORITY PATTERNS (kept as-is)
-    r'your.*fido loan',
-    r'client id.*\w+',
-    r'fido app.*help',
-    r'repayment.*ghs.*due',
-    r'loan.*mobile wallet',
-    r'stay eligible.*future loans',
-    r'avoid penalty'
-],
-            'Upsales': [
-                 r'top.?up'
-            ]
-        }
+    def __init__(self, profile_patterns=False, match_timeout=None, fallback_max_chars=500,
+                 rule_pack=None, early_exit=True, backend='rules', linear_model=None, track_templates=False):
+        # Rules (patterns, weights and category priorities) live in a YAML rule pack,
+        # rules/default.yaml unless another path or RulePack is given
+        if isinstance(rule_pack, RulePack):
+            self.rule_pack = rule_pack
+        else:
+            self.rule_pack = load_rule_pack(rule_pack)
+        self._rule_pack_signature = self._rule_file_signature()
+        
+        # Opt-in per-pattern hit/cost counters (see rule_profiler.PatternProfiler)
+        self.pattern_profiler = PatternProfiler() if profile_patterns else None
+        
+        # Optional per-message matching budget (seconds) enforced with the regex
+        # module's timeout; messages that exhaust it are retried on a truncated copy
+        self.match_timeout = match_timeout
+        self.fallback_max_chars = fallback_max_chars
+        self.timeout_stats = {'timeouts': 0, 'fallback_matches': 0, 'fallback_failures': 0}
+        self._timeout_regexes = {}
+        
+        # Stop scoring once no remaining category can overtake the leader. The
+        # evaluation order can be tuned from observed hit rates (optimize_rule_order);
+        # results are identical to exhaustive scoring either way.
+        self.early_exit = early_exit
+        self._evaluation_plans = {}
+        self._plan_profile = (None, None)
+        
+        self._warn_on_lint_findings(self.rule_pack)
+        
+        # Template string <-> integer ID mapping used by compact result frames
+        self.template_dictionary = TemplateDictionary()
+        
+        # Hourly (window, category, campaign) counts, accumulated over every
+        # analyze_sms_data call that is given a date_column
+        self.time_rollup = TimeRollup('h')
+        
+        # Opt-in streaming top templates per category (count-min sketch + heap), fed by
+        # every analyze_sms_data call and mergeable across workers and files
+        self.template_tracker = TemplateTracker() if track_templates else None
+        
+        # 'rules' runs the rule engine on every message; 'linear' predicts batches with
+        # a DistilledLinearModel (or a path to one) and uses the rules only for
+        # low-confidence rows
+        if backend not in ('rules', 'linear'):
+            raise ValueError(f"Unknown backend {backend!r}; expected 'rules' or 'linear'")
+        if isinstance(linear_model, str):
+            linear_model = DistilledLinearModel.load(linear_model)
+        if backend == 'linear' and (linear_model is None or not linear_model.trained):
+            raise ValueError("The linear backend needs a trained linear_model")
+        self.backend = backend
+        self.linear_model = linear_model
+        self.backend_stats = {'model_predictions': 0, 'rule_fallbacks': 0}
+        self._stale_model_warned = False
+    
+    @property
+    def patterns(self):
+        """{category: [pattern, ...]} of the active rule pack"""
+        return self.rule_pack.patterns
+    
+    @property
+    def category_priorities(self):
+        return self.rule_pack.priorities
+    
+    @property
+    def categories(self):
+        return {name: [] for name in self.rule_pack.category_names}
+    
+    @property
+    def rule_lint(self):
+        """Backtracking findings for the active rules (see rule_lint.lint_pattern)"""
+        return self.rule_pack.lint
+    
+    @property
+    def rule_pack_hash(self):
+        return self.rule_pack.short_hash
+    
+    def _warn_on_lint_findings(self, pack):
+        # Flag rules that can backtrack exponentially (errors) or polynomially (warnings)
+        for severity, problem in (('error', 'can backtrack exponentially'),
+                                  ('warning', 'chain unbounded quantifiers (polynomial backtracking)')):
+            findings = [f for f in pack.lint if f['severity'] == severity]
+            if findings:
+                rules = [f"{f['category']}#{f['index']}" for f in findings]
+                listed = ', '.join(rules[:10]) + (f" and {len(rules) - 10} more" if len(rules) > 10 else '')
+                warnings.warn(f"{len(findings)} rule pattern(s) {problem}: {listed} "
+                              f"(python rule_lint.py lists them)", stacklevel=3)
+    
+    def _rule_file_signature(self):
+        path = self.rule_pack.source
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def reload_rules(self, rule_pack=None):
+        """Atomically swap in a new rule pack (a RulePack or a YAML path)
+
+        The new pack is fully loaded and compiled before it replaces the old one, and
+        in-flight categorizations keep the pack they started with.
+        """
+        if isinstance(rule_pack, RulePack):
+            new_pack = rule_pack
+        else:
+            new_pack = load_rule_pack(rule_pack or self.rule_pack.source)
+        self._warn_on_lint_findings(new_pack)
+        self.rule_pack = new_pack
+        self._rule_pack_signature = self._rule_file_signature()
+        return new_pack
+    
+    def reload_rules_if_changed(self):
+        """Reload the rule pack file if it changed on disk; returns True when swapped"""
+        signature = self._rule_file_signature()
+        if signature is None or signature == self._rule_pack_signature:
+            return False
+        old_hash = self.rule_pack.content_hash
+        self.reload_rules(self.rule_pack.source)
+        return self.rule_pack.content_hash != old_hash
+    
+    def enable_pattern_profiling(self):
+        """Start recording per-pattern evaluation counts, hits and timings"""
+        if self.pattern_profiler is None:
+            self.pattern_profiler = PatternProfiler()
+        return self.pattern_profiler
+    
+    def pattern_profile_report(self, sort_by='total_seconds', ascending=False):
+        """Return the ranked per-pattern profile (requires profiling to be enabled)"""
+        if self.pattern_profiler is None:
+            raise RuntimeError("Pattern profiling is not enabled; use SMSCategorizer(profile_patterns=True)")
+        return self.pattern_profiler.report(sort_by=sort_by, ascending=ascending)
     
     def preprocess_text(self, text):
         """Clean and normalize text for analysis"""
@@ -127,37 +170,213 @@ class SMSCategorizer:
         
         return text.strip()
     
-    def pattern_based_categorization(self, text):
-        """Categorize based on predefined patterns with scoring"""
+    def _evaluation_plan(self, pack):
+        # Plans of the last few packs are kept by content hash, so a job pinned to an
+        # older pack can run next to the hot-reloaded one without rebuilding plans,
+        # while reloads don't accumulate them. The dict is replaced, never mutated,
+        # so concurrent readers always see a consistent mapping.
+        plan = self._evaluation_plans.get(pack.content_hash)
+        if plan is None:
+            hit_rates, category_frequencies = self._plan_profile
+            plan = build_evaluation_plan(pack, hit_rates, category_frequencies)
+            plans = dict(self._evaluation_plans)
+            plans[pack.content_hash] = plan
+            # Oldest first: drop the plans built longest ago
+            for content_hash in list(plans)[:-EVALUATION_PLANS]:
+                del plans[content_hash]
+            self._evaluation_plans = plans
+        return plan
+    
+    def optimize_rule_order(self, pattern_profile=None, category_frequencies=None):
+        """Reorder rule evaluation from observed traffic for faster early exit
+
+        ``pattern_profile`` is a pattern_profile_report() DataFrame (or any frame
+        with category, pattern and hit_rate columns); ``category_frequencies`` maps
+        category -> count, e.g. a value_counts() of a previous run's categories.
+        The profile is kept and reapplied when the rule pack is reloaded.
+        """
+        hit_rates = None
+        if pattern_profile is not None:
+            hit_rates = {
+                (row.category, row.pattern): row.hit_rate
+                for row in pattern_profile[['category', 'pattern', 'hit_rate']].itertuples(index=False)
+            }
+        self._plan_profile = (hit_rates, dict(category_frequencies) if category_frequencies is not None else None)
+        self._evaluation_plans = {}
+        return self._evaluation_plan(self.rule_pack)
+    
+    def _search(self, rule, text, deadline):
+        """Search one rule, honouring the per-message deadline when a budget is set"""
+        if deadline is None:
+            return rule.regex.search(text)
+        compiled = self._timeout_regexes.get(rule.pattern)
+        if compiled is None:
+            import regex  # only needed when a matching budget is configured
+            compiled = self._timeout_regexes[rule.pattern] = regex.compile(rule.pattern)
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TimeoutError("Per-message matching budget exhausted")
+        return compiled.search(text, timeout=remaining)
+    
+    def pattern_based_categorization(self, text, rule_pack=None):
+        """Categorize based on predefined patterns with scoring
+
+        ``rule_pack`` pins a specific pack (e.g. for the duration of a batch); by
+        default the pack active when the call starts is used throughout.
+        """
+        pack = rule_pack or self.rule_pack
+        if self.match_timeout is None:
+            return self._score_patterns(pack, text.lower(), None)
+        
+        try:
+            return self._score_patterns(pack, text.lower(), time.perf_counter() + self.match_timeout)
+        except TimeoutError:
+            self.timeout_stats['timeouts'] += 1
+        
+        # Fallback: retry on a truncated copy of the message with a fresh budget
+        try:
+            category = self._score_patterns(pack, text.lower()[:self.fallback_max_chars],
+                                            time.perf_counter() + self.match_timeout)
+            self.timeout_stats['fallback_matches'] += 1
+            return category
+        except TimeoutError:
+            self.timeout_stats['fallback_failures'] += 1
+            return pack.fallback_category
+    
+    def categorize_messages(self, messages, rule_pack=None):
+        """Categorize a batch of raw messages (preprocessing included)
+
+        Identical messages are only categorized once. Returns an object array in
+        input order.
+        """
+        codes, uniques = pd.factorize(pd.Series(messages, dtype=object), sort=False)
+        # Missing messages (code -1) pick up the trailing entry, categorized as empty text
+        processed = [self.preprocess_text(message) for message in uniques] + [self.preprocess_text(None)]
+        return self.categorize_processed(processed, rule_pack)[codes]
+    
+    def categorize_processed(self, texts, rule_pack=None):
+        """Categorize preprocessed texts with the configured backend; returns an object array"""
+        pack = rule_pack or self.rule_pack
+        if self.backend == 'linear' and self._linear_model_matches(pack):
+            categories, confident = self.linear_model.predict(texts)
+            fallback = np.flatnonzero(~confident)
+            for i in fallback:
+                categories[i] = self.pattern_based_categorization(texts[i], pack)
+            self.backend_stats['model_predictions'] += len(texts) - len(fallback)
+            self.backend_stats['rule_fallbacks'] += len(fallback)
+            return categories
+        return np.array([self.pattern_based_categorization(text, pack) for text in texts], dtype=object)
+    
+    def _linear_model_matches(self, pack):
+        # A model distilled from other rules would silently keep their answers
+        if self.linear_model.rule_pack_hash == pack.short_hash:
+            return True
+        if not self._stale_model_warned:
+            warnings.warn(
+                f"Linear model was trained on rule pack {self.linear_model.rule_pack_hash}, "
+                f"not {pack.short_hash}; using the rule engine until it is retrained",
+                stacklevel=3
+            )
+            self._stale_model_warned = True
+        return False
+    
+    def pattern_hits(self, text, rule_pack=None):
+        """Return an int bitmap of the rules that match ``text`` (bit i = rule_pack.rule_list[i])"""
+        pack = rule_pack or self.rule_pack
         text_lower = text.lower()
+        bits = 0
+        for position, rule in enumerate(pack.rule_list):
+            if rule.regex.search(text_lower):
+                bits |= 1 << position
+        return bits
+    
+    def _score_early_exit(self, pack, text_lower, deadline):
+        """Branch-and-bound scoring, equivalent to _score_patterns
+
+        A category (or the rest of one) is skipped as soon as its best reachable score
+        can no longer beat the current leader, taking the tie-breaking order (first
+        listed category wins) into account.
+        """
+        plan = self._evaluation_plan(pack)
+        tie_rank = plan.tie_rank
+        leader = None
+        leader_score = 0
+        
+        for category in plan.category_order:
+            priority = plan.priorities[category]
+            rank = tie_rank[category]
+            if leader is not None:
+                bound = plan.upper_bounds[category]
+                if bound < leader_score or (bound == leader_score and rank > tie_rank[leader]):
+                    continue
+            
+            score = 0
+            remaining = plan.weight_totals[category]
+            for rule in plan.rules[category]:
+                if leader is not None:
+                    bound = (score + remaining) * priority
+                    if bound < leader_score or (bound == leader_score and rank > tie_rank[leader]):
+                        score = 0
+                        break
+                if self._search(rule, text_lower, deadline):
+                    score += rule.weight
+                remaining -= rule.weight
+            
+            if score > 0:
+                weighted = score * priority
+                if (leader is None or weighted > leader_score
+                        or (weighted == leader_score and rank < tie_rank[leader])):
+                    leader, leader_score = category, weighted
+        
+        return leader or pack.fallback_category
+    
+    def _score_patterns(self, pack, text_lower, deadline):
+        profiler = self.pattern_profiler
+        if profiler is None and self.early_exit and not self._evaluation_plan(pack).exhaustive:
+            return self._score_early_exit(pack, text_lower, deadline)
         
         # Score each category based on pattern matches
         category_scores = {}
-        # Give higher priority to recovery messages as they are critical
-        category_priorities = {'Recovery': 3, 'Mambu': 2, 'Upsales': 1.5, 'OTP': 1}
+        category_priorities = pack.priorities
+        matched = {}
         
-        for category, patterns in self.patterns.items():
+        for category, rules in pack.rules.items():
             score = 0
-            for i, pattern in enumerate(patterns):
-                if re.search(pattern, text_lower):
+            for rule in rules:
+                if profiler is None:
+                    hit = self._search(rule, text_lower, deadline)
+                else:
+                    start = time.perf_counter()
+                    hit = self._search(rule, text_lower, deadline)
+                    profiler.record(category, rule.index, rule.pattern, time.perf_counter() - start, hit is not None)
+                if hit:
                     # Higher score for patterns that appear earlier in the list (more specific)
-                    pattern_weight = len(patterns) - i
-                    score += pattern_weight
+                    score += rule.weight
+                    if profiler is not None:
+                        matched.setdefault(category, []).append((rule.index, rule.pattern, rule.weight))
             
             if score > 0:
                 # Apply category priority multiplier
                 priority = category_priorities.get(category, 1)
                 category_scores[category] = score * priority
         
-        # Return category with highest score, or 'Other' if no matches
+        # Return category with highest score, or the fallback ('Other') if no matches
+        best_category = None
         if category_scores:
             best_category = max(category_scores.items(), key=lambda x: x[1])[0]
-            return best_category
         
-        return 'Other'
+        if profiler is not None:
+            profiler.record_decision(best_category, matched, category_scores,
+                                     category_priorities, list(pack.rules))
+        
+        return best_category or pack.fallback_category
     
-    def extract_template(self, text):
-        """Extract template by replacing numbers and specific words with placeholders"""
+    def extract_template(self, text, slots=None):
+        """Extract template by replacing numbers and specific words with placeholders
+
+        Pass a dict as ``slots`` to collect the replaced amounts, dates, client IDs
+        and OTP codes (lists of matched strings, in order).
+        """
         template = text
         
         # Replace Fido-specific template variables first
@@ -176,23 +395,23 @@ class SMSCategorizer:
         template = re.sub(r'\b\d{10,15}\b', '[PHONE]', template)
         
         # Replace GHS amounts (Ghana Cedis)
-        template = re.sub(r'ghs?\s*\d+(?:\.\d{2})?', '[GHS_AMOUNT]', template, flags=re.IGNORECASE)
-        template = re.sub(r'ghc?\s*\d+(?:\.\d{2})?', '[GHC_AMOUNT]', template, flags=re.IGNORECASE)
+        template = re.sub(r'ghs?\s*\d+(?:\.\d{2})?', _slot('[GHS_AMOUNT]', slots, 'amount'), template, flags=re.IGNORECASE)
+        template = re.sub(r'ghc?\s*\d+(?:\.\d{2})?', _slot('[GHC_AMOUNT]', slots, 'amount'), template, flags=re.IGNORECASE)
         
         # Replace general amounts/currency
-        template = re.sub(r'[\$£€¥₹]\s*\d+(?:\.\d{2})?', '[AMOUNT]', template)
-        template = re.sub(r'\b\d+(?:\.\d{2})?\s*(?:dollars?|cents?|pounds?|euros?|naira|cedis?)\b', '[AMOUNT]', template)
+        template = re.sub(r'[\$£€¥₹]\s*\d+(?:\.\d{2})?', _slot('[AMOUNT]', slots, 'amount'), template)
+        template = re.sub(r'\b\d+(?:\.\d{2})?\s*(?:dollars?|cents?|pounds?|euros?|naira|cedis?)\b', _slot('[AMOUNT]', slots, 'amount'), template)
         
         # Replace dates
-        template = re.sub(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', '[DATE]', template)
-        template = re.sub(r'\b\d{1,2}(?:st|nd|rd|th)?\s+(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{4}\b', '[DATE]', template, flags=re.IGNORECASE)
+        template = re.sub(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', _slot('[DATE]', slots, 'date'), template)
+        template = re.sub(r'\b\d{1,2}(?:st|nd|rd|th)?\s+(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{4}\b', _slot('[DATE]', slots, 'date'), template, flags=re.IGNORECASE)
         
         # Replace times
         template = re.sub(r'\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:AM|PM)?\b', '[TIME]', template)
         template = re.sub(r'\b\d{1,2}am\s*-\s*\d{1,2}pm\b', '[TIME_RANGE]', template, flags=re.IGNORECASE)
         
         # Replace Client IDs
-        template = re.sub(r'client id:\s*\w+', 'client id: [CLIENT_ID]', template, flags=re.IGNORECASE)
+        template = re.sub(r'client id:\s*(\w+)', _slot('client id: [CLIENT_ID]', slots, 'client_id', 1), template, flags=re.IGNORECASE)
         
         # Replace percentages
         template = re.sub(r'\b\d+(?:\.\d+)?%', '[PERCENTAGE]', template)
@@ -208,7 +427,7 @@ class SMSCategorizer:
         template = re.sub(r'\b\d+\s+(?:days?|weeks?|months?)\b', '[TIME_PERIOD]', template, flags=re.IGNORECASE)
         
         # Replace OTP codes (4-8 digits) - do this after other number replacements
-        template = re.sub(r'\b\d{4,8}\b', '[OTP_CODE]', template)
+        template = re.sub(r'\b\d{4,8}\b', _slot('[OTP_CODE]', slots, 'otp_code'), template)
         
         # Replace PIN patterns
         template = re.sub(r'_\s*_\s*_\s*_', '[PIN_PLACEHOLDER]', template)
@@ -232,6 +451,11 @@ class SMSCategorizer:
         if not messages:
             return []
         
+        # scikit-learn is only needed for clustering; importing it lazily keeps the
+        # categorize-only path (batch runner, Streamlit apps) fast to start
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.cluster import KMeans
+        
         # Preprocess messages
         processed_messages = [self.preprocess_text(msg) for msg in messages]
         
@@ -259,83 +483,316 @@ class SMSCategorizer:
             # If clustering fails, return all messages as one cluster
             return [0] * len(messages)
     
-    def analyze_sms_data(self, df, text_column='message', date_column=None):
-        """Main analysis function"""
+    def template_texts(self, df):
+        """Return the template strings of a result frame (compact frames only store template_id)"""
+        if 'template' in df.columns:
+            return df['template']
+        return pd.Series(self.template_dictionary.lookup(df['template_id'].to_numpy()),
+                         index=df.index, name='template')
+    
+    def analyze_sms_data(self, df, text_column='message', date_column=None, instrumentation=None,
+                         compact=False, keep_processed=None, clusterer=None):
+        """Main analysis function
+
+        With compact=True the result is stored memory-efficiently: category as a
+        Categorical, the template as an int32 ``template_id`` into
+        self.template_dictionary, and campaign_id in the smallest integer dtype.
+        processed_message is then dropped unless keep_processed=True. Identical
+        messages are also categorized and templated only once.
+
+        With a date_column, the batch's message counts per hour, category and
+        campaign are merged into self.time_rollup.
+
+        Pass an IncrementalCampaignClusterer as ``clusterer`` to assign messages to
+        its long-lived campaigns instead of clustering this batch from scratch.
+        """
+        instrumentation = instrumentation or NULL_INSTRUMENTATION
+        # Pin the rule pack so a concurrent reload can't mix rule versions in one run
+        pack = self.rule_pack
+        if keep_processed is None:
+            keep_processed = not compact
         print(f"Analyzing {len(df)} SMS messages...")
         
         # Preprocess messages
-        df['processed_message'] = df[text_column].apply(self.preprocess_text)
+        with instrumentation.stage('preprocess', rows=len(df)):
+            processed = df[text_column].apply(self.preprocess_text)
+            if keep_processed:
+                df['processed_message'] = processed
+            if compact:
+                codes, unique_messages = pd.factorize(processed, sort=False)
         
         # Pattern-based categorization
         print("Applying pattern-based categorization...")
-        df['category'] = df['processed_message'].apply(self.pattern_based_categorization)
+        with instrumentation.stage('categorize', rows=len(df)):
+            if compact:
+                category_index = {name: i for i, name in enumerate(pack.category_names)}
+                unique_codes = np.array([
+                    category_index[category] for category in self.categorize_processed(list(unique_messages), pack)
+                ], dtype=np.int8)
+                df['category'] = pd.Categorical.from_codes(unique_codes[codes], categories=pack.category_names)
+                df['rule_pack_hash'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8),
+                                                                 categories=[pack.short_hash])
+            else:
+                df['category'] = pd.Series(self.categorize_processed(processed.tolist(), pack), index=df.index)
+                df['rule_pack_hash'] = pack.short_hash
         
         # Extract templates for campaign identification
         print("Extracting message templates...")
-        df['template'] = df['processed_message'].apply(self.extract_template)
+        with instrumentation.stage('extract_template', rows=len(df)):
+            if compact:
+                unique_ids = self.template_dictionary.intern_many(
+                    [self.extract_template(text) for text in unique_messages]
+                )
+                df['template_id'] = unique_ids[codes]
+            else:
+                df['template'] = processed.apply(self.extract_template)
         
         # Find similar campaigns within each category
         print("Clustering similar campaigns...")
-        df['campaign_id'] = 0
-        campaign_counter = 0
+        with instrumentation.stage('cluster', rows=len(df)):
+            campaign_ids = np.zeros(len(df), dtype=np.int64)
+            campaign_counter = 0
+            # Row positions per category, computed once and reused for every category
+            positions = {} if clusterer is not None else group_positions(df['category'])
+            if clusterer is not None:
+                campaign_ids = clusterer.assign(self.template_texts(df).to_numpy(), df['category'].to_numpy())
+            
+            for category in self.categories.keys():
+                rows = positions.get(category)
+                if rows is not None and len(rows) > 1:
+                    if compact:
+                        category_messages = self.template_dictionary.lookup(df['template_id'].to_numpy()[rows]).tolist()
+                    else:
+                        category_messages = df['template'].to_numpy()[rows].tolist()
+                    clusters = self.cluster_similar_messages(category_messages)
+                    # Update campaign IDs
+                    campaign_ids[rows] = np.asarray(clusters) + campaign_counter
+                    campaign_counter += max(clusters) + 1 if len(clusters) > 0 else 0
+            
+            df['campaign_id'] = campaign_ids.astype(smallest_int_dtype(campaign_ids)) if compact else campaign_ids
         
-        for category in self.categories.keys():
-            category_messages = df[df['category'] == category]['template'].tolist()
-            if len(category_messages) > 1:
-                clusters = self.cluster_similar_messages(category_messages)
-                # Update campaign IDs
-                category_indices = df[df['category'] == category].index
-                df.loc[category_indices, 'campaign_id'] = [c + campaign_counter for c in clusters]
-                campaign_counter += max(clusters) + 1 if len(clusters) > 0 else 0
+        if self.template_tracker is not None:
+            with instrumentation.stage('template_tracker', rows=len(df)):
+                self.template_tracker.add(df['category'], self.template_texts(df))
+        
+        if date_column is not None:
+            with instrumentation.stage('rollup', rows=len(df)):
+                self.time_rollup.add(df[date_column], df['category'], self.campaign_labels(df))
         
         return df
     
-    def generate_report(self, df):
-        """Generate comprehensive analysis report"""
-        print("\n" + "="*50)
-        print("SMS CATEGORIZATION REPORT")
-        print("="*50)
+    def campaign_labels(self, df):
+        """Label each row's campaign with the campaign's most common template
+
+        campaign_id numbering restarts with every analysis run, so the label is what
+        identifies a campaign across batches and files.
+        """
+        template_key = 'template' if 'template' in df.columns else 'template_id'
+        sizes = df.groupby(['campaign_id', template_key], sort=False, observed=True).size()
+        # Stable sort keeps the first-seen template when counts tie
+        leaders = sizes.sort_values(ascending=False, kind='stable').reset_index()
+        leaders = leaders.drop_duplicates('campaign_id').set_index('campaign_id')[template_key]
+        if template_key == 'template_id':
+            leaders = pd.Series(self.template_dictionary.lookup(leaders.to_numpy()), index=leaders.index)
+        return df['campaign_id'].map(leaders)
+    
+    def generate_report(self, df, sample_templates=3, verbose=True, template_tracker=None):
+        """Generate comprehensive analysis report
+
+        Everything is derived from a single groupby over (category, campaign_id,
+        template), so the frame is scanned once however many categories there are.
+        Returns a JSON-serialisable dict; it is also printed unless verbose=False.
+
+        With a TemplateTracker (e.g. merged from streaming or parallel runs) the sample
+        templates come from its sketch estimates instead of the frame.
+        """
+        template_key = 'template' if 'template' in df.columns else 'template_id'
+        keys = ['category', 'campaign_id'] + ([template_key] if template_tracker is None else [])
+        groups = df.groupby(keys, sort=False, observed=True).size().rename('message_count').reset_index()
         
-        # Overall statistics
         total_messages = len(df)
-        print(f"\nTotal Messages Analyzed: {total_messages:,}")
-        
-        # Category breakdown
-        print("\nCATEGORY BREAKDOWN:")
-        category_counts = df['category'].value_counts()
-        for category, count in category_counts.items():
-            percentage = (count / total_messages) * 100
-            print(f"  {category}: {count:,} ({percentage:.1f}%)")
-        
-        # Campaign analysis
-        print("\nCAMPAIGN ANALYSIS:")
-        unique_campaigns = df.groupby(['category', 'campaign_id']).size().reset_index(name='message_count')
+        category_counts = groups.groupby('category', sort=False, observed=True)['message_count'].sum()
+        category_counts = category_counts[category_counts > 0].sort_values(ascending=False, kind='stable')
+        campaign_sizes = groups.groupby(['category', 'campaign_id'], sort=False, observed=True)['message_count'].sum()
+        if template_tracker is None:
+            template_sizes = groups.groupby(['category', template_key], sort=False, observed=True)['message_count'].sum()
+        
+        report = {
+            'total_messages': int(total_messages),
+            'rule_pack_hash': self._report_rule_pack_hash(df),
+            'category_counts': {str(c): int(n) for c, n in category_counts.items()},
+            'categories': [],
+            'sample_templates_source': 'exact' if template_tracker is None else 'sketch',
+            'campaigns': [
+                {'category': str(c), 'campaign_id': int(i), 'message_count': int(n)}
+                for (c, i), n in campaign_sizes.items()
+            ],
+        }
         
         for category in self.categories.keys():
-            if category in category_counts:
-                cat_campaigns = unique_campaigns[unique_campaigns['category'] == category]
-                print(f"\n{category} Campaigns:")
-                print(f"  Total campaigns identified: {len(cat_campaigns)}")
-                if len(cat_campaigns) > 0:
-                    print(f"  Average messages per campaign: {cat_campaigns['message_count'].mean():.1f}")
-                    print(f"  Largest campaign: {cat_campaigns['message_count'].max():,} messages")
-        
-        # Template examples
-        print("\nSAMPLE TEMPLATES BY CATEGORY:")
-        for category in self.categories.keys():
-            if category in category_counts:
-                templates = df[df['category'] == category]['template'].value_counts().head(3)
-                print(f"\n{category}:")
-                for template, count in templates.items():
-                    print(f"  [{count:,} msgs] {template[:100]}...")
-        
-        return category_counts, unique_campaigns
+            if category not in category_counts.index:
+                continue
+            sizes = campaign_sizes.xs(category, level='category')
+            if template_tracker is not None:
+                top = dict(template_tracker.top_templates(category, sample_templates))
+            else:
+                top = template_sizes.xs(category, level='category').sort_values(ascending=False, kind='stable')
+                top = top.head(sample_templates)
+                if template_key == 'template_id':
+                    top.index = self.template_dictionary.lookup(top.index.to_numpy())
+            report['categories'].append({
+                'category': category,
+                'message_count': int(category_counts[category]),
+                'percentage': float(category_counts[category] / total_messages * 100),
+                'campaigns': int(len(sizes)),
+                'mean_campaign_size': float(sizes.mean()) if len(sizes) else 0.0,
+                'largest_campaign': int(sizes.max()) if len(sizes) else 0,
+                'sample_templates': [{'template': str(t), 'message_count': int(n)} for t, n in top.items()],
+            })
+        
+        if verbose:
+            print_report(report)
+        return report
+    
+    def _report_rule_pack_hash(self, df):
+        if 'rule_pack_hash' not in df.columns or len(df) == 0:
+            return None
+        hashes = pd.unique(df['rule_pack_hash'])
+        return str(hashes[0]) if len(hashes) == 1 else [str(h) for h in hashes]
     
     def export_results(self, df, filename='sms_categorization_results.csv'):
         """Export results to CSV"""
-        export_df = df[['processed_message', 'category', 'campaign_id', 'template']].copy()
+        columns = [c for c in ['processed_message', 'category', 'campaign_id', 'template', 'rule_pack_hash']
+                   if c in df.columns]
+        export_df = df[columns].copy()
+        if 'template' not in df.columns:
+            export_df.insert(columns.index('campaign_id') + 1, 'template', self.template_texts(df))
         export_df.to_csv(filename, index=False)
         print(f"\nResults exported to {filename}")
+    
+    def normalize_results(self, df, text_column='message'):
+        """Split results into a template table and a per-row table of slot values
+
+        The template table has one row per distinct (template, category, campaign)
+        with its ``template_id`` and message count; client IDs in the template text
+        are replaced by ``[CLIENT_ID]``. The row table keeps, in the
+        frame's row order, that ``template_id`` plus the first amount (as a number),
+        date, client ID and OTP code that extract_template replaced in the message.
+        Returns (templates, rows).
+        """
+        if 'processed_message' in df.columns:
+            processed = df['processed_message']
+        else:
+            processed = df[text_column].map(self.preprocess_text)
+        # Slots are extracted once per distinct message
+        codes, unique_messages = pd.factorize(processed, sort=False)
+        slot_rows = []
+        for text in unique_messages:
+            slots = {}
+            self.extract_template(text, slots)
+            if 'client_id' not in slots:
+                # Preprocessing drops the colon extract_template looks for, so the ID is
+                # read here without changing the template text
+                match = _PROCESSED_CLIENT_ID.search(text)
+                if match:
+                    slots['client_id'] = [match.group(1)]
+            slot_rows.append({name: values[0] for name, values in slots.items()})
+        slot_frame = pd.DataFrame(slot_rows, columns=SLOT_COLUMNS).iloc[codes].reset_index(drop=True)
+        # 'string' dtype, so a frame without any amount (an all-None column) still has .str
+        amounts = slot_frame['amount'].astype('string').str.extract(r'(\d+(?:\.\d+)?)', expand=False)
+        slot_frame['amount'] = pd.to_numeric(amounts).astype(float)
+        
+        # Templates keep the literal client ID, so the table is keyed on the text with the
+        # ID replaced; otherwise every client would get its own template row
+        template_codes, unique_templates = pd.factorize(self.template_texts(df), sort=False)
+        normalized = np.array([_PROCESSED_CLIENT_ID.sub('client id [CLIENT_ID]', str(template))
+                               for template in unique_templates], dtype=object)
+        keys = pd.DataFrame({
+            'template': normalized[template_codes],
+            'category': np.asarray(df['category'], dtype=object),
+            'campaign_id': df['campaign_id'].to_numpy(),
+        })
+        entry_ids, _ = pd.factorize(pd.MultiIndex.from_frame(keys), sort=False)
+        templates = keys.assign(template_id=entry_ids).groupby('template_id', sort=True).agg(
+            template=('template', 'first'), category=('category', 'first'),
+            campaign_id=('campaign_id', 'first'), message_count=('template', 'size')
+        ).reset_index()
+        rows = pd.concat([pd.Series(entry_ids.astype(smallest_int_dtype(entry_ids)), name='template_id'), slot_frame],
+                         axis=1)
+        return templates, rows
+    
+    def export_normalized(self, df, text_column='message', templates_file='sms_templates.csv',
+                          rows_file='sms_rows.csv'):
+        """Export results as a template table plus a row table of template IDs and slot values"""
+        templates, rows = self.normalize_results(df, text_column)
+        templates.to_csv(templates_file, index=False)
+        rows.to_csv(rows_file, index=False)
+        print(f"\nNormalized results exported to {templates_file} ({len(templates)} templates) "
+              f"and {rows_file} ({len(rows)} rows)")
+        return templates, rows
+    
+    def export_sqlite(self, df, path, text_column='message', source_file=None, date_column=None):
+        """Add results to a SQLite ResultStore (indexed by category, campaign, template, file and date)"""
+        with ResultStore(path) as store:
+            rows = store.add(df, text_column, templates=self.template_texts(df), source_file=source_file,
+                             date_column=date_column)
+        print(f"\nResults stored in {path} ({rows} rows)")
+        return rows
+
+
+# Slot values extract_template can report, in export column order
+SLOT_COLUMNS = ['amount', 'date', 'client_id', 'otp_code']
+# Client IDs as they appear in preprocessed text ("client id fid123456")
+_PROCESSED_CLIENT_ID = re.compile(r'client id:?\s*(\w+)', re.IGNORECASE)
+
+
+def _slot(placeholder, slots, name, group=0):
+    """re.sub replacement for extract_template that also records the replaced value"""
+    if slots is None:
+        return placeholder
+    
+    def replace(match):
+        slots.setdefault(name, []).append(match.group(group))
+        return placeholder
+    return replace
+
+
+def group_positions(values):
+    """Map each distinct value to the (sorted) row positions holding it, in one pass"""
+    codes, uniques = pd.factorize(values, sort=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+    order = order[len(codes) - bounds[-1]:] if len(uniques) else order[:0]
+    return dict(zip(uniques, np.split(order, bounds[:-1])))
+
+
+def print_report(report):
+    """Print a report returned by SMSCategorizer.generate_report"""
+    print("\n" + "="*50)
+    print("SMS CATEGORIZATION REPORT")
+    print("="*50)
+    
+    total_messages = report['total_messages']
+    print(f"\nTotal Messages Analyzed: {total_messages:,}")
+    
+    print("\nCATEGORY BREAKDOWN:")
+    for category, count in report['category_counts'].items():
+        percentage = (count / total_messages) * 100
+        print(f"  {category}: {count:,} ({percentage:.1f}%)")
+    
+    print("\nCAMPAIGN ANALYSIS:")
+    for entry in report['categories']:
+        print(f"\n{entry['category']} Campaigns:")
+        print(f"  Total campaigns identified: {entry['campaigns']}")
+        if entry['campaigns'] > 0:
+            print(f"  Average messages per campaign: {entry['mean_campaign_size']:.1f}")
+            print(f"  Largest campaign: {entry['largest_campaign']:,} messages")
+    
+    print("\nSAMPLE TEMPLATES BY CATEGORY:")
+    for entry in report['categories']:
+        print(f"\n{entry['category']}:")
+        for sample in entry['sample_templates']:
+            print(f"  [{sample['message_count']:,} msgs] {sample['template'][:100]}...")
 
 # Example usage and testing
 if __name__ == "__main__":
@@ -361,15 +818,15 @@ if __name__ == "__main__":
         'timestamp': pd.date_range('2024-01-01', periods=len(sample_messages), freq='H')
     })
     
-    # Initialize categorizer
-    categorizer = SMSCategorizer()
+    # Initialize categorizer (sample templates come from its streaming tracker)
+    categorizer = SMSCategorizer(track_templates=True)
     
     # Analyze sample data
     print("Testing SMS Categorizer with sample data...")
     analyzed_df = categorizer.analyze_sms_data(sample_df, text_column='message')
     
     # Generate report
-    categorizer.generate_report(analyzed_df)
+    categorizer.generate_report(analyzed_df, template_tracker=categorizer.template_tracker)
     
     print("\n" + "="*50)
     print("DETAILED RESULTS:")
@@ -0,0 +1,265 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+# Jobs smaller than this are categorized on the job thread; shipping them to
+# worker processes would cost more than it saves
+MIN_PROCESS_MESSAGES = 20_000
+
+# Finished results kept by a JobManager beyond the newest one; the oldest are evicted first
+MAX_RESULT_BYTES = 64 * 2 ** 20
+
+# One categorizer per rule pack in each worker process, built on first use
+_worker_categorizers = {}
+
+
+def _warm_worker():
+    """Pool initializer: import the categorizer and build the default rules up front"""
+    from categorization import SMSCategorizer
+    categorizer = SMSCategorizer()
+    _worker_categorizers[categorizer.rule_pack.short_hash] = categorizer
+
+
+def _noop():
+    pass
+
+
+def _categorize_chunk(rule_pack, messages):
+    """Categorize one chunk in a worker process with the job's pinned rule pack"""
+    from categorization import SMSCategorizer
+    categorizer = _worker_categorizers.get(rule_pack.short_hash)
+    if categorizer is None:
+        categorizer = _worker_categorizers[rule_pack.short_hash] = SMSCategorizer(rule_pack=rule_pack)
+    return categorizer.categorize_messages(messages, rule_pack)
+
+
+class CategorizationJob:
+    """State of one background categorization run
+
+    Chunks are appended to ``chunks`` in input order; chunks finished out of order
+    (by worker processes) wait in ``pending`` until the gap before them is filled.
+    ``done`` and ``counts`` are updated as soon as any chunk finishes, so a UI can
+    render progress and partial results while the job runs. When the job finishes
+    the input messages are released and the categories are kept as one compact
+    Categorical in ``result``.
+    """
+
+    def __init__(self, key, messages, chunk_size, rule_pack=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        # The pack active at submission is used for every chunk, even if the rules
+        # are hot-reloaded while the job runs
+        self.rule_pack = rule_pack
+        self.messages = messages
+        self.total = len(messages)
+        self.chunk_size = chunk_size
+        self.done = 0
+        self.counts = Counter()
+        self.chunks = []
+        self.pending = {}
+        self.result = None
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'cancelled', 'failed')
+
+    def progress(self):
+        """Return the completed fraction between 0 and 1"""
+        return self.done / self.total if self.total else 1.0
+
+    def partial_counts(self):
+        """Return a snapshot of the category counts accumulated so far"""
+        with self._lock:
+            return dict(self.counts)
+
+    def categories(self):
+        """Return the categories of every completed row, in input order"""
+        with self._lock:
+            if self.result is not None:
+                return np.asarray(self.result, dtype=object)
+            return [category for chunk in self.chunks for category in chunk]
+
+    @property
+    def nbytes(self):
+        """Memory held by the finished result (0 while the job runs)"""
+        return 0 if self.result is None else int(self.result.nbytes)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _add_chunk(self, categories, index=None):
+        with self._lock:
+            self.pending[len(self.chunks) if index is None else index] = categories
+            self.counts.update(categories)
+            self.done += len(categories)
+            while len(self.chunks) in self.pending:
+                self.chunks.append(self.pending.pop(len(self.chunks)))
+
+    def _finish(self, status):
+        # Results are compacted before the status flips, so a finished job always has them
+        with self._lock:
+            self.result = pd.Categorical([category for chunk in self.chunks for category in chunk])
+            self.chunks = []
+            self.pending = {}
+            self.messages = None
+            self.finished_at = time.time()
+            self.status = status
+
+
+class JobManager:
+    """Run categorization jobs on a small worker pool and keep them addressable by ID
+
+    Finished jobs are kept (up to ``max_jobs``, and while their results fit in
+    ``max_result_bytes``) so that a rerun or a browser refresh can pick the results
+    up again with the job ID. The newest finished job is always kept.
+
+    Large jobs fan their chunks out to a process pool of ``processes`` workers
+    (default: one per CPU) that is shared by every job and kept warm for the life
+    of the manager. Set ``processes`` to 0 or 1 to categorize on the job threads only.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=20, processes=None, max_result_bytes=MAX_RESULT_BYTES):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sms-job')
+        self.max_jobs = max_jobs
+        self.max_result_bytes = max_result_bytes
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def submit(self, key, messages, categorizer, chunk_size=None):
+        """Queue a job categorizing ``messages`` (a pandas Series) and return it"""
+        if chunk_size is None:
+            chunk_size = max(500, min(20_000, len(messages) // 50 or 1))
+            if self._use_processes(len(messages)):
+                # Enough chunks to keep every worker busy and progress moving
+                chunk_size = max(500, min(chunk_size, -(-len(messages) // (self.processes * 4))))
+        job = CategorizationJob(key, messages, chunk_size, getattr(categorizer, 'rule_pack', None))
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, categorizer)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def find(self, key):
+        """Return the most recent job for ``key`` that has not failed or been cancelled"""
+        with self._lock:
+            candidates = [job for job in self.jobs.values()
+                          if job.key == key and job.status not in ('cancelled', 'failed')]
+        return max(candidates, key=lambda job: job.created_at) if candidates else None
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _use_processes(self, total):
+        return self.processes > 1 and total >= MIN_PROCESS_MESSAGES
+
+    def process_pool(self):
+        """Return the shared worker process pool, starting (and warming) it on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a server process that runs threads is not safe
+                self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_warm_worker)
+            return self._pool
+
+    def warm(self):
+        """Start every worker process now instead of on the first large job"""
+        if self.processes > 1:
+            pool = self.process_pool()
+            for _ in range(self.processes):
+                pool.submit(_noop)
+
+    def _discard_pool(self, pool):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.created_at)
+        size = sum(job.nbytes for job in finished)
+        while finished and (len(self.jobs) > self.max_jobs or (size > self.max_result_bytes and len(finished) > 1)):
+            job = finished.pop(0)
+            size -= job.nbytes
+            del self.jobs[job.id]
+
+    def _run(self, job, categorizer):
+        job.status = 'running'
+        status = 'failed'
+        try:
+            starts = range(0, job.total, job.chunk_size)
+            if self._use_processes(job.total) and job.rule_pack is not None:
+                starts = self._run_in_processes(job, starts)
+            for start in starts:
+                if job._cancel.is_set():
+                    break
+                batch = job.messages.iloc[start:start + job.chunk_size]
+                job._add_chunk([
+                    categorizer.pattern_based_categorization(categorizer.preprocess_text(str(x)), job.rule_pack)
+                    for x in batch
+                ], start // job.chunk_size)
+            status = 'cancelled' if job._cancel.is_set() else 'done'
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job._finish(status)
+            with self._lock:
+                self._prune()
+
+    def _run_in_processes(self, job, starts):
+        """Categorize chunks on the process pool; returns the chunk starts left for the job thread
+
+        At most two chunks per worker are in flight, so a cancelled job stops
+        quickly and a big upload isn't pickled to the workers all at once. If the
+        pool breaks (e.g. a worker is killed), the unfinished chunks are handed back.
+        """
+        pool = self.process_pool()
+        queued = list(starts)
+        in_flight = {}
+        try:
+            while (queued or in_flight) and not job._cancel.is_set():
+                while queued and len(in_flight) < self.processes * 2:
+                    start = queued.pop(0)
+                    messages = [str(x) for x in job.messages.iloc[start:start + job.chunk_size]]
+                    in_flight[pool.submit(_categorize_chunk, job.rule_pack, messages)] = start
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    categories = future.result()
+                    job._add_chunk(categories, in_flight.pop(future) // job.chunk_size)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            return sorted(queued + list(in_flight.values()))
+        for future in in_flight:
+            future.cancel()
+        return []
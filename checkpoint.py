@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+JOURNAL = 'journal.jsonl'
+# Input rows per committed chunk for files that can be streamed (CSV)
+CHECKPOINT_ROWS = 100_000
+# Bumped whenever the journal layout changes
+JOURNAL_FORMAT = 1
+
+
+def _fsync_write(path, write):
+    """Write a file through ``write(f)`` and make it durable before it appears under ``path``"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def file_signature(file_path):
+    """Size and modification time, used to notice inputs that changed between runs"""
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+class BatchCheckpoint:
+    """Durable partial outputs and a progress journal for a batch run
+
+    Each committed file or chunk is written to ``parts/`` (fsynced, then renamed
+    into place) before a line recording it is appended to ``journal.jsonl``. A
+    record therefore only exists for results that are safely on disk, and a crash
+    at any point loses at most the chunk being processed. The first journal line
+    describes the run (input folder, rule pack, output file) so a resume can
+    refuse to mix results from different runs.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.journal_path = os.path.join(directory, JOURNAL)
+        self.run = None
+        self.records = []
+
+    def _part_path(self, name):
+        return os.path.join(self.directory, 'parts', name)
+
+    def exists(self):
+        return os.path.exists(self.journal_path)
+
+    def start(self, folder_path, rule_pack_hash, output_file=None):
+        """Begin a fresh run, discarding any previous checkpoint in the directory"""
+        self._clear()
+        os.makedirs(self._part_path(''), exist_ok=True)
+        self.run = {'format': JOURNAL_FORMAT, 'folder': os.path.abspath(folder_path),
+                    'rule_pack_hash': rule_pack_hash, 'output_file': output_file, 'started_at': time.time()}
+        self.records = []
+        self._append(self.run)
+        return self
+
+    def resume(self, folder_path, rule_pack_hash):
+        """Load the journal of an interrupted run; raises if it belongs to a different run"""
+        with open(self.journal_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A line torn by the crash; everything before it is intact
+                break
+        run, self.records = records[0], records[1:]
+        if run.get('format') != JOURNAL_FORMAT:
+            raise ValueError(f"Unsupported checkpoint journal format in {self.journal_path}")
+        if run['folder'] != os.path.abspath(folder_path):
+            raise ValueError(f"Checkpoint belongs to folder {run['folder']}, not {folder_path}")
+        if run['rule_pack_hash'] != rule_pack_hash:
+            raise ValueError(f"Checkpoint was made with rule pack {run['rule_pack_hash']}, "
+                             f"this run uses {rule_pack_hash}")
+        self.run = run
+        # Rewrite the journal without a torn tail so new records start on a clean line
+        if len(records) < len(lines):
+            _fsync_write(self.journal_path, lambda f: f.writelines(json.dumps(r) + '\n' for r in records))
+        return self
+
+    def _append(self, record):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def progress(self, file_path):
+        """Return (source rows committed, file finished) for an input file
+
+        Records made while the file had a different size or mtime are ignored, so a
+        file that was replaced since the crash is processed again from the start.
+        """
+        rows, finished = 0, False
+        for record in self.file_records(file_path):
+            rows = record['start'] + record['source_rows']
+            finished = finished or record['final']
+        return rows, finished
+
+    def file_records(self, file_path):
+        """Records committed for the current version of an input file"""
+        path = os.path.abspath(file_path)
+        signature = file_signature(file_path)
+        return [record for record in self.records
+                if record['file'] == path and record['size'] == signature['size']
+                and record['mtime'] == signature['mtime']]
+
+    def commit(self, file_path, results, start, source_rows, final):
+        """Durably store the results for ``source_rows`` input rows starting at ``start``
+
+        ``results`` may be None when the chunk had no valid messages.
+        """
+        part = None
+        if results is not None and len(results):
+            part = f"part-{len(self.records):06d}.csv"
+            _fsync_write(self._part_path(part), lambda f: results.to_csv(f, index=False))
+        record = dict(file_signature(file_path), file=os.path.abspath(file_path), start=start,
+                      source_rows=source_rows, final=final, part=part,
+                      results=0 if results is None else len(results), committed_at=time.time())
+        self._append(record)
+        self.records.append(record)
+        return record
+
+    def load_results(self, file_path):
+        """Read back the committed results of one input file, in row order"""
+        return [pd.read_csv(self._part_path(record['part']))
+                for record in self.file_records(file_path) if record['part']]
+
+    def _clear(self):
+        # Only what this class writes is deleted: the journal and the part files (and
+        # their temporaries), never other files that happen to share the directory
+        parts = self._part_path('')
+        if os.path.isdir(parts):
+            for name in os.listdir(parts):
+                if name.startswith('part-') or name.endswith('.tmp'):
+                    os.remove(os.path.join(parts, name))
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        try:
+            os.rmdir(parts)
+        except OSError:
+            pass
+
+    def remove(self):
+        """Delete the checkpoint, and its directory if nothing else is left in it"""
+        self._clear()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
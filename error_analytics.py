@@ -0,0 +1,175 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Values the SMS gateway writes into ErrorName for messages that were delivered
+NO_ERROR_VALUES = ('', 'No Error (code 0 )')
+
+DIMENSIONS = ('category', 'campaign', 'template', 'window')
+
+
+def find_error_column(columns, name='ErrorName'):
+    """Return the column matching ``name`` ignoring case and spaces, or None
+
+    Only the column labels are normalised, so the frame itself is never copied.
+    """
+    target = name.strip().lower().replace(' ', '')
+    for column in columns:
+        if str(column).strip().lower().replace(' ', '') == target:
+            return column
+    return None
+
+
+def find_date_column(df):
+    """Find the column holding when each message was sent, if the export has one"""
+    for col in df.columns:
+        name = str(col).lower()
+        if col != 'processing_timestamp' and ('date' in name or 'time' in name or 'sent' in name):
+            return col
+    return None
+
+
+def error_mask(errors):
+    """Return a boolean array marking rows that carry a delivery error
+
+    The string checks run once per distinct error value rather than once per row.
+    """
+    codes, uniques = pd.factorize(pd.Series(errors), sort=False)
+    stripped = pd.Index(uniques).astype(str).str.strip()
+    is_error = ~stripped.isin(NO_ERROR_VALUES)
+    # NaN rows get code -1, which maps onto the trailing False
+    return np.append(np.asarray(is_error, dtype=bool), False)[codes]
+
+
+class ErrorAnalytics:
+    """Streaming delivery-error counts by category, campaign, template and time window
+
+    Feed it one batch (or file) at a time with ``add``; only per-key message and error
+    counts are kept, so batches never have to be concatenated. Accumulators from
+    different workers or files combine with ``merge``.
+    """
+
+    def __init__(self, freq='h'):
+        self.freq = freq
+        self.messages = 0
+        self.errors = 0
+        self.counts = {}
+        self.error_names = pd.Series(dtype='int64', name='Count')
+
+    def add(self, errors, category=None, campaign=None, template=None, timestamps=None):
+        """Count one batch; every breakdown argument is optional and aligned with ``errors``"""
+        is_error = error_mask(errors)
+        self.messages += len(is_error)
+        self.errors += int(is_error.sum())
+
+        keys = {'category': category, 'campaign': campaign, 'template': template}
+        if timestamps is not None:
+            keys['window'] = pd.to_datetime(pd.Series(timestamps), errors='coerce').dt.floor(self.freq)
+        for dimension, values in keys.items():
+            if values is None:
+                continue
+            batch = pd.DataFrame({dimension: np.asarray(values), 'errors': is_error})
+            counts = batch.groupby(dimension, sort=False, observed=True)['errors'].agg(['size', 'sum'])
+            counts.columns = ['messages', 'errors']
+            self._combine(dimension, counts)
+
+        names = pd.Series(np.asarray(errors, dtype=object)[is_error]).astype(str).str.strip()
+        self._add_error_names(names.value_counts(sort=False))
+        return self
+
+    def add_frame(self, df, error_column=None, categorizer=None, category_column=None, date_column=None):
+        """Count a result frame from analyze_sms_data or the batch categorizer
+
+        Campaign and template breakdowns need the categorizer that produced the frame
+        (campaigns are labelled by their most common template).
+        """
+        error_column = error_column or find_error_column(df.columns)
+        if error_column is None:
+            raise ValueError("No ErrorName column found to analyze")
+        if category_column is None:
+            category_column = 'category' if 'category' in df.columns else 'predicted_category'
+        category = df[category_column] if category_column in df.columns else None
+        campaign = template = None
+        if categorizer is not None and 'campaign_id' in df.columns:
+            campaign = categorizer.campaign_labels(df)
+            template = categorizer.template_texts(df)
+        timestamps = df[date_column] if date_column is not None else None
+        return self.add(df[error_column], category, campaign, template, timestamps)
+
+    def merge(self, other):
+        """Add another accumulator's counts into this one (in place)"""
+        if other.freq != self.freq:
+            raise ValueError(f"Cannot merge error analytics at {other.freq!r} into {self.freq!r} windows")
+        self.messages += other.messages
+        self.errors += other.errors
+        for dimension, counts in other.counts.items():
+            self._combine(dimension, counts)
+        self._add_error_names(other.error_names)
+        return self
+
+    def relabel(self, dimension, labels):
+        """Rename the keys of one breakdown (e.g. campaign IDs to names); keys given the same label are summed"""
+        counts = self.counts.get(dimension)
+        if counts is not None:
+            self.counts[dimension] = counts.rename(index=labels).groupby(level=0, sort=False).sum()
+        return self
+
+    def _combine(self, dimension, counts):
+        existing = self.counts.get(dimension)
+        if existing is not None:
+            counts = pd.concat([existing, counts]).groupby(level=0, sort=False).sum()
+        self.counts[dimension] = counts.astype('int64')
+
+    def _add_error_names(self, counts):
+        if len(counts) == 0:
+            return
+        combined = pd.concat([self.error_names, counts]) if len(self.error_names) else counts
+        self.error_names = combined.groupby(level=0, sort=False).sum().astype('int64').rename('Count')
+
+    @property
+    def error_rate(self):
+        return self.errors / self.messages if self.messages else 0.0
+
+    def rates(self, dimension, min_messages=1):
+        """Return messages, errors and error_rate per key of ``dimension``, worst first"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r}; expected one of {DIMENSIONS}")
+        counts = self.counts.get(dimension)
+        if counts is None:
+            return pd.DataFrame(columns=[dimension, 'messages', 'errors', 'error_rate'])
+        table = counts[counts['messages'] >= min_messages].copy()
+        table['error_rate'] = table['errors'] / table['messages']
+        if dimension == 'window':
+            table = table.sort_index()
+        else:
+            table = table.sort_values(['error_rate', 'messages'], ascending=False, kind='stable')
+        return table.rename_axis(dimension).reset_index()
+
+    def error_distribution(self):
+        """Return the ErrorName / Count / Percentage table (percentage of all messages)"""
+        table = self.error_names.sort_values(ascending=False, kind='stable').rename_axis('ErrorName').reset_index()
+        table['Percentage'] = (table['Count'] / max(self.messages, 1) * 100).round(2)
+        return table
+
+    def report(self, top=20):
+        """Return a JSON-serialisable summary with the ``top`` worst keys per dimension"""
+        summary = {
+            'messages': int(self.messages),
+            'errors': int(self.errors),
+            'error_rate': float(self.error_rate),
+            'error_names': {str(k): int(v) for k, v in self.error_names.items()},
+        }
+        for dimension in DIMENSIONS:
+            if dimension not in self.counts:
+                continue
+            table = self.rates(dimension)
+            if dimension != 'window':
+                table = table.head(top)
+            table[dimension] = table[dimension].astype(str)
+            summary[dimension] = table.to_dict(orient='records')
+        return summary
+
+    def write_json(self, path, top=20):
+        with open(path, 'w') as f:
+            json.dump(self.report(top), f, indent=2)
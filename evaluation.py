@@ -0,0 +1,209 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from categorization import SMSCategorizer
+
+
+def rule_backend(categorizer=None, rule_pack=None, early_exit=True):
+    """Backend running the rule engine; early_exit=False scores every pattern"""
+    categorizer = categorizer or SMSCategorizer(rule_pack=rule_pack, early_exit=early_exit)
+    return lambda messages: categorizer.categorize_messages(messages)
+
+
+def linear_backend(model, rule_pack=None):
+    """Backend predicting with a distilled linear model, falling back to the rules"""
+    if model is None:
+        raise ValueError("The linear backend needs a trained model (--model)")
+    categorizer = SMSCategorizer(rule_pack=rule_pack, backend='linear', linear_model=model)
+    return lambda messages: categorizer.categorize_messages(messages)
+
+
+# Named backends for the command line; each factory returns messages -> categories
+BACKENDS = {
+    'rules': lambda rules=None, model=None: rule_backend(rule_pack=rules),
+    'rules-exhaustive': lambda rules=None, model=None: rule_backend(rule_pack=rules, early_exit=False),
+    'linear': lambda rules=None, model=None: linear_backend(model, rule_pack=rules),
+}
+
+
+def make_backend(name, rules=None, model=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](rules, model)
+
+
+def run_backend(backend, messages, repeat=1):
+    """Run a backend over ``messages``; returns (predictions, best wall time in seconds)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predictions = np.asarray(backend(messages), dtype=object)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if len(predictions) != len(messages):
+        raise ValueError(f"Backend returned {len(predictions)} predictions for {len(messages)} messages")
+    return predictions, best
+
+
+def confusion_matrix(labels, predictions):
+    """Return a labels x predictions count table over the union of both label sets"""
+    names = sorted(set(labels) | set(predictions))
+    table = pd.crosstab(pd.Categorical(labels, categories=names), pd.Categorical(predictions, categories=names),
+                        rownames=['actual'], colnames=['predicted'], dropna=False)
+    return table.reindex(index=names, columns=names, fill_value=0)
+
+
+def per_category_scores(confusion):
+    """Precision, recall, F1 and support per category from a confusion matrix"""
+    counts = confusion.to_numpy()
+    true_positives = np.diag(counts).astype(float)
+    predicted = counts.sum(axis=0)
+    actual = counts.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(actual > 0, true_positives / actual, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return pd.DataFrame({'precision': precision, 'recall': recall, 'f1': f1, 'support': actual},
+                        index=confusion.index).rename_axis('category')
+
+
+def evaluate(backend, messages, labels, name='backend', repeat=1):
+    """Score a backend against labels and time it in the same run
+
+    Returns a dict with the predictions, accuracy, confusion matrix, per-category
+    precision/recall and throughput (msgs/sec, best of ``repeat`` runs).
+    """
+    messages = list(messages)
+    labels = np.asarray(labels, dtype=object).astype(str)
+    predictions, seconds = run_backend(backend, messages, repeat)
+    predictions = predictions.astype(str)
+    confusion = confusion_matrix(labels, predictions)
+    return {
+        'name': name,
+        'messages': len(messages),
+        'accuracy': float((predictions == labels).mean()) if len(messages) else 0.0,
+        'seconds': seconds,
+        'msgs_per_sec': len(messages) / seconds if seconds else float('inf'),
+        'confusion': confusion,
+        'per_category': per_category_scores(confusion),
+        'predictions': predictions,
+    }
+
+
+def diff_backends(backend_a, backend_b, messages, names=('a', 'b'), repeat=1):
+    """Run two backends over the same messages and return every row where they disagree
+
+    Returns (diff frame, summary dict). An empty diff proves the backends are
+    output-identical on this corpus.
+    """
+    messages = list(messages)
+    predictions_a, seconds_a = run_backend(backend_a, messages, repeat)
+    predictions_b, seconds_b = run_backend(backend_b, messages, repeat)
+    differs = predictions_a != predictions_b
+    rows = np.flatnonzero(differs)
+    diff = pd.DataFrame({
+        'row': rows,
+        'message': [messages[i] for i in rows],
+        names[0]: predictions_a[rows],
+        names[1]: predictions_b[rows],
+    })
+    summary = {
+        'messages': len(messages),
+        'differences': int(differs.sum()),
+        'identical': not differs.any(),
+        f'{names[0]}_msgs_per_sec': len(messages) / seconds_a if seconds_a else float('inf'),
+        f'{names[1]}_msgs_per_sec': len(messages) / seconds_b if seconds_b else float('inf'),
+    }
+    return diff, summary
+
+
+def format_evaluation(result):
+    """Return an evaluation result as printable lines"""
+    lines = [
+        f"Backend: {result['name']}",
+        f"Messages: {result['messages']:,}  Accuracy: {result['accuracy'] * 100:.2f}%  "
+        f"Throughput: {result['msgs_per_sec']:,.0f} msgs/sec",
+        "",
+        "Per-category scores:",
+        result['per_category'].round(3).to_string(),
+        "",
+        "Confusion matrix (rows = actual, columns = predicted):",
+        result['confusion'].to_string(),
+    ]
+    return lines
+
+
+def evaluation_summary(result):
+    """JSON-serialisable view of an evaluation result (without the predictions)"""
+    return {
+        'name': result['name'],
+        'messages': result['messages'],
+        'accuracy': result['accuracy'],
+        'seconds': result['seconds'],
+        'msgs_per_sec': result['msgs_per_sec'],
+        'per_category': result['per_category'].reset_index().to_dict(orient='records'),
+        'confusion': {str(k): {str(c): int(v) for c, v in row.items()}
+                      for k, row in result['confusion'].to_dict(orient='index').items()},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate categorizer backends on a labelled corpus")
+    parser.add_argument('corpus', help="Labelled CSV/Excel file")
+    parser.add_argument('--text-column', default='message', help="Column holding the SMS text")
+    parser.add_argument('--label-column', default='label', help="Column holding the expected category")
+    parser.add_argument('--backend', default='rules', choices=sorted(BACKENDS), help="Backend to evaluate")
+    parser.add_argument('--compare', choices=sorted(BACKENDS),
+                        help="Second backend to diff against row by row")
+    parser.add_argument('--rules', help="YAML rule pack for rule-based backends")
+    parser.add_argument('--model', help="Trained DistilledLinearModel file for the linear backend")
+    parser.add_argument('--repeat', type=int, default=1, help="Time the best of N runs")
+    parser.add_argument('--diff-output', help="Write rows where the backends disagree to this CSV")
+    parser.add_argument('--report-json', help="Write the evaluation summary as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.corpus.endswith('.csv'):
+        df = pd.read_csv(args.corpus)
+    else:
+        df = pd.read_excel(args.corpus)
+    df = df.dropna(subset=[args.text_column, args.label_column])
+    messages = df[args.text_column].astype(str).tolist()
+
+    result = evaluate(make_backend(args.backend, args.rules, args.model), messages, df[args.label_column],
+                      args.backend, args.repeat)
+    print("\n".join(format_evaluation(result)))
+    report = {'evaluation': evaluation_summary(result)}
+
+    if args.compare:
+        # The first backend's predictions are already known, so only time the second
+        compare = make_backend(args.compare, args.rules, args.model)
+        diff, summary = diff_backends(lambda _: result['predictions'], compare, messages,
+                                      (args.backend, args.compare), args.repeat)
+        summary[f'{args.backend}_msgs_per_sec'] = result['msgs_per_sec']
+        print(f"\nDiff {args.backend} vs {args.compare}: {summary['differences']:,} of "
+              f"{summary['messages']:,} rows differ "
+              f"({summary[f'{args.compare}_msgs_per_sec']:,.0f} msgs/sec for {args.compare})")
+        if summary['identical']:
+            print("✅ Outputs are identical")
+        else:
+            print(diff.head(20).to_string(index=False))
+        if args.diff_output:
+            diff.to_csv(args.diff_output, index=False)
+            print(f"Diff written to: {args.diff_output}")
+        report['diff'] = summary
+
+    if args.report_json:
+        with open(args.report_json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to: {args.report_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Excel's hard limit is 1,048,576 rows per sheet, one of which is the header
+MAX_SHEET_ROWS = 1_048_575
+SHEET_NAME = 'Categorized_SMS'
+SUMMARY_SHEET = 'Category_Summary'
+
+
+def _frames(data, chunk_rows):
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+    else:
+        yield from data
+
+
+def write_excel(path, data, category_column='Predicted_Category', sheet_name=SHEET_NAME,
+                max_rows=MAX_SHEET_ROWS, chunk_rows=50_000):
+    """Write results to an .xlsx file in xlsxwriter's constant-memory mode
+
+    ``data`` is a DataFrame or an iterable of DataFrame chunks with the same
+    columns (e.g. ``pd.read_csv(..., chunksize=...)``), so a large CSV can be
+    converted without loading it. Rows are written in order and flushed to disk
+    row by row. Each sheet holds up to ``max_rows`` data rows and the next one
+    (``<sheet_name>_2``, ...) continues where it stopped. A summary sheet lists
+    the category counts and the row range of every data sheet.
+
+    Returns the list of (sheet, first row, last row) written.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False,
+                                          'strings_to_formulas': False,
+                                          'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+    bold = workbook.add_format({'bold': True})
+    sheets = []
+    counts = pd.Series(dtype=np.int64)
+    columns = None
+    worksheet = None
+    sheet_row = 0
+    total = 0
+    try:
+        for frame in _frames(data, chunk_rows):
+            if columns is None:
+                columns = [str(c) for c in frame.columns]
+            if category_column in frame.columns:
+                counts = counts.add(frame[category_column].value_counts(), fill_value=0)
+            # Blank cells for missing values; xlsxwriter rejects NaN numbers
+            values = frame.astype(object).where(frame.notna(), None).to_numpy()
+            position = 0
+            while position < len(values):
+                if worksheet is None or sheet_row > max_rows:
+                    name = sheet_name if not sheets else f"{sheet_name}_{len(sheets) + 1}"
+                    worksheet = workbook.add_worksheet(name[:31])
+                    worksheet.write_row(0, 0, columns, bold)
+                    sheets.append([name[:31], total + 1, total])
+                    sheet_row = 1
+                take = min(len(values) - position, max_rows - sheet_row + 1)
+                for row in values[position:position + take]:
+                    worksheet.write_row(sheet_row, 0, row)
+                    sheet_row += 1
+                position += take
+                total += take
+                sheets[-1][2] = total
+
+        if worksheet is None:
+            # Nothing to write: still produce a valid workbook with the header
+            worksheet = workbook.add_worksheet(sheet_name[:31])
+            worksheet.write_row(0, 0, columns or [], bold)
+            sheets.append([sheet_name[:31], 0, 0])
+
+        summary = workbook.add_worksheet(SUMMARY_SHEET)
+        summary.write_row(0, 0, ['Category', 'Count', 'Percentage'], bold)
+        row = 1
+        for category, count in counts.sort_values(ascending=False).items():
+            summary.write_row(row, 0, [str(category), int(count), round(count / total * 100, 2) if total else 0])
+            row += 1
+        row += 1
+        summary.write_row(row, 0, ['Total messages', total], bold)
+        row += 2
+        summary.write_row(row, 0, ['Sheet', 'First row', 'Last row'], bold)
+        for name, first, last in sheets:
+            row += 1
+            summary.write_row(row, 0, [name, first, last])
+    finally:
+        workbook.close()
+    return [tuple(sheet) for sheet in sheets]
+
+
+def excel_bytes(data, **options):
+    """Build the .xlsx for a download; the workbook is streamed through a temporary file"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_excel(tmp_path, data, **options)
+        with open(tmp_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
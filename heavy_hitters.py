@@ -0,0 +1,194 @@
+import hashlib
+import heapq
+
+import numpy as np
+import pandas as pd
+
+_KEY_SEPARATOR = '\x1f'
+
+
+class CountMinSketch:
+    """Fixed-size frequency sketch; estimates never undercount
+
+    ``depth`` rows of ``width`` counters, indexed by double hashing of a blake2b
+    digest so the hashes are stable across processes. Sketches with the same shape
+    and seed merge by adding their tables.
+    """
+
+    def __init__(self, width=2 ** 16, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _indexes(self, items):
+        salt = self.seed.to_bytes(8, 'little')
+        digests = np.array([
+            np.frombuffer(hashlib.blake2b(str(item).encode('utf-8'), digest_size=16, salt=salt).digest(),
+                          dtype=np.uint64)
+            for item in items
+        ], dtype=np.uint64).reshape(-1, 2)
+        rows = np.arange(self.depth, dtype=np.uint64).reshape(-1, 1)
+        with np.errstate(over='ignore'):
+            hashes = digests[:, 0] + rows * (digests[:, 1] | np.uint64(1))
+        return (hashes % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, items, counts):
+        """Add ``counts`` occurrences of each (distinct) item"""
+        counts = np.asarray(counts, dtype=np.int64)
+        indexes = self._indexes(items)
+        for row in range(self.depth):
+            np.add.at(self.table[row], indexes[row], counts)
+        self.total += int(counts.sum())
+        return indexes
+
+    def estimate(self, items, indexes=None):
+        if indexes is None:
+            indexes = self._indexes(items)
+        if indexes.shape[1] == 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.table[np.arange(self.depth).reshape(-1, 1), indexes].min(axis=0)
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("Only sketches with the same width, depth and seed can be merged")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        """JSON-serialisable state; only the non-zero counters are stored"""
+        rows, columns = np.nonzero(self.table)
+        return {'width': self.width, 'depth': self.depth, 'seed': self.seed, 'total': self.total,
+                'rows': rows.tolist(), 'columns': columns.tolist(), 'counts': self.table[rows, columns].tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['width'], state['depth'], state['seed'])
+        sketch.table[state['rows'], state['columns']] = state['counts']
+        sketch.total = state['total']
+        return sketch
+
+
+class TopK:
+    """The k items with the highest estimated counts, kept in a min-heap
+
+    Heap entries are (estimate, item); entries made stale by a later estimate are
+    skipped lazily and the heap is compacted when it grows past 4k entries.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.estimates = {}
+        self.heap = []
+
+    def offer(self, item, estimate):
+        if item in self.estimates or len(self.estimates) < self.k:
+            self.estimates[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        elif estimate > self.minimum():
+            self._evict()
+            self.estimates[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(e, i) for i, e in self.estimates.items()]
+            heapq.heapify(self.heap)
+
+    def minimum(self):
+        """Smallest estimate among the tracked items (0 while there is free room)"""
+        if len(self.estimates) < self.k:
+            return 0
+        self._drop_stale()
+        return self.heap[0][0]
+
+    def _drop_stale(self):
+        while self.heap and self.estimates.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def _evict(self):
+        self._drop_stale()
+        _, item = heapq.heappop(self.heap)
+        del self.estimates[item]
+
+    def items(self):
+        """Tracked items as (item, estimate), highest first"""
+        return sorted(self.estimates.items(), key=lambda x: -x[1])
+
+
+class TemplateTracker:
+    """Streaming top-K templates per category in fixed memory
+
+    One count-min sketch counts (category, template) pairs and each category keeps
+    a min-heap of its ``k`` heaviest templates, so memory is bounded by the sketch
+    size plus k entries per category no matter how long the stream is. Trackers from
+    different workers or files combine with ``merge``.
+    """
+
+    def __init__(self, k=10, width=2 ** 16, depth=4, seed=0):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth, seed)
+        self.top = {}
+
+    def add(self, categories, templates):
+        """Count a batch of (category, template) rows"""
+        keys = pd.Series(np.asarray(categories, dtype=object)).astype(str) + _KEY_SEPARATOR \
+            + pd.Series(np.asarray(templates, dtype=object)).astype(str)
+        counts = keys.value_counts(sort=False)
+        if len(counts) == 0:
+            return self
+        items = counts.index.tolist()
+        indexes = self.sketch.add(items, counts.to_numpy())
+        self._offer(items, self.sketch.estimate(items, indexes))
+        return self
+
+    def _offer(self, items, estimates):
+        for item, estimate in zip(items, estimates):
+            category, template = item.split(_KEY_SEPARATOR, 1)
+            top = self.top.get(category)
+            if top is None:
+                top = self.top[category] = TopK(self.k)
+            # Most items of a long stream can't enter a full heap; skip them cheaply
+            if template in top.estimates or estimate > top.minimum():
+                top.offer(template, int(estimate))
+
+    def merge(self, other):
+        """Fold another tracker in; candidates of both are re-ranked on the merged sketch"""
+        if other.k != self.k:
+            raise ValueError("Only trackers with the same k can be merged")
+        self.sketch.merge(other.sketch)
+        candidates = set()
+        for tracker in (self, other):
+            for category, top in tracker.top.items():
+                candidates.update(f"{category}{_KEY_SEPARATOR}{template}" for template in top.estimates)
+        self.top = {}
+        items = sorted(candidates)
+        if items:
+            self._offer(items, self.sketch.estimate(items))
+        return self
+
+    def top_templates(self, category, n=None):
+        """Return [(template, estimated count), ...] for a category, heaviest first"""
+        top = self.top.get(str(category))
+        if top is None:
+            return []
+        return top.items()[:n]
+
+    @property
+    def total(self):
+        return self.sketch.total
+
+    def to_dict(self):
+        """JSON-serialisable state, e.g. for a queue shard's completion record"""
+        return {'k': self.k, 'sketch': self.sketch.to_dict(),
+                'top': {category: top.estimates for category, top in self.top.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        tracker = cls(state['k'])
+        tracker.sketch = CountMinSketch.from_dict(state['sketch'])
+        for category, estimates in state['top'].items():
+            top = tracker.top[category] = TopK(tracker.k)
+            for template, estimate in estimates.items():
+                top.offer(template, int(estimate))
+        return tracker
@@ -0,0 +1,303 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module
+    resource = None
+
+
+def _peak_rss_bytes():
+    """Return the peak resident set size of this process in bytes (None if unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageRecord:
+    """Mutable handle yielded by stage() so callers can report rows and bytes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.bytes_read = None
+
+
+class SamplingProfiler:
+    """Low-overhead profiler that periodically samples the stack of one thread"""
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.leaf_counts = Counter()
+        self.cumulative_counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_key(self, frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.leaf_counts[self._frame_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = self._frame_key(frame)
+                if key not in seen:
+                    self.cumulative_counts[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sms-sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self, top=20):
+        """Return the hottest functions by own and cumulative sample share"""
+        total = max(self.samples, 1)
+        return {
+            'samples': self.samples,
+            'interval_seconds': self.interval,
+            'top_self': [
+                {'function': key, 'samples': count, 'share': round(count / total, 4)}
+                for key, count in self.leaf_counts.most_common(top)
+            ],
+            'top_cumulative': [
+                {'function': key, 'samples': count, 'share': round(count / total, 4)}
+                for key, count in self.cumulative_counts.most_common(top)
+            ],
+        }
+
+
+class RunInstrumentation:
+    """Collect per-stage wall/CPU time, throughput, bytes read and peak memory for a run
+
+    Pass an instance to SMSCategorizer.analyze_sms_data or batch_categorize_sms and
+    call write_json / write_prometheus once the run has finished.
+    """
+
+    def __init__(self, run_name='sms_categorization', profiler=None, profile_output=None,
+                 trace_memory=False, sampling_interval=0.005):
+        if profiler not in (None, 'cprofile', 'sampling'):
+            raise ValueError(f"Unknown profiler '{profiler}', expected 'cprofile' or 'sampling'")
+        self.run_name = run_name
+        self.profiler = profiler
+        self.profile_output = profile_output
+        self.trace_memory = trace_memory
+        self.sampling_interval = sampling_interval
+        self.stages = {}
+        self.started_at = None
+        self.finished_at = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.profile_summary = None
+        self._active = None
+
+    @contextmanager
+    def run(self):
+        """Time the whole run and optionally wrap it in cProfile or the sampling profiler"""
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        if self.profiler == 'cprofile':
+            import cProfile
+            self._active = cProfile.Profile()
+            self._active.enable()
+        elif self.profiler == 'sampling':
+            self._active = SamplingProfiler(interval=self.sampling_interval)
+            self._active.start()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield self
+        finally:
+            self.wall_seconds = time.perf_counter() - wall_start
+            self.cpu_seconds = time.process_time() - cpu_start
+            self.finished_at = datetime.now().isoformat(timespec='seconds')
+            self._stop_profiler()
+            if started_tracing:
+                tracemalloc.stop()
+
+    def _stop_profiler(self):
+        if self._active is None:
+            return
+        if self.profiler == 'cprofile':
+            import pstats
+            self._active.disable()
+            if self.profile_output:
+                self._active.dump_stats(self.profile_output)
+            stats = pstats.Stats(self._active)
+            top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]
+            self.profile_summary = {
+                'profiler': 'cprofile',
+                'output': self.profile_output,
+                'top_cumulative': [
+                    {
+                        'function': f"{os.path.basename(func[0])}:{func[1]}({func[2]})",
+                        'calls': stat[1],
+                        'own_seconds': round(stat[2], 6),
+                        'cumulative_seconds': round(stat[3], 6),
+                    }
+                    for func, stat in top
+                ],
+            }
+        else:
+            self._active.stop()
+            self.profile_summary = {'profiler': 'sampling', **self._active.summary()}
+            if self.profile_output:
+                with open(self.profile_output, 'w') as f:
+                    json.dump(self.profile_summary, f, indent=2)
+        self._active = None
+
+    @contextmanager
+    def stage(self, name, rows=None, bytes_read=None):
+        """Time one stage; repeated stages with the same name are aggregated"""
+        record = StageRecord(name)
+        record.rows = rows
+        record.bytes_read = bytes_read
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            traced_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+            self._record(record, wall, cpu, traced_peak)
+
+    def _record(self, record, wall, cpu, traced_peak):
+        stats = self.stages.setdefault(record.name, {
+            'calls': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'rows': 0,
+            'bytes_read': 0,
+            'peak_rss_bytes': None,
+            'peak_traced_bytes': None,
+        })
+        stats['calls'] += 1
+        stats['wall_seconds'] += wall
+        stats['cpu_seconds'] += cpu
+        stats['rows'] += record.rows or 0
+        stats['bytes_read'] += record.bytes_read or 0
+        rss = _peak_rss_bytes()
+        if rss is not None:
+            stats['peak_rss_bytes'] = max(stats['peak_rss_bytes'] or 0, rss)
+        if traced_peak is not None:
+            stats['peak_traced_bytes'] = max(stats['peak_traced_bytes'] or 0, traced_peak)
+
+    def report(self):
+        """Return the run report as a JSON-serialisable dict"""
+        stages = {}
+        for name, stats in self.stages.items():
+            wall = stats['wall_seconds']
+            stages[name] = {
+                **stats,
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(stats['cpu_seconds'], 6),
+                'rows_per_second': round(stats['rows'] / wall, 2) if wall > 0 and stats['rows'] else None,
+                'share_of_run': round(wall / self.wall_seconds, 4) if self.wall_seconds > 0 else None,
+            }
+        return {
+            'run_name': self.run_name,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'stages': stages,
+            'profile': self.profile_summary,
+        }
+
+    def write_json(self, path):
+        """Write the run report as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_prometheus(self, path):
+        """Write the run report in node_exporter textfile-collector format
+
+        The file is written to a temporary name and renamed so the collector never
+        scrapes a half-written file.
+        """
+        report = self.report()
+        run = report['run_name']
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        stage_items = report['stages'].items()
+        metric('sms_run_wall_seconds', 'Wall-clock duration of the run',
+               [({'run': run}, report['wall_seconds'])])
+        metric('sms_run_cpu_seconds', 'CPU time consumed by the run',
+               [({'run': run}, report['cpu_seconds'])])
+        metric('sms_run_peak_rss_bytes', 'Peak resident memory of the process',
+               [({'run': run}, report['peak_rss_bytes'])])
+        metric('sms_run_last_finished_timestamp_seconds', 'Unix time the run finished',
+               [({'run': run}, round(time.time(), 3))])
+        metric('sms_stage_wall_seconds', 'Wall-clock time spent per stage',
+               [({'run': run, 'stage': s}, v['wall_seconds']) for s, v in stage_items])
+        metric('sms_stage_cpu_seconds', 'CPU time spent per stage',
+               [({'run': run, 'stage': s}, v['cpu_seconds']) for s, v in stage_items])
+        metric('sms_stage_rows', 'Rows handled per stage',
+               [({'run': run, 'stage': s}, v['rows']) for s, v in stage_items])
+        metric('sms_stage_rows_per_second', 'Throughput per stage',
+               [({'run': run, 'stage': s}, v['rows_per_second']) for s, v in stage_items])
+        metric('sms_stage_bytes_read', 'Bytes read per stage',
+               [({'run': run, 'stage': s}, v['bytes_read']) for s, v in stage_items])
+        metric('sms_stage_peak_rss_bytes', 'Peak resident memory observed at the end of the stage',
+               [({'run': run, 'stage': s}, v['peak_rss_bytes']) for s, v in stage_items])
+        metric('sms_stage_peak_traced_bytes', 'Peak Python heap during the stage (tracemalloc)',
+               [({'run': run, 'stage': s}, v['peak_traced_bytes']) for s, v in stage_items])
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+
+class NullInstrumentation:
+    """Drop-in stand-in used when no instrumentation is requested"""
+
+    @contextmanager
+    def run(self):
+        yield self
+
+    @contextmanager
+    def stage(self, name, rows=None, bytes_read=None):
+        yield StageRecord(name)
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
@@ -0,0 +1,163 @@
+import os
+import pickle
+import re
+import tempfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the pickled model layout changes
+MODEL_FORMAT = 1
+
+_DIGIT = re.compile(r'\d')
+_EDGE_PUNCTUATION = '.-'
+# Odd 64-bit multiplier used to mix the two token hashes of a bigram
+_BIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _token_hash(token):
+    # Codes, amounts and dates differ per message; only their shape is a useful
+    # feature. crc32 is stable across processes, unlike hash().
+    token = _DIGIT.sub('0', token.strip(_EDGE_PUNCTUATION))
+    return zlib.crc32(token.encode('utf-8'))
+
+
+def hashed_ngram_features(texts, n_features, bigrams=True):
+    """Return an L2-normalised (texts x n_features) CSR matrix of hashed word 1-2 grams
+
+    Texts are expected to be preprocessed (single spaces, stripped). The batch is
+    tokenized with one split, tokens are factorized so each distinct token is hashed
+    once, and bigram hashes are combined with numpy rather than per message.
+    """
+    from scipy import sparse
+
+    lengths = np.fromiter((text.count(' ') + 1 if text else 0 for text in texts), dtype=np.int64,
+                          count=len(texts))
+    tokens = ' '.join(text for text in texts if text).split(' ') if lengths.sum() else []
+    codes, uniques = pd.factorize(pd.Series(tokens, dtype=object), sort=False)
+    unique_hashes = np.fromiter((_token_hash(token) for token in uniques), dtype=np.uint64, count=len(uniques))
+    hashes = unique_hashes[codes]
+    rows = np.repeat(np.arange(len(texts)), lengths)
+
+    columns = [hashes]
+    row_ids = [rows]
+    if bigrams and len(hashes) > 1:
+        same_text = rows[1:] == rows[:-1]
+        with np.errstate(over='ignore'):
+            pairs = (hashes[:-1] * _BIGRAM_MIX) ^ (hashes[1:] + np.uint64(1))
+        columns.append(pairs[same_text])
+        row_ids.append(rows[1:][same_text])
+    columns = (np.concatenate(columns) % np.uint64(n_features)).astype(np.int64)
+    row_ids = np.concatenate(row_ids)
+
+    matrix = sparse.csr_matrix((np.ones(len(columns), dtype=np.float32), (row_ids, columns)),
+                               shape=(len(texts), n_features))
+    matrix.sum_duplicates()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).astype(np.float32) @ matrix
+
+
+class DistilledLinearModel:
+    """Hashed n-gram linear classifier distilled from the rule engine's labels
+
+    The model is trained on messages labelled by a rule pack and predicts whole
+    batches with one sparse matrix product. Predictions whose probability is below
+    ``min_confidence`` are reported as low confidence so the caller can fall back to
+    the rules. ``rule_pack_hash`` records the pack the training labels came from.
+    """
+
+    def __init__(self, n_features=2 ** 20, bigrams=True, min_confidence=0.9, alpha=1e-6, max_iter=20):
+        self.n_features = n_features
+        self.bigrams = bigrams
+        self.min_confidence = min_confidence
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.classes = None
+        self.coef = None
+        self.intercept = None
+        self.rule_pack_hash = None
+        self.training_messages = 0
+
+    def features(self, processed_texts):
+        return hashed_ngram_features(list(processed_texts), self.n_features, self.bigrams)
+
+    @property
+    def trained(self):
+        return self.coef is not None
+
+    def fit(self, processed_texts, labels, rule_pack_hash=None):
+        """Fit on preprocessed texts and their rule-engine categories
+
+        Duplicate texts are collapsed and passed as sample weights.
+        """
+        from sklearn.linear_model import SGDClassifier
+
+        frame = pd.DataFrame({'text': np.asarray(processed_texts, dtype=object),
+                              'label': np.asarray(labels, dtype=object)})
+        counts = frame.groupby(['text', 'label'], sort=False).size().reset_index(name='weight')
+        features = self.features(counts['text'].tolist())
+
+        classifier = SGDClassifier(loss='log_loss', alpha=self.alpha, max_iter=self.max_iter, tol=None,
+                                   random_state=42)
+        classifier.fit(features, counts['label'].to_numpy(), sample_weight=counts['weight'].to_numpy(float))
+
+        self.classes = np.asarray(classifier.classes_, dtype=object)
+        coef = classifier.coef_
+        intercept = classifier.intercept_
+        if len(self.classes) == 2:
+            # Binary problems store one weight vector; expand to one per class
+            coef = np.vstack([-coef[0], coef[0]])
+            intercept = np.array([-intercept[0], intercept[0]])
+        # Stored transposed as float32 so predict is one (messages x features) @ (features x classes)
+        self.coef = np.ascontiguousarray(coef.T, dtype=np.float32)
+        self.intercept = intercept.astype(np.float32)
+        self.rule_pack_hash = rule_pack_hash
+        self.training_messages = len(frame)
+        return self
+
+    def predict_proba(self, processed_texts):
+        """Return (messages x classes) probabilities (normalised one-vs-rest logistic)"""
+        if not self.trained:
+            raise ValueError("DistilledLinearModel has not been trained")
+        features = self.features(processed_texts)
+        scores = np.asarray(features @ self.coef) + self.intercept
+        probabilities = 1.0 / (1.0 + np.exp(-np.clip(scores, -50, 50)))
+        totals = probabilities.sum(axis=1, keepdims=True)
+        return probabilities / np.where(totals > 0, totals, 1.0)
+
+    def predict(self, processed_texts):
+        """Return (categories, confident mask) for a batch of preprocessed texts"""
+        if len(processed_texts) == 0:
+            return np.empty(0, dtype=object), np.empty(0, dtype=bool)
+        probabilities = self.predict_proba(processed_texts)
+        best = probabilities.argmax(axis=1)
+        confident = probabilities[np.arange(len(best)), best] >= self.min_confidence
+        return self.classes[best], confident
+
+    def save(self, path):
+        """Pickle the model atomically"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'format': MODEL_FORMAT, 'model': self}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('format') != MODEL_FORMAT:
+            raise ValueError(f"Unsupported linear model format in {path}")
+        return state['model']
+
+
+def train_linear_backend(categorizer, messages, rule_pack=None, **model_options):
+    """Distil a linear model from the categorizer's rules on a corpus of raw messages"""
+    pack = rule_pack or categorizer.rule_pack
+    processed = [categorizer.preprocess_text(message) for message in messages]
+    codes, uniques = pd.factorize(pd.Series(processed, dtype=object), sort=False)
+    labels = np.array([categorizer.pattern_based_categorization(text, pack) for text in uniques], dtype=object)
+    model = DistilledLinearModel(**model_options)
+    return model.fit(processed, labels[codes], pack.short_hash)
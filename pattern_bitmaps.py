@@ -0,0 +1,152 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Unique texts unpacked at a time, so memory stays bounded however large the index is
+BLOCK_ROWS = 65_536
+
+
+class PatternHitIndex:
+    """Stored per-message pattern-hit bitmaps for incremental re-categorization
+
+    Rows are deduplicated on their preprocessed text, and for every unique text a
+    packed bitmap records which rules of the pack matched. After a rule edit only the
+    added or changed patterns are evaluated (against the unique texts); scores for
+    every row are then recomputed from the bitmaps with the new weights and
+    priorities, which gives the same categories as a full rerun.
+
+    Build with ``PatternHitIndex.build(categorizer.rule_pack, processed_texts)`` and
+    persist with ``save(directory)`` / ``PatternHitIndex.load(directory)``.
+    """
+
+    def __init__(self, texts, row_codes, bits, rule_keys, rule_pack_hash):
+        self.texts = texts
+        self.row_codes = row_codes
+        self.bits = bits
+        self.rule_keys = [tuple(key) for key in rule_keys]
+        self.rule_pack_hash = rule_pack_hash
+
+    @classmethod
+    def build(cls, rule_pack, processed_texts):
+        """Evaluate every rule of ``rule_pack`` once per unique preprocessed text"""
+        row_codes, uniques = pd.factorize(pd.Series(processed_texts, dtype=object), sort=False)
+        texts = [str(text) for text in uniques]
+        hits = _evaluate(rule_pack.rule_list, texts)
+        return cls(texts, row_codes.astype(np.int64), np.packbits(hits, axis=1),
+                   rule_pack.rule_keys, rule_pack.short_hash)
+
+    def hit_matrix(self, start=0, stop=None):
+        """Return the unpacked boolean (unique texts x rules) hit matrix, or rows start:stop of it"""
+        return np.unpackbits(self.bits[start:stop], axis=1, count=len(self.rule_keys)).astype(bool)
+
+    def _blocks(self):
+        return ((start, min(start + BLOCK_ROWS, len(self.texts))) for start in range(0, len(self.texts), BLOCK_ROWS))
+
+    def update_rules(self, new_pack):
+        """Re-key the bitmaps to ``new_pack``, evaluating only rules it adds
+
+        Returns the list of (category, pattern) keys that had to be evaluated.
+        Rules that were removed are simply dropped, and reordered or reweighted rules
+        keep their stored hits. The bitmaps are rewritten BLOCK_ROWS texts at a time.
+        """
+        old_positions = {key: i for i, key in enumerate(self.rule_keys)}
+        kept = [(position, old_positions[key]) for position, key in enumerate(new_pack.rule_keys)
+                if key in old_positions]
+        to_evaluate = [position for position, key in enumerate(new_pack.rule_keys) if key not in old_positions]
+        new_columns = [position for position, _ in kept]
+        old_columns = [position for _, position in kept]
+        fresh_rules = [new_pack.rule_list[p] for p in to_evaluate]
+
+        new_bits = np.zeros((len(self.texts), (len(new_pack.rule_keys) + 7) // 8), dtype=np.uint8)
+        for start, stop in self._blocks():
+            new_hits = np.zeros((stop - start, len(new_pack.rule_keys)), dtype=bool)
+            new_hits[:, new_columns] = self.hit_matrix(start, stop)[:, old_columns]
+            if to_evaluate:
+                new_hits[:, to_evaluate] = _evaluate(fresh_rules, self.texts[start:stop])
+            new_bits[start:stop] = np.packbits(new_hits, axis=1)
+
+        self.bits = new_bits
+        self.rule_keys = list(new_pack.rule_keys)
+        self.rule_pack_hash = new_pack.short_hash
+        return [new_pack.rule_keys[p] for p in to_evaluate]
+
+    def unique_categories(self, rule_pack):
+        """Score every unique text from its bitmap (vectorised, same tie-breaking as the engine)
+
+        Scores are computed BLOCK_ROWS texts at a time, with integer weights when the
+        pack's weights are all whole numbers.
+        """
+        if [tuple(key) for key in rule_pack.rule_keys] != self.rule_keys:
+            raise ValueError("Bitmaps were built for a different rule pack; call update_rules first")
+        categories = list(rule_pack.rules)
+        column = {category: i for i, category in enumerate(categories)}
+        integral = all(float(rule.weight).is_integer() for rule in rule_pack.rule_list)
+        weights = np.zeros((len(self.rule_keys), len(categories)), dtype=np.int32 if integral else np.float64)
+        for position, rule in enumerate(rule_pack.rule_list):
+            weights[position, column[rule.category]] = rule.weight
+        priorities = np.array([rule_pack.priorities.get(c, 1) for c in categories], dtype=float)
+        labels = np.array(categories + [rule_pack.fallback_category], dtype=object)
+
+        result = np.empty(len(self.texts), dtype=object)
+        for start, stop in self._blocks():
+            raw = self.hit_matrix(start, stop).astype(weights.dtype) @ weights
+            weighted = np.where(raw > 0, raw * priorities, -np.inf)
+            # argmax returns the first maximum, i.e. the category listed first wins ties
+            best = weighted.argmax(axis=1)
+            best[~np.isfinite(weighted.max(axis=1))] = len(categories)
+            result[start:stop] = labels[best]
+        return result
+
+    def categories(self, rule_pack):
+        """Return per-row categories for ``rule_pack`` without re-running any regex"""
+        return self.unique_categories(rule_pack)[self.row_codes]
+
+    def recategorize(self, new_pack, old_pack=None):
+        """Apply a rule change and return (row categories, changed-row mask)
+
+        Pass the pack the index is currently keyed to as ``old_pack`` to get a mask of
+        rows whose category changed; otherwise the mask is None.
+        """
+        previous = self.unique_categories(old_pack) if old_pack is not None else None
+        self.update_rules(new_pack)
+        current = self.unique_categories(new_pack)
+        changed = None if previous is None else (current != previous)[self.row_codes]
+        return current[self.row_codes], changed
+
+    def save(self, directory):
+        """Persist the index: packed bitmaps, row codes, unique texts and rule keys"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'bits.npy'), self.bits)
+        np.save(os.path.join(directory, 'row_codes.npy'), self.row_codes)
+        # Preprocessed texts never contain newlines (whitespace is collapsed)
+        with open(os.path.join(directory, 'texts.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.texts))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'rule_keys': self.rule_keys, 'rule_pack_hash': self.rule_pack_hash,
+                       'unique_texts': len(self.texts)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, 'texts.txt'), encoding='utf-8') as f:
+            texts = f.read().split('\n') if meta['unique_texts'] else []
+        return cls(
+            texts,
+            np.load(os.path.join(directory, 'row_codes.npy')),
+            np.load(os.path.join(directory, 'bits.npy')),
+            meta['rule_keys'],
+            meta['rule_pack_hash'],
+        )
+
+
+def _evaluate(rules, texts):
+    """Return a (texts x rules) boolean matrix of regex hits"""
+    lowered = [text.lower() for text in texts]
+    hits = np.zeros((len(texts), len(rules)), dtype=bool)
+    for j, rule in enumerate(rules):
+        search = rule.regex.search
+        hits[:, j] = [search(text) is not None for text in lowered]
+    return hits
@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SAMPLE_SIZE = 2000
+CSV_CHUNK_ROWS = 200_000
+
+
+class ReservoirSample:
+    """Uniform fixed-size sample of a stream of unknown length
+
+    Every row gets a random key and the ``size`` rows with the smallest keys are kept
+    (bottom-k sampling), which is equivalent to reservoir sampling but works on whole
+    chunks with numpy instead of row by row. Samples of different files merge into a
+    uniform sample of their union.
+    """
+
+    def __init__(self, size=DEFAULT_SAMPLE_SIZE, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.values = np.empty(0, dtype=object)
+        self.seen = 0
+
+    def add(self, values):
+        """Offer a chunk of values to the sample"""
+        values = np.asarray(values, dtype=object)
+        self.seen += len(values)
+        keys = self.rng.random(len(values))
+        if len(self.keys) >= self.size:
+            # Only rows that beat the current worst key can enter the sample
+            candidates = keys < self.keys.max()
+            keys, values = keys[candidates], values[candidates]
+        self._keep(np.concatenate([self.keys, keys]), np.concatenate([self.values, values]))
+        return self
+
+    def merge(self, other):
+        self.seen += other.seen
+        self._keep(np.concatenate([self.keys, other.keys]), np.concatenate([self.values, other.values]))
+        return self
+
+    def _keep(self, keys, values):
+        if len(keys) > self.size:
+            best = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, values = keys[best], values[best]
+        self.keys, self.values = keys, values
+
+    @property
+    def sample(self):
+        return self.values.tolist()
+
+
+def wilson_interval(successes, n, confidence=0.95, population=None):
+    """Wilson score interval for a proportion
+
+    With ``population`` the finite population correction is applied, so a sample
+    that covers every row collapses to the exact proportion.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    if population is not None and population > 1:
+        if n >= population:
+            return p, p
+        n = n * (population - 1) / (population - n)
+    z = _z_score(confidence)
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def _z_score(confidence):
+    # Inverse normal CDF via bisection on erf; avoids a scipy dependency
+    target = (1 + confidence) / 2
+    low, high = 0.0, 10.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < target:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def preview_categories(categorizer, sample, total_rows=None, confidence=0.95, rule_pack=None):
+    """Categorize a sample and estimate the category mix of the full data
+
+    Returns a DataFrame with the sample count, estimated proportion, its confidence
+    interval and the estimated number of messages per category.
+    """
+    rule_pack = rule_pack or categorizer.rule_pack
+    total_rows = total_rows if total_rows is not None else len(sample)
+    categories = pd.Series([
+        categorizer.pattern_based_categorization(categorizer.preprocess_text(str(x)), rule_pack)
+        for x in sample
+    ], dtype=object)
+    counts = categories.value_counts()
+    n = len(categories)
+
+    rows = []
+    for category, count in counts.items():
+        low, high = wilson_interval(count, n, confidence, population=total_rows)
+        rows.append({
+            'category': category,
+            'sample_count': int(count),
+            'proportion': count / n,
+            'ci_low': low,
+            'ci_high': high,
+            'estimated_messages': int(round(count / n * total_rows)),
+        })
+    preview = pd.DataFrame(rows, columns=['category', 'sample_count', 'proportion', 'ci_low', 'ci_high',
+                                          'estimated_messages'])
+    preview.attrs.update({'sample_size': n, 'total_rows': total_rows, 'confidence': confidence,
+                          'rule_pack_hash': rule_pack.short_hash})
+    return preview
+
+
+def sample_file(file_path, reservoir, text_column=None, find_text_column=None):
+    """Stream a CSV/Excel file's text column into ``reservoir``
+
+    CSVs are read in chunks so the file is never held in memory; Excel files have to
+    be parsed whole. Returns the name of the text column that was sampled.
+    """
+    if file_path.endswith('.csv'):
+        for chunk in pd.read_csv(file_path, chunksize=CSV_CHUNK_ROWS):
+            if text_column is None:
+                text_column = find_text_column(chunk) if find_text_column else chunk.columns[0]
+            reservoir.add(chunk[text_column].dropna())
+        return text_column
+    df = pd.read_excel(file_path)
+    if text_column is None:
+        text_column = find_text_column(df) if find_text_column else df.columns[0]
+    reservoir.add(df[text_column].dropna())
+    return text_column
+
+
+def format_preview(preview):
+    """Return a preview as printable lines"""
+    lines = [f"Sample of {preview.attrs['sample_size']:,} from {preview.attrs['total_rows']:,} messages "
+             f"({preview.attrs['confidence']:.0%} confidence intervals)"]
+    for row in preview.itertuples(index=False):
+        lines.append(f"{row.category}: {row.proportion * 100:.1f}% "
+                     f"[{row.ci_low * 100:.1f}% - {row.ci_high * 100:.1f}%] "
+                     f"~{row.estimated_messages:,} messages")
+    return lines
@@ -0,0 +1,202 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from error_analytics import find_error_column
+
+# Rows passed to SQLite per executemany call
+BATCH_ROWS = 50_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    template_id INTEGER PRIMARY KEY,
+    template TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    message TEXT,
+    category TEXT NOT NULL,
+    campaign_id INTEGER,
+    template_id INTEGER REFERENCES templates(template_id),
+    source_file TEXT,
+    sent_at TEXT,
+    error_name TEXT,
+    rule_pack_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_category ON messages(category);
+CREATE INDEX IF NOT EXISTS messages_campaign ON messages(campaign_id);
+CREATE INDEX IF NOT EXISTS messages_template ON messages(template_id);
+CREATE INDEX IF NOT EXISTS messages_source_file ON messages(source_file);
+CREATE INDEX IF NOT EXISTS messages_sent_at ON messages(sent_at);
+"""
+
+# Columns that can be filtered on or grouped by; all of them are indexed
+FILTERS = ('category', 'campaign_id', 'template_id', 'source_file')
+GROUPS = {
+    'category': 'category',
+    'campaign_id': 'campaign_id',
+    'template_id': 'template_id',
+    'source_file': 'source_file',
+    'date': 'substr(sent_at, 1, 10)',
+}
+
+
+class ResultStore:
+    """Categorized messages in a local SQLite database
+
+    Rows are bulk-inserted ``batch_rows`` at a time, each ``add`` in one transaction;
+    templates are stored once in their own table and referenced by ID. Category,
+    campaign, template, source file and send time are indexed, so ``counts`` and
+    ``sample`` are index lookups rather than rescans of a CSV.
+
+    ``campaign_id`` is only filled for frames that carry one (analyze_sms_data
+    results, via SMSCategorizer.export_sqlite). The batch categorizer doesn't
+    cluster campaigns, so its ``--sqlite`` rows have a NULL campaign_id.
+    """
+
+    def __init__(self, path, batch_rows=BATCH_ROWS):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.connection = sqlite3.connect(path)
+        # WAL lets readers (e.g. a dashboard) query while a batch is being loaded
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def template_ids(self, templates):
+        """Return the store's IDs for template strings, adding new ones"""
+        codes, uniques = pd.factorize(pd.Series(templates, dtype=object), sort=False)
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO templates (template) VALUES (?)',
+                                        ((t,) for t in uniques))
+        ids = {}
+        cursor = self.connection.cursor()
+        # Stay below SQLite's limit on bound parameters per statement
+        for start in range(0, len(uniques), 500):
+            chunk = list(uniques[start:start + 500])
+            placeholders = ','.join('?' * len(chunk))
+            ids.update(cursor.execute(f'SELECT template, template_id FROM templates WHERE template IN ({placeholders})',
+                                      chunk).fetchall())
+        unique_ids = np.array([ids[t] for t in uniques], dtype=np.int64)
+        return unique_ids[codes]
+
+    def add(self, df, text_column, category_column='category', templates=None, source_file=None,
+            date_column=None, replace=True):
+        """Insert a result frame; returns the number of rows added
+
+        ``source_file`` is a column name or one file name for the whole frame. With
+        ``replace`` rows previously stored for the same source files are deleted
+        first, so loading a file twice doesn't duplicate it. The delete and the
+        inserts share one transaction: a load that fails part way leaves the
+        previously stored rows in place.
+        """
+        n = len(df)
+        if source_file is not None and source_file in df.columns:
+            sources = df[source_file].astype(str).to_numpy(dtype=object)
+        else:
+            sources = np.full(n, source_file, dtype=object)
+        columns = {
+            'message': df[text_column].astype(str).to_numpy(dtype=object),
+            'category': df[category_column].astype(str).to_numpy(dtype=object),
+            'campaign_id': df['campaign_id'].to_numpy() if 'campaign_id' in df.columns else np.full(n, None),
+            'template_id': self.template_ids(templates) if templates is not None else np.full(n, None),
+            'source_file': sources,
+            'sent_at': self._timestamps(df[date_column]) if date_column is not None else np.full(n, None),
+            'error_name': self._optional(df, 'error_name'),
+            'rule_pack_hash': self._optional(df, 'rule_pack_hash'),
+        }
+        # Plain Python values: sqlite3 can't bind numpy integers
+        rows = zip(*(pd.Series(values, dtype=object).where(pd.notna(values), None).tolist()
+                     for values in columns.values()))
+        names = ', '.join(columns)
+        insert = f"INSERT INTO messages ({names}) VALUES ({', '.join('?' * len(columns))})"
+
+        with self.connection:
+            if replace:
+                self.connection.executemany('DELETE FROM messages WHERE source_file = ?',
+                                            ((s,) for s in pd.unique(sources) if s is not None))
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_rows:
+                    self.connection.executemany(insert, batch)
+                    batch = []
+            if batch:
+                self.connection.executemany(insert, batch)
+        return n
+
+    def _optional(self, df, name):
+        # The error column goes by a few names in the different exports
+        column = find_error_column(df.columns) if name == 'error_name' else name
+        if column is None or column not in df.columns:
+            return np.full(len(df), None)
+        return df[column].to_numpy(dtype=object)
+
+    def _timestamps(self, values):
+        stamps = pd.to_datetime(values, errors='coerce')
+        return stamps.dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+
+    def _where(self, filters, start=None, end=None, clauses=()):
+        clauses, params = list(clauses), []
+        for name, value in filters.items():
+            if name not in FILTERS:
+                raise ValueError(f"Unknown filter {name!r}; choose from {', '.join(FILTERS)}")
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                values = list(value)
+                clauses.append(f"{name} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("sent_at >= ?")
+            params.append(str(pd.Timestamp(start)))
+        if end is not None:
+            clauses.append("sent_at < ?")
+            params.append(str(pd.Timestamp(end)))
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def counts(self, by='category', start=None, end=None, **filters):
+        """Message counts grouped by one or more of category, campaign_id, template_id, source_file, date"""
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = [name for name in by if name not in GROUPS]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown[0]!r}; choose from {', '.join(GROUPS)}")
+        where, params = self._where(filters, start, end)
+        expressions = ', '.join(f"{GROUPS[name]} AS {name}" for name in by)
+        query = (f"SELECT {expressions}, COUNT(*) AS messages FROM messages{where} "
+                 f"GROUP BY {', '.join(by)} ORDER BY messages DESC")
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def sample(self, n=10, start=None, end=None, **filters):
+        """Up to ``n`` matching messages with their template text, in insertion order"""
+        where, params = self._where(filters, start, end)
+        query = ("SELECT m.id, m.message, m.category, m.campaign_id, m.template_id, t.template, m.source_file, "
+                 f"m.sent_at FROM (SELECT * FROM messages{where} ORDER BY id LIMIT ?) m "
+                 "LEFT JOIN templates t ON t.template_id = m.template_id ORDER BY m.id")
+        return pd.read_sql_query(query, self.connection, params=params + [int(n)])
+
+    def top_templates(self, n=10, start=None, end=None, **filters):
+        """The ``n`` most frequent templates among matching messages"""
+        where, params = self._where(filters, start, end, ['template_id IS NOT NULL'])
+        query = ("SELECT m.template_id, t.template, m.messages FROM "
+                 f"(SELECT template_id, COUNT(*) AS messages FROM messages{where} "
+                 "GROUP BY template_id ORDER BY messages DESC LIMIT ?) m "
+                 "JOIN templates t ON t.template_id = m.template_id ORDER BY m.messages DESC")
+        return pd.read_sql_query(query, self.connection, params=params + [int(n)])
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
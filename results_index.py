@@ -0,0 +1,112 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from categorization import group_positions
+
+
+class ResultsIndex:
+    """Precomputed lookups for paging through a categorized result frame
+
+    Messages are factorized once and category positions are built up front;
+    template positions are built on first use. Searches scan only the distinct
+    messages (with Arrow string kernels when pyarrow is installed). Each filter
+    combination is resolved to a sorted array of row positions once and cached,
+    so rendering a page only slices that array and touches the rows shown,
+    however large the frame is.
+    """
+
+    def __init__(self, messages, categories, categorizer=None, cache_size=32):
+        self.messages = np.asarray(messages, dtype=object)
+        self.categories = np.asarray(categories, dtype=object)
+        self.categorizer = categorizer
+        self.codes, uniques = pd.factorize(pd.Series(self.messages, dtype=object).astype(str), sort=False)
+        self.unique_lower = pd.Series(uniques, dtype=object).str.lower()
+        try:
+            self.unique_lower = self.unique_lower.astype('string[pyarrow]')
+        except ImportError:
+            pass
+        self.category_positions = group_positions(pd.Series(self.categories, dtype=object))
+        self.category_counts = pd.Series({category: len(rows) for category, rows in self.category_positions.items()},
+                                         dtype=np.int64).sort_values(ascending=False)
+        self.template_codes = None
+        self.template_texts = None
+        self.templates = None
+        self.template_positions = None
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def __len__(self):
+        return len(self.messages)
+
+    def build_templates(self):
+        """Template every distinct message once and index the rows per template"""
+        if self.templates is None:
+            categorizer = self.categorizer
+            unique_templates = pd.Series([categorizer.extract_template(categorizer.preprocess_text(message))
+                                          for message in self.unique_lower.tolist()], dtype=object)
+            template_ids, templates = pd.factorize(unique_templates, sort=False)
+            self.template_codes = template_ids[self.codes]
+            self.template_texts = np.asarray(templates, dtype=object)
+            positions = group_positions(self.template_codes)
+            self.templates = pd.DataFrame({
+                'template_id': np.arange(len(templates)),
+                'template': self.template_texts,
+                'messages': [len(positions.get(i, ())) for i in range(len(templates))],
+            }).sort_values('messages', ascending=False, kind='stable').reset_index(drop=True)
+            self.template_positions = positions
+        return self.templates
+
+    def positions(self, category=None, template_id=None, search=None):
+        """Sorted row positions matching every given filter"""
+        key = (category, template_id, (search or '').strip().lower() or None)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        rows = None
+        if category is not None:
+            rows = self.category_positions.get(category, np.empty(0, dtype=np.int64))
+        if template_id is not None:
+            self.build_templates()
+            template_rows = self.template_positions.get(template_id, np.empty(0, dtype=np.int64))
+            rows = template_rows if rows is None else np.intersect1d(rows, template_rows, assume_unique=True)
+        if key[2] is not None:
+            # Case-insensitive substring match, once per distinct message
+            matching = self.unique_lower.str.contains(key[2], regex=False).to_numpy(dtype=bool)
+            search_rows = np.flatnonzero(matching[self.codes])
+            rows = search_rows if rows is None else np.intersect1d(rows, search_rows, assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(self.messages))
+        self._cache[key] = rows
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return rows
+
+    def top_templates(self, n=500, category=None, search=None):
+        """The ``n`` most frequent templates among rows matching the other filters"""
+        self.build_templates()
+        key = ('templates', n, category, (search or '').strip().lower() or None)
+        if key not in self._cache:
+            rows = self.positions(category=category, search=search)
+            counts = np.bincount(self.template_codes[rows], minlength=len(self.template_texts))
+            top = np.argsort(-counts, kind='stable')[:n]
+            top = top[counts[top] > 0]
+            self._cache[key] = pd.DataFrame({'template_id': top, 'template': self.template_texts[top],
+                                             'messages': counts[top]})
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return self._cache[key]
+
+    def page(self, page=0, page_size=50, **filters):
+        """Return (rows of one page as a DataFrame, number of matching rows)"""
+        rows = self.positions(**filters)
+        shown = rows[page * page_size:(page + 1) * page_size]
+        frame = pd.DataFrame({
+            'Row': shown + 1,
+            'Message': self.messages[shown],
+            'Predicted_Category': self.categories[shown],
+        })
+        if self.template_codes is not None:
+            frame['Template'] = self.template_texts[self.template_codes[shown]]
+        return frame, len(rows)
@@ -0,0 +1,120 @@
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+MAXREPEAT = sre_parse.MAXREPEAT
+REPEAT_OPS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+SUBPATTERN = sre_parse.SUBPATTERN
+BRANCH = sre_parse.BRANCH
+AT = sre_parse.AT
+AT_BEGINNING = sre_parse.AT_BEGINNING
+
+# Character classes narrow enough that a run of them rarely overlaps its neighbours
+NARROW_CATEGORIES = (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_SPACE)
+
+
+def _is_broad(sub):
+    """Return True if a repeated item can match most characters (., \\w, negated classes)"""
+    items = list(sub)
+    if len(items) != 1:
+        return True
+    op, av = items[0]
+    if op == sre_parse.LITERAL:
+        return False
+    if op == sre_parse.IN:
+        if any(item_op == sre_parse.NEGATE for item_op, _ in av):
+            return True
+        return not all(item_op == sre_parse.CATEGORY and item_av in NARROW_CATEGORIES
+                       or item_op in (sre_parse.LITERAL, sre_parse.RANGE)
+                       for item_op, item_av in av)
+    return True
+
+
+def _walk(items, findings, inside_unbounded=False):
+    """Return (broad unbounded repeats, any unbounded repeats) in a parsed sequence
+
+    Unbounded repeats nested inside another unbounded repeat are recorded in findings.
+    """
+    broad = 0
+    any_unbounded = 0
+    for op, av in items:
+        if op in REPEAT_OPS:
+            low, high, sub = av
+            is_unbounded = high == MAXREPEAT
+            inner_broad, inner_any = _walk(sub, findings, inside_unbounded or is_unbounded)
+            if is_unbounded:
+                any_unbounded += 1
+                if inner_any and not inside_unbounded:
+                    findings.append('nested')
+                if _is_broad(sub):
+                    broad += 1
+            broad += inner_broad
+            any_unbounded += inner_any
+        elif op == SUBPATTERN:
+            inner_broad, inner_any = _walk(av[-1], findings, inside_unbounded)
+            broad += inner_broad
+            any_unbounded += inner_any
+        elif op == BRANCH:
+            counts = [_walk(branch, findings, inside_unbounded) for branch in av[1]]
+            broad += max((c[0] for c in counts), default=0)
+            any_unbounded += max((c[1] for c in counts), default=0)
+    return broad, any_unbounded
+
+
+def lint_pattern(pattern):
+    """Return a list of findings for a single rule pattern
+
+    Each finding is a dict with ``severity`` ('error' or 'warning'), ``code`` and
+    ``message``. Nested unbounded quantifiers such as ``(a+)+`` can backtrack
+    exponentially; chains of two or more unbounded quantifiers such as
+    ``a.*b.*c`` are polynomial (roughly O(n^(k+1)) for an unanchored search).
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as e:
+        return [{'severity': 'error', 'code': 'invalid', 'message': f"Pattern does not compile: {e}"}]
+
+    nested = []
+    unbounded = _walk(list(parsed), nested)[0]
+    anchored = bool(len(parsed)) and parsed[0] == (AT, AT_BEGINNING)
+
+    findings = []
+    if nested:
+        findings.append({
+            'severity': 'error',
+            'code': 'nested-quantifier',
+            'message': "Nested unbounded quantifiers can backtrack exponentially",
+        })
+    if unbounded >= 2:
+        exponent = unbounded if anchored else unbounded + 1
+        findings.append({
+            'severity': 'warning',
+            'code': 'chained-wildcards',
+            'message': f"{unbounded} chained unbounded quantifiers; worst case about O(n^{exponent})",
+        })
+    return findings
+
+
+def lint_rules(patterns):
+    """Lint every pattern in a {category: [pattern, ...]} mapping
+
+    Returns a list of findings with ``category``, ``index`` and ``pattern`` added.
+    """
+    results = []
+    for category, category_patterns in patterns.items():
+        for index, pattern in enumerate(category_patterns):
+            for finding in lint_pattern(pattern):
+                results.append({'category': category, 'index': index, 'pattern': pattern, **finding})
+    return results
+
+
+if __name__ == "__main__":
+    from categorization import SMSCategorizer
+
+    categorizer = SMSCategorizer()
+    findings = categorizer.rule_lint
+    print(f"🔍 {len(findings)} finding(s) across {sum(len(p) for p in categorizer.patterns.values())} rules")
+    for finding in findings:
+        print(f"  [{finding['severity'].upper()}] {finding['category']}#{finding['index']} "
+              f"{finding['pattern']!r}: {finding['message']}")
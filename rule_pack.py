@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import yaml
+
+from rule_lint import lint_rules
+
+DEFAULT_RULE_PACK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'default.yaml')
+DEFAULT_CACHE_DIR = os.environ.get(
+    'SMS_RULE_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'sms_categorizer', 'rule_packs')
+)
+
+# Bumped whenever the cache file layout changes so stale cache files are ignored
+CACHE_FORMAT = 3
+
+
+class Rule:
+    """A single compiled pattern with its position and weight inside its category"""
+
+    __slots__ = ('category', 'index', 'pattern', 'weight', 'regex')
+
+    def __init__(self, category, index, pattern, weight):
+        self.category = category
+        self.index = index
+        self.pattern = pattern
+        self.weight = weight
+        self.regex = re.compile(pattern)
+
+
+class RulePack:
+    """An immutable, compiled rule pack
+
+    Instances are never mutated after construction, so a categorizer can swap its
+    pack by plain attribute assignment while other threads keep using the old one.
+    """
+
+    def __init__(self, spec, content_hash, source=None):
+        self.name = spec['name']
+        self.version = spec['version']
+        self.fallback_category = spec['fallback_category']
+        self.content_hash = content_hash
+        self.short_hash = content_hash[:12]
+        self.source = source
+        self.lint = spec['lint']
+        self.priorities = {c['name']: c['priority'] for c in spec['categories']}
+        self.rules = {
+            c['name']: [Rule(c['name'], i, p['pattern'], p['weight']) for i, p in enumerate(c['patterns'])]
+            for c in spec['categories']
+        }
+        self.patterns = {category: [rule.pattern for rule in rules] for category, rules in self.rules.items()}
+        self.category_names = list(self.rules) + [self.fallback_category]
+        # Flat rule order used for pattern-hit bitmaps; a rule is identified by
+        # (category, pattern) so reordering or reweighting doesn't invalidate hits
+        self.rule_list = [rule for rules in self.rules.values() for rule in rules]
+        self.rule_keys = [(rule.category, rule.pattern) for rule in self.rule_list]
+
+    def category_from_hits(self, hits):
+        """Score matched rule positions (indices into rule_list) exactly like
+        SMSCategorizer.pattern_based_categorization would"""
+        raw_scores = {}
+        for position in sorted(hits):
+            rule = self.rule_list[position]
+            raw_scores[rule.category] = raw_scores.get(rule.category, 0) + rule.weight
+        category_scores = {
+            category: raw_scores[category] * self.priorities.get(category, 1)
+            for category in self.rules if raw_scores.get(category, 0) > 0
+        }
+        if category_scores:
+            return max(category_scores.items(), key=lambda x: x[1])[0]
+        return self.fallback_category
+
+    def __repr__(self):
+        return f"RulePack(name={self.name!r}, version={self.version!r}, hash={self.short_hash})"
+
+
+class EvaluationPlan:
+    """Order in which categories and rules are evaluated by the early-exit scorer
+
+    The plan only changes evaluation order, never scores: ``upper_bounds`` gives the
+    best score each category could still reach, which lets the scorer skip work that
+    cannot change the winner. Packs with non-positive weights or priorities can't be
+    bounded this way and are marked ``exhaustive``.
+    """
+
+    def __init__(self, pack, category_order, rule_order):
+        self.rule_pack_hash = pack.content_hash
+        self.tie_rank = {category: i for i, category in enumerate(pack.rules)}
+        self.priorities = {category: pack.priorities.get(category, 1) for category in pack.rules}
+        self.category_order = category_order
+        self.rules = rule_order
+        self.weight_totals = {category: sum(rule.weight for rule in rules) for category, rules in rule_order.items()}
+        self.upper_bounds = {category: self.weight_totals[category] * self.priorities[category]
+                             for category in rule_order}
+        self.exhaustive = (
+            any(rule.weight <= 0 for rule in pack.rule_list)
+            or any(priority <= 0 for priority in self.priorities.values())
+        )
+
+
+def build_evaluation_plan(pack, hit_rates=None, category_frequencies=None):
+    """Build an evaluation plan, optionally guided by observed traffic
+
+    ``hit_rates`` maps (category, pattern) -> fraction of messages the rule matched
+    (e.g. from the pattern profiler) and ``category_frequencies`` maps category ->
+    how often it won. Frequent winners are evaluated first so a strong leader is
+    established early; inside a category, rules that carry a lot of weight but rarely
+    match go first because ruling them out shrinks the category's upper bound fastest.
+    Without profile data categories are ordered by their maximum possible score and
+    rules by weight.
+    """
+    hit_rates = hit_rates or {}
+    category_frequencies = category_frequencies or {}
+
+    def category_key(category):
+        rules = pack.rules[category]
+        upper_bound = sum(rule.weight for rule in rules) * pack.priorities.get(category, 1)
+        return (-category_frequencies.get(category, 0), -upper_bound)
+
+    def rule_key(rule):
+        rate = hit_rates.get((rule.category, rule.pattern))
+        if rate is None:
+            return (-rule.weight, rule.index)
+        return (-(rule.weight * (1 - rate)), rule.index)
+
+    category_order = sorted(pack.rules, key=category_key)
+    rule_order = {category: sorted(pack.rules[category], key=rule_key) for category in pack.rules}
+    return EvaluationPlan(pack, category_order, rule_order)
+
+
+def _parse_spec(data):
+    """Parse and validate YAML rule pack bytes into a plain spec dict (without lint findings)"""
+    raw = yaml.safe_load(data)
+    if not isinstance(raw, dict) or not isinstance(raw.get('categories'), list):
+        raise ValueError("Rule pack must be a mapping with a 'categories' list")
+
+    categories = []
+    seen = set()
+    for category in raw['categories']:
+        name = category.get('name')
+        if not name or name in seen:
+            raise ValueError(f"Rule pack category names must be unique and non-empty (got {name!r})")
+        seen.add(name)
+        entries = category.get('patterns') or []
+        patterns = []
+        for i, entry in enumerate(entries):
+            if isinstance(entry, str):
+                entry = {'pattern': entry}
+            pattern = entry.get('pattern')
+            try:
+                re.compile(pattern)
+            except (re.error, TypeError) as e:
+                raise ValueError(f"Invalid pattern {pattern!r} in category {name}: {e}")
+            # Default weight: earlier patterns are more specific and count for more
+            patterns.append({'pattern': pattern, 'weight': entry.get('weight', len(entries) - i)})
+        categories.append({'name': name, 'priority': category.get('priority', 1), 'patterns': patterns})
+
+    return {
+        'name': raw.get('name', 'unnamed'),
+        'version': raw.get('version'),
+        'fallback_category': raw.get('fallback_category', 'Other'),
+        'categories': categories,
+    }
+
+
+def _spec_patterns(spec):
+    return {c['name']: [p['pattern'] for p in c['patterns']] for c in spec['categories']}
+
+
+def _spec_digest(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _valid_lint(findings, patterns):
+    """Check cached findings have the lint_rules shape and point at rules of this spec"""
+    if not isinstance(findings, list):
+        return False
+    for finding in findings:
+        if not isinstance(finding, dict) or finding.get('severity') not in ('error', 'warning'):
+            return False
+        if not all(isinstance(finding.get(key), str) for key in ('code', 'message', 'pattern')):
+            return False
+        rules = patterns.get(finding.get('category'))
+        index = finding.get('index')
+        if rules is None or not isinstance(index, int) or not 0 <= index < len(rules) \
+                or rules[index] != finding['pattern']:
+            return False
+    return True
+
+
+def _read_cached_lint(cache_dir, content_hash, spec):
+    # Only lint findings are cached, never the spec: the rules always come from the
+    # YAML whose hash is stamped on results, so a writable (shared) cache directory
+    # can't change how messages are categorized. JSON rather than pickle, so loading
+    # it never runs code.
+    path = os.path.join(cache_dir, f"{content_hash}.json")
+    try:
+        with open(path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('format') != CACHE_FORMAT:
+        return None
+    if cached.get('spec_digest') != _spec_digest(spec):
+        return None
+    findings = cached.get('lint')
+    return findings if _valid_lint(findings, _spec_patterns(spec)) else None
+
+
+def _write_cached_lint(cache_dir, content_hash, spec, findings):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'format': CACHE_FORMAT, 'spec_digest': _spec_digest(spec), 'lint': findings}, f)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{content_hash}.json"))
+    except OSError:
+        # The on-disk cache is only an optimisation; a read-only home is fine
+        pass
+
+
+def rule_pack_from_bytes(data, source=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Build a RulePack from YAML bytes, reusing lint findings cached on disk by content hash"""
+    content_hash = hashlib.sha256(data).hexdigest()
+    spec = _parse_spec(data)
+    findings = _read_cached_lint(cache_dir, content_hash, spec) if cache_dir else None
+    if findings is None:
+        findings = lint_rules(_spec_patterns(spec))
+        if cache_dir:
+            _write_cached_lint(cache_dir, content_hash, spec, findings)
+    spec['lint'] = findings
+    return RulePack(spec, content_hash, source)
+
+
+# In-process memo so every SMSCategorizer (and every worker) doesn't re-read the file
+_loaded_packs = {}
+
+
+def load_rule_pack(path=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Load a YAML rule pack from disk (defaults to rules/default.yaml)"""
+    path = os.path.abspath(path or DEFAULT_RULE_PACK)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    memo = _loaded_packs.get(path)
+    if memo is not None and memo[0] == signature:
+        return memo[1]
+    with open(path, 'rb') as f:
+        pack = rule_pack_from_bytes(f.read(), source=path, cache_dir=cache_dir)
+    _loaded_packs[path] = (signature, pack)
+    return pack
@@ -0,0 +1,102 @@
+import json
+
+import pandas as pd
+
+
+class PatternProfiler:
+    """Per-pattern evaluation, hit and cost counters for the rule engine
+
+    Enabled through SMSCategorizer(profile_patterns=True). Every pattern evaluation
+    records its wall time, whether it matched, and afterwards whether the pattern
+    helped decide (``wins``) or single-handedly decided (``decisive``) the winning
+    category.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.messages = 0
+
+    def _entry(self, category, index, pattern):
+        key = (category, pattern)
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = self.stats[key] = {
+                'category': category,
+                'index': index,
+                'pattern': pattern,
+                'evaluations': 0,
+                'hits': 0,
+                'total_seconds': 0.0,
+                'worst_seconds': 0.0,
+                'wins': 0,
+                'decisive': 0,
+            }
+        return entry
+
+    def record(self, category, index, pattern, seconds, matched):
+        """Record a single pattern evaluation"""
+        entry = self._entry(category, index, pattern)
+        entry['evaluations'] += 1
+        entry['total_seconds'] += seconds
+        if seconds > entry['worst_seconds']:
+            entry['worst_seconds'] = seconds
+        if matched:
+            entry['hits'] += 1
+
+    def record_decision(self, winner, matched, category_scores, priorities, tie_order):
+        """Credit the matched patterns of the winning category
+
+        ``matched`` maps category -> list of (index, pattern, weight) that matched and
+        ``category_scores`` holds the final weighted scores. A pattern is counted as
+        decisive when removing it alone would have changed the winner.
+        """
+        self.messages += 1
+        if winner is None:
+            return
+        for index, pattern, weight in matched.get(winner, []):
+            entry = self._entry(winner, index, pattern)
+            entry['wins'] += 1
+            reduced = dict(category_scores)
+            reduced[winner] -= weight * priorities.get(winner, 1)
+            if reduced[winner] <= 0:
+                del reduced[winner]
+            new_winner = None
+            if reduced:
+                best = max(reduced.values())
+                new_winner = next(c for c in tie_order if reduced.get(c) == best)
+            if new_winner != winner:
+                entry['decisive'] += 1
+
+    def report(self, sort_by='total_seconds', ascending=False):
+        """Return a ranked DataFrame with hit rates, mean cost and dead-rule flags
+
+        The default ranks the most expensive rules first; use sort_by='hits' with
+        ascending=True to list dead rules first.
+        """
+        columns = ['category', 'index', 'pattern', 'evaluations', 'hits', 'hit_rate',
+                   'wins', 'decisive', 'total_seconds', 'mean_us', 'worst_us', 'dead']
+        if not self.stats:
+            return pd.DataFrame(columns=columns)
+        report_df = pd.DataFrame(list(self.stats.values()))
+        evaluations = report_df['evaluations'].where(report_df['evaluations'] > 0)
+        report_df['hit_rate'] = (report_df['hits'] / evaluations).fillna(0.0)
+        report_df['mean_us'] = (report_df['total_seconds'] / evaluations * 1e6).fillna(0.0)
+        report_df['worst_us'] = report_df['worst_seconds'] * 1e6
+        report_df['dead'] = report_df['hits'] == 0
+        report_df = report_df.sort_values(sort_by, ascending=ascending).reset_index(drop=True)
+        report_df.insert(0, 'rank', range(1, len(report_df) + 1))
+        return report_df[['rank'] + columns]
+
+    def export(self, filename, sort_by='total_seconds', ascending=False):
+        """Write the ranked report to CSV or JSON (chosen by file extension)"""
+        report_df = self.report(sort_by=sort_by, ascending=ascending)
+        if filename.endswith('.json'):
+            with open(filename, 'w') as f:
+                json.dump({'messages': self.messages, 'patterns': report_df.to_dict(orient='records')}, f, indent=2)
+        else:
+            report_df.to_csv(filename, index=False)
+        return report_df
+
+    def reset(self):
+        self.stats = {}
+        self.messages = 0
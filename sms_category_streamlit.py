@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
-from main import SMSCategorizer
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
+from streamlit_cache import (get_categorizer, rule_version, upload_hash, load_upload,
+                             get_job_manager, current_job, track_job, job_progress_panel,
+                             render_detached_job, category_preview, render_preview,
+                             lazy_download, EXCEL_MIME, results_index, render_results_browser,
+                             error_breakdowns, render_error_breakdowns)
+from excel_export import excel_bytes
+from error_analytics import ErrorAnalytics, find_date_column, find_error_column
 from datetime import datetime
-import io
 
 # Configure page
 st.set_page_config(
@@ -55,6 +57,7 @@ with st.sidebar:
     st.header("📊 Settings")
     show_preview_rows = st.slider("Preview rows to display", 5, 20, 10)
     chart_theme = st.selectbox("Chart theme", ["plotly", "plotly_white", "plotly_dark"])
+    preview_sample_size = st.select_slider("Quick preview sample size", [500, 1000, 2000, 5000, 10000], 2000)
 
 # Main content
 st.write("""
@@ -87,14 +90,12 @@ if uploaded_file is not None:
             with col3:
                 st.metric("File Size", f"{file_details['filesize']} bytes")
         
-        # Read file based on extension
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(uploaded_file)
-        else:
+        # Read file based on extension (parsed once per distinct upload)
+        if not uploaded_file.name.endswith(('.csv', '.xlsx', '.xls')):
             st.error('❌ Unsupported file type!')
             st.stop()
+        content_hash = upload_hash(uploaded_file)
+        df = load_upload(content_hash, uploaded_file.name, uploaded_file)
         
         # Display file info
         st.success(f"✅ Successfully loaded {len(df)} rows and {len(df.columns)} columns")
@@ -148,27 +149,20 @@ if uploaded_file is not None:
         # Optional Error Analysis Section
         st.subheader("⚙️ Optional Error Analysis")
         if st.checkbox("📊 Show Error Distribution Analysis", help="Check this box to analyze the 'ErrorName' column if it exists."):
-            df_for_analysis = df.copy()
-            df_for_analysis.columns = [col.strip().lower().replace(' ', '') for col in df_for_analysis.columns]
-
-            if 'errorname' in df_for_analysis.columns:
-                error_series = df_for_analysis['errorname'].dropna()
-                error_series = error_series[error_series.str.strip() != 'No Error (code 0 )']
-                error_series = error_series[error_series.str.strip() != '']
+            error_column = find_error_column(df.columns)
 
-                total_rows = len(df_for_analysis)
-                error_count = len(error_series)
+            if error_column is not None:
+                error_analytics = ErrorAnalytics().add(df[error_column])
+                total_rows = error_analytics.messages
+                error_count = error_analytics.errors
 
                 if error_count > 0:
                     st.info(f"Found {error_count} messages with errors (out of {total_rows} total rows).")
-                    error_counts_df = error_series.value_counts().reset_index()
-                    error_counts_df.columns = ['ErrorName', 'Count']
-                    error_counts_df['Percentage'] = (error_counts_df['Count'] / total_rows * 100).round(2)
+                    error_counts_df = error_analytics.error_distribution()
 
                     st.subheader('Error Distribution Table')
                     st.dataframe(error_counts_df, use_container_width=True)
 
-                
                 else:
                     st.success("✅ No errors found in the 'ErrorName' column.")
             else:
@@ -177,43 +171,42 @@ if uploaded_file is not None:
         # Categorization section
         st.subheader('🔄 SMS Categorization')
         
-        if st.button('🚀 Start Categorization', type="primary"):
+        categorizer = get_categorizer()
+        result_key = (content_hash, message_column, rule_version(categorizer))
+        job = current_job(result_key)
+        job_running = job is not None and not job.finished
+        
+        # Categorization runs as a background job so the UI stays responsive
+        col1, col2 = st.columns(2)
+        with col1:
+            start_clicked = st.button('🚀 Start Categorization', type="primary", disabled=job_running)
+        with col2:
+            preview_clicked = st.button('⚡ Quick Preview', disabled=job_running,
+                                        help="Estimate the category mix from a random sample in seconds")
+        if start_clicked:
+            if job is None or job.status in ('cancelled', 'failed'):
+                job = get_job_manager().submit(result_key, df_processed[message_column], categorizer)
+                track_job(job)
+                job_running = True
+        
+        if preview_clicked:
+            st.session_state['preview_key'] = result_key
+        if job is None and st.session_state.get('preview_key') == result_key:
+            render_preview(category_preview(result_key, df_processed[message_column], categorizer,
+                                            preview_sample_size))
+        
+        if job_running:
+            job_progress_panel(job.id)
+        elif job is not None and job.status == 'cancelled':
+            st.warning(f'⏹️ Categorization cancelled after {job.done:,}/{job.total:,} messages.')
+        elif job is not None and job.status == 'failed':
+            st.error(f'❌ An error occurred during categorization: {job.error}')
+        elif job is not None:
             try:
-                categorizer = SMSCategorizer()
-                
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                status_text.text('Initializing categorizer...')
-                progress_bar.progress(10)
-                
-                status_text.text('Processing messages...')
-                
-                batch_size = max(1, len(df_processed) // 10)
-                categories = []
-                
-                for i in range(0, len(df_processed), batch_size):
-                    batch = df_processed[message_column].iloc[i:i+batch_size]
-                    if not isinstance(batch, pd.Series):
-                        batch = pd.Series(batch)
-                    batch_categories = batch.apply(
-                        lambda x: categorizer.pattern_based_categorization(
-                            categorizer.preprocess_text(str(x))
-                        )
-                    ).tolist()
-                    categories.extend(batch_categories)
-                    
-                    progress = min(90, 20 + (i / len(df_processed)) * 70)
-                    progress_bar.progress(int(progress))
-                    status_text.text(f'Processed {min(i + batch_size, len(df_processed))}/{len(df_processed)} messages...')
-                
-                df_processed['predicted_category'] = categories
+                df_processed['predicted_category'] = job.categories()
                 if not isinstance(df_processed, pd.DataFrame):
                     df_processed = pd.DataFrame(df_processed)
                 
-                progress_bar.progress(100)
-                status_text.text('✅ Categorization complete!')
-                
                 st.success(f'🎉 Successfully categorized {len(df_processed)} messages!')
                 
                 st.subheader('📊 Results')
@@ -234,10 +227,9 @@ if uploaded_file is not None:
                     st.metric("Messages in Top Category", most_common_count)
                 
                 with st.expander("📋 Detailed Results", expanded=False):
-                    st.dataframe(
-                        df_processed[[message_column, 'predicted_category']], 
-                        use_container_width=True
-                    )
+                    # Paged from precomputed indexes instead of sending every row to the browser
+                    render_results_browser(results_index(result_key, df_processed[message_column],
+                                                         df_processed['predicted_category'], categorizer))
                 
                 st.subheader('📈 Category Distribution')
                 category_counts_df = category_counts.reset_index()
@@ -248,8 +240,24 @@ if uploaded_file is not None:
                 
                 st.dataframe(category_counts_df, use_container_width=True)
                 
+                # Delivery errors joined to the predicted categories, campaigns, templates and send hours
+                error_column = find_error_column(df.columns)
+                if error_column is not None:
+                    date_column = find_date_column(df)
+                    with st.spinner('Computing error rates...'):
+                        error_results = error_breakdowns(
+                            result_key, df[error_column], results_index(result_key, df_processed[message_column],
+                                                                        df_processed['predicted_category'], categorizer),
+                            df[date_column] if date_column is not None else None
+                        )
+                    if error_results.errors > 0:
+                        render_error_breakdowns(error_results)
+                
                 st.subheader('📊 Visualizations')
                 
+                # Plotly is only loaded once there is something to plot
+                import plotly.express as px
+                
                 tab1, tab2, tab3 = st.tabs(["🥧 Pie Chart", "📊 Bar Chart", "📈 Horizontal Bar"])
                 
                 with tab1:
@@ -296,35 +304,35 @@ if uploaded_file is not None:
                 
                 st.subheader('💾 Download Results')
                 
-                download_df = df_processed[[message_column, 'predicted_category']].copy()
-                if not isinstance(download_df, pd.DataFrame):
-                    download_df = pd.DataFrame(download_df)
-                download_df.columns = ['Message', 'Predicted_Category']
-                
-                download_df['Processing_Timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                # Download files are only built when asked for, not on every rerun
+                def build_download_df():
+                    download_df = df_processed[[message_column, 'predicted_category']].copy()
+                    if not isinstance(download_df, pd.DataFrame):
+                        download_df = pd.DataFrame(download_df)
+                    download_df.columns = ['Message', 'Predicted_Category']
+                    download_df['Rule_Pack_Hash'] = job.rule_pack.short_hash
+                    download_df['Processing_Timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    return download_df
                 
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    csv = download_df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label='📥 Download as CSV',
-                        data=csv,
-                        file_name=f'categorized_sms_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-                        mime='text/csv'
+                    lazy_download(
+                        'CSV',
+                        result_key + ('csv',),
+                        lambda: build_download_df().to_csv(index=False).encode('utf-8'),
+                        f'categorized_sms_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+                        'text/csv'
                     )
                 
                 with col2:
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        download_df.to_excel(writer, sheet_name='Categorized_SMS', index=False)
-                        category_counts_df.to_excel(writer, sheet_name='Category_Summary', index=False)
-                    buffer.seek(0)
-                    st.download_button(
-                        label='📥 Download as Excel',
-                        data=buffer.getvalue(),
-                        file_name=f'categorized_sms_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
-                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    # Streamed in constant memory; results over Excel's row limit span several sheets
+                    lazy_download(
+                        'Excel',
+                        result_key + ('xlsx',),
+                        lambda: excel_bytes(build_download_df()),
+                        f'categorized_sms_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+                        EXCEL_MIME
                     )
                 
             except Exception as e:
@@ -336,6 +344,11 @@ if uploaded_file is not None:
         st.info('Please ensure your file is properly formatted and not corrupted.')
 
 else:
+    # After a browser refresh the upload is gone, but a tracked job keeps its results
+    detached_job = current_job()
+    if detached_job is not None:
+        render_detached_job(detached_job)
+    
     st.info('👆 Please upload a file to get started')
     
     with st.expander("📋 Expected File Format", expanded=False):
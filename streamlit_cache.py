@@ -0,0 +1,290 @@
+import hashlib
+import io
+import math
+
+import pandas as pd
+import streamlit as st
+
+from campaign_clusterer import IncrementalCampaignClusterer
+from categorization_jobs import JobManager
+from error_analytics import ErrorAnalytics
+from excel_export import excel_bytes
+from main import SMSCategorizer
+from preview import ReservoirSample, preview_categories
+from results_index import ResultsIndex
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_categorizer():
+    return SMSCategorizer()
+
+
+def get_categorizer():
+    """Return the shared categorizer, picking up edits to its rule pack file
+
+    The categorizer is built once per server process; each rerun only stats the rule
+    file and swaps in the new pack atomically if it changed.
+    """
+    categorizer = _shared_categorizer()
+    categorizer.reload_rules_if_changed()
+    return categorizer
+
+
+def rule_version(categorizer):
+    """Return the rule pack hash, used to invalidate cached results"""
+    return categorizer.rule_pack_hash
+
+
+def upload_hash(uploaded_file):
+    """Return the SHA-256 of an upload, hashing each distinct upload only once per session"""
+    hashes = st.session_state.setdefault('_upload_hashes', {})
+    key = (uploaded_file.file_id, uploaded_file.size)
+    if key not in hashes:
+        hashes[key] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[key]
+
+
+# Parsed frames are shared between reruns (and sessions uploading the same bytes)
+# without copying, so callers must treat them as read-only.
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_upload(content_hash, file_name, _upload):
+    """Parse an uploaded CSV/Excel file, cached by content hash"""
+    data = io.BytesIO(_upload.getvalue())
+    if file_name.endswith('.csv'):
+        return pd.read_csv(data)
+    if file_name.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(data)
+    raise ValueError(f"Unsupported file type: {file_name}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_manager():
+    """Shared background worker pool; jobs outlive reruns and browser refreshes
+
+    Its process pool is started here, once per server, and reused by every session.
+    """
+    manager = JobManager()
+    manager.warm()
+    return manager
+
+
+def current_job(result_key=None):
+    """Return the job tracked by this session (or the URL), optionally requiring a key match"""
+    manager = get_job_manager()
+    job_id = st.session_state.get('job_id') or st.query_params.get('job')
+    job = manager.get(job_id) if job_id else None
+    if job is not None and result_key is not None and job.key != result_key:
+        job = None
+    if job is None and result_key is not None:
+        # A finished (or running) job for the same file, column and rules doubles as a cache
+        job = manager.find(result_key)
+    if job is not None:
+        track_job(job)
+    return job
+
+
+def track_job(job):
+    """Remember the job in session state and the URL so a refresh can reattach to it"""
+    st.session_state['job_id'] = job.id
+    if st.query_params.get('job') != job.id:
+        st.query_params['job'] = job.id
+
+
+@st.fragment(run_every=1.0)
+def job_progress_panel(job_id):
+    """Poll a running job, showing progress and partial category counts"""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    
+    st.progress(job.progress())
+    st.text(f'Processed {job.done:,}/{job.total:,} messages...')
+    counts = job.partial_counts()
+    if counts:
+        partial = pd.Series(counts, name='Count').sort_values(ascending=False)
+        st.caption('Partial category counts')
+        st.bar_chart(partial)
+    if st.button('⏹️ Cancel categorization', key=f'cancel_{job_id}'):
+        manager.cancel(job_id)
+
+
+def render_detached_job(job):
+    """Show a job whose upload is no longer in the session (e.g. after a browser refresh)"""
+    st.subheader('🔄 Categorization Job')
+    st.caption(f'Job {job.id} - {job.total:,} messages')
+    if not job.finished:
+        job_progress_panel(job.id)
+        return
+    if job.status == 'failed':
+        st.error(f'❌ Job failed: {job.error}')
+        return
+    if job.status == 'cancelled':
+        st.warning(f'⏹️ Job cancelled after {job.done:,}/{job.total:,} messages.')
+    
+    counts_df = pd.Series(job.partial_counts(), name='Count').sort_values(ascending=False).reset_index()
+    counts_df.columns = ['Category', 'Count']
+    counts_df['Percentage'] = (counts_df['Count'] / max(job.done, 1) * 100).round(2)
+    st.dataframe(counts_df, use_container_width=True)
+    
+    if job.status == 'done':
+        # Finished jobs don't keep the uploaded messages; rows are numbered as in the upload
+        st.caption('Upload the same file again to see the messages next to their categories.')
+        
+        def results():
+            categories = job.categories()
+            frame = pd.DataFrame({'Row': range(1, len(categories) + 1), 'Predicted_Category': categories})
+            frame['Rule_Pack_Hash'] = job.rule_pack.short_hash
+            return frame
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            lazy_download('CSV', (job.id, 'csv'), lambda: results().to_csv(index=False).encode('utf-8'),
+                          f'categorized_sms_{job.id}.csv', 'text/csv')
+        with col2:
+            lazy_download('Excel', (job.id, 'xlsx'), lambda: excel_bytes(results()),
+                          f'categorized_sms_{job.id}.xlsx', EXCEL_MIME)
+
+
+EXCEL_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def lazy_download(label, key, build, file_name, mime):
+    """Download button whose file is only generated once the user asks for it
+
+    ``key`` ends with the format; built files are kept in session state for the
+    latest result only, so switching uploads releases the old downloads.
+    """
+    downloads = st.session_state.setdefault('_downloads', {})
+    if key not in downloads:
+        if not st.button(f'⚙️ Prepare {label} download', key=f'prepare_{key}'):
+            return
+        with st.spinner(f'Preparing {label} file...'):
+            data = build()
+        for other in [k for k in downloads if k[:-1] != key[:-1]]:
+            del downloads[other]
+        downloads[key] = data
+    st.download_button(
+        label=f'📥 Download as {label}',
+        data=downloads[key],
+        file_name=file_name,
+        mime=mime,
+        key=f'download_{key}'
+    )
+
+
+def category_preview(result_key, messages, categorizer, sample_size):
+    """Estimate the category mix from a random sample, once per upload, column, rules and size"""
+    previews = st.session_state.setdefault('_previews', {})
+    key = tuple(result_key) + (sample_size,)
+    if key not in previews:
+        reservoir = ReservoirSample(sample_size).add(messages.to_numpy())
+        previews[key] = preview_categories(categorizer, reservoir.sample, reservoir.seen)
+    return previews[key]
+
+
+def render_preview(preview):
+    """Show a sampled category estimate with its confidence intervals"""
+    st.subheader('⚡ Quick Preview')
+    st.caption(f"Estimated from a random sample of {preview.attrs['sample_size']:,} of "
+               f"{preview.attrs['total_rows']:,} messages ({preview.attrs['confidence']:.0%} confidence intervals). "
+               f"Start the categorization to process every message.")
+    preview_df = pd.DataFrame({
+        'Category': preview['category'],
+        'Sample Count': preview['sample_count'],
+        'Estimated %': (preview['proportion'] * 100).round(1),
+        'Low %': (preview['ci_low'] * 100).round(1),
+        'High %': (preview['ci_high'] * 100).round(1),
+        'Estimated Messages': preview['estimated_messages'],
+    })
+    st.dataframe(preview_df, use_container_width=True)
+
+
+def results_index(result_key, messages, categories, categorizer):
+    """Return the browsing index of a finished result, built once per session and result"""
+    indexes = st.session_state.setdefault('_results_index', {})
+    if result_key not in indexes:
+        # Only the latest result is kept browsable
+        indexes.clear()
+        indexes[result_key] = ResultsIndex(messages, categories, categorizer)
+    return indexes[result_key]
+
+
+def error_breakdowns(result_key, errors, index, timestamps=None):
+    """Delivery error counts of a finished result by category, campaign, template and hour
+
+    Templates come from the results index; campaigns group them with an
+    IncrementalCampaignClusterer and are named after their leading template.
+    Built once per session and result.
+    """
+    cache = st.session_state.setdefault('_error_breakdowns', {})
+    if result_key not in cache:
+        cache.clear()
+        index.build_templates()
+        templates = index.template_texts[index.template_codes]
+        clusterer = IncrementalCampaignClusterer()
+        campaigns = clusterer.assign(templates, index.categories)
+        analytics = ErrorAnalytics().add(errors, category=index.categories, campaign=campaigns,
+                                         template=templates, timestamps=timestamps)
+        cache[result_key] = analytics.relabel('campaign', clusterer.labels(pd.unique(campaigns)))
+    return cache[result_key]
+
+
+def render_error_breakdowns(analytics, min_messages=20):
+    """Error rate tables by category, campaign, template and hour of sending"""
+    st.subheader('⚠️ Error Rates')
+    dimensions = [('category', 'Category'), ('campaign', 'Campaign'), ('template', 'Template'), ('window', 'Hour')]
+    dimensions = [(dimension, label) for dimension, label in dimensions if dimension in analytics.counts]
+    for (dimension, label), tab in zip(dimensions, st.tabs([f'By {label}' for _, label in dimensions])):
+        with tab:
+            rates = analytics.rates(dimension, min_messages=1 if dimension == 'category' else min_messages)
+            if dimension != 'category':
+                st.caption(f'{label}s with at least {min_messages} messages')
+            rates['error_rate'] = (rates['error_rate'] * 100).round(2)
+            rates.columns = [label, 'Messages', 'Errors', 'Error Rate (%)']
+            st.dataframe(rates, use_container_width=True, hide_index=True)
+
+
+def render_results_browser(index, page_size=50):
+    """Paginated, filterable view of the results; a rerun only renders the rows of one page"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        counts = index.category_counts
+        category = st.selectbox(
+            'Category',
+            ['All'] + counts.index.tolist(),
+            format_func=lambda c: c if c == 'All' else f'{c} ({counts[c]:,})',
+            key='browse_category'
+        )
+    with col2:
+        search = st.text_input('Search messages', key='browse_search')
+    with col3:
+        by_template = st.checkbox('Filter by template', key='browse_by_template')
+    
+    filters = {'category': None if category == 'All' else category, 'search': search or None}
+    template_id = None
+    if by_template:
+        with st.spinner('Indexing templates...'):
+            # The most frequent templates among the current matches; rarer ones are reachable through search
+            top = index.top_templates(500, **filters).set_index('template_id')
+        template_id = st.selectbox(
+            'Template',
+            top.index.tolist(),
+            format_func=lambda i: f"[{top.at[i, 'messages']:,} msgs] {top.at[i, 'template'][:120]}",
+            key='browse_template'
+        )
+    filters['template_id'] = template_id
+    total = len(index.positions(**filters))
+    pages = max(1, math.ceil(total / page_size))
+    # A narrower filter can leave the remembered page past the end
+    if st.session_state.get('browse_page', 1) > pages:
+        st.session_state['browse_page'] = pages
+    page = st.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, step=1, key='browse_page')
+    
+    frame, total = index.page(int(page) - 1, page_size, **filters)
+    first = (int(page) - 1) * page_size
+    if total:
+        st.caption(f'Rows {first + 1:,}-{first + len(frame):,} of {total:,} matching messages')
+    else:
+        st.caption('No messages match these filters')
+    st.dataframe(frame, use_container_width=True, hide_index=True)
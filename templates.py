@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+class TemplateDictionary:
+    """Interns template strings to stable integer IDs
+
+    A single dictionary is shared across analyze_sms_data calls on the same
+    categorizer, so a template keeps its ID across batches and files.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.templates = []
+
+    def __len__(self):
+        return len(self.templates)
+
+    def __getitem__(self, template_id):
+        return self.templates[template_id]
+
+    def intern(self, template):
+        """Return the ID of ``template``, assigning the next free ID if it is new"""
+        template_id = self.ids.get(template)
+        if template_id is None:
+            template_id = self.ids[template] = len(self.templates)
+            self.templates.append(template)
+        return template_id
+
+    def intern_many(self, templates):
+        """Intern a sequence of templates and return their IDs as an int32 array"""
+        codes, uniques = pd.factorize(pd.Series(templates, dtype=object), sort=False)
+        unique_ids = np.fromiter((self.intern(t) for t in uniques), dtype=np.int32, count=len(uniques))
+        return unique_ids[codes]
+
+    def lookup(self, template_ids):
+        """Return the template strings for an array of IDs"""
+        templates = np.array(self.templates, dtype=object)
+        return templates[np.asarray(template_ids, dtype=np.int64)]
+
+    def to_frame(self):
+        """Return the dictionary as a (template_id, template) DataFrame"""
+        return pd.DataFrame({
+            'template_id': np.arange(len(self.templates), dtype=np.int32),
+            'template': self.templates,
+        })
+
+
+def smallest_int_dtype(values):
+    """Return the narrowest signed integer dtype that holds ``values``"""
+    if len(values) == 0:
+        return np.int8
+    low, high = int(np.min(values)), int(np.max(values))
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
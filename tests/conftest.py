@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_MESSAGES = [
+    "Hi John, Your due date: 2024-12-15. Check the Fido app Help section for payment steps.",
+    "Hi Mary Your FIDO loan of 500 GHS (minus 1.6% commitment fee) is now in your mobile wallet. Client ID: FID123456.",
+    "Your Fido security code is 123456. Valid for 5 minutes.",
+    "Hello Peter, you have been offered a 50% DISCOUNT on your written off loan. Kindly pay Ghc250 in 4 weeks "
+    "to enjoy this offer and have your name taken off the blacklist.",
+    "Hi Sarah, Your Fido loan is due! Pay GHS350 by 2024-12-10 to stay eligible for future loans. Stay on track!",
+    "Hello James, your fidobiz loan amount of GHS 1200 is now 15 days overdue. We know things are tough but "
+    "let's make a plan!",
+    "Hi Anna! Payment of GHS200 confirmed 2024-12-01. Next payment due soon - check your loan schedule. "
+    "Ready to grow? Upgrade to FidoBiz for larger business loans up to GHc 7500!",
+    "Top up your account now! 50% bonus offer",
+    "Your verification code: 789012",
+    "Hi Mike, Loan fully repaid! Want an upgrade to GHc 7500? Join FidoBiz and submit your momo statement!",
+    "Hello Grace, Early repayment reminder: Your loan is not due yet, but timely payment improves your "
+    "Fido Score and keeps you eligible for your next loan.",
+    "Great news David! Your exclusive 35% discount offer is still active. Pay only GHS 180 by 6th June 2025 "
+    "and the overdue balance will be cleared for you.",
+    "Hi Kofi, your payment is due on 12-03-2025. Want an upgrade to GHC 2000?",
+    "1234",
+    "random hello there",
+    "Dial *998# for loan services",
+    "Your account will be charged GHS 5 daily interest",
+    "settle your debt under the lenders and borrowers act",
+]
+
+
+def make_messages(n, seed=0):
+    """Realistic messages plus random word salads and concatenations that hit several categories"""
+    rng = random.Random(seed)
+    words = ' '.join(SAMPLE_MESSAGES).split()
+    messages = list(SAMPLE_MESSAGES)
+    while len(messages) < n:
+        if rng.random() < 0.7:
+            messages.append(' '.join(rng.choice(words) for _ in range(rng.randint(1, 30))))
+        else:
+            messages.append(' '.join(rng.sample(SAMPLE_MESSAGES, 2)))
+    return messages[:n]
+
+
+@pytest.fixture
+def messages():
+    return make_messages(2000)
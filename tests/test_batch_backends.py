@@ -0,0 +1,24 @@
+import pandas as pd
+
+from batch_sms_categorizer import categorize_frame
+from categorization import SMSCategorizer
+from conftest import make_messages
+from linear_backend import train_linear_backend
+
+
+def test_rules_backend_matches_the_engine(messages):
+    categorizer = SMSCategorizer()
+    results = categorize_frame(pd.DataFrame({'message': messages}), 'a.csv', categorizer)
+    expected = [categorizer.pattern_based_categorization(categorizer.preprocess_text(m)) for m in messages]
+    assert results['predicted_category'].tolist() == expected
+
+
+def test_batch_uses_the_linear_backend(tmp_path, messages):
+    model = train_linear_backend(SMSCategorizer(), make_messages(5000, seed=3))
+    model.save(str(tmp_path / 'linear.model'))
+    categorizer = SMSCategorizer(backend='linear', linear_model=str(tmp_path / 'linear.model'))
+    results = categorize_frame(pd.DataFrame({'message': messages}), 'a.csv', categorizer)
+    stats = categorizer.backend_stats
+    assert stats['model_predictions'] > 0
+    assert stats['model_predictions'] + stats['rule_fallbacks'] == len(messages)
+    assert len(results) == len(messages)
@@ -0,0 +1,93 @@
+import numpy as np
+
+import campaign_clusterer
+from campaign_clusterer import IncrementalCampaignClusterer
+from categorization import SMSCategorizer
+from conftest import make_messages
+
+OTP = [f"your fido security code is {code} valid for five minutes" for code in ('alpha', 'bravo', 'delta')]
+LOAN = [f"your fido loan is overdue pay via {channel} today" for channel in ('momo', 'bank', 'branch')]
+
+
+def corpus(n, seed):
+    categorizer = SMSCategorizer()
+    processed = [categorizer.preprocess_text(m) for m in make_messages(n, seed)]
+    return [categorizer.extract_template(t) for t in processed], categorizer.categorize_processed(processed)
+
+
+def test_campaign_ids_are_stable_across_batches():
+    clusterer = IncrementalCampaignClusterer(maintenance_interval=0)
+    first = clusterer.assign(OTP + LOAN, ['OTP'] * 3 + ['Recovery'] * 3)
+    assert len(set(first[:3])) == 1 and len(set(first[3:])) == 1 and first[0] != first[3]
+    # A later batch with new variants (and another order) joins the same campaigns
+    second = clusterer.assign([LOAN[0].replace('momo', 'agent'), OTP[0].replace('alpha', 'echo')],
+                              ['Recovery', 'OTP'])
+    assert second.tolist() == [first[3], first[0]]
+    assert clusterer.next_id == 2
+
+
+def test_categories_never_share_a_campaign():
+    clusterer = IncrementalCampaignClusterer()
+    ids = clusterer.assign(OTP[:2], ['OTP', 'Other'])
+    assert ids[0] != ids[1]
+
+
+def test_near_duplicate_campaigns_merge_into_the_older_one():
+    # Strict assignment keeps the variants apart; maintenance then merges them
+    clusterer = IncrementalCampaignClusterer(threshold=0.99, merge_threshold=0.5, maintenance_interval=0)
+    ids = clusterer.assign(LOAN, ['Recovery'] * 3)
+    assert len(set(ids)) == 3
+    merges, _ = clusterer.maintain()
+    assert sorted(retired for retired, _ in merges) == [1, 2]
+    assert all(clusterer.resolve(i) == 0 for i in ids)
+    assert list(clusterer.campaigns) == [0]
+    assert clusterer.campaigns[0].count == 3
+    assert set(clusterer.labels(ids).values()) == {f"0: {LOAN[0]}"}
+
+
+def test_incoherent_campaign_is_split():
+    # A zero threshold lumps everything into one campaign
+    clusterer = IncrementalCampaignClusterer(threshold=0.0, split_threshold=0.9, min_split_size=2,
+                                             maintenance_interval=0)
+    ids = clusterer.assign(OTP + LOAN, ['OTP'] * 6)
+    assert len(set(ids)) == 1
+    _, splits = clusterer.maintain()
+    assert splits == [(0, 1)]
+    sides = {template: campaign.id for campaign in clusterer.campaigns.values() for template in campaign.members}
+    assert len({sides[t] for t in OTP}) == 1 and len({sides[t] for t in LOAN}) == 1
+    assert sides[OTP[0]] != sides[LOAN[0]]
+    # New messages follow the split
+    assert clusterer.assign([OTP[1], LOAN[1]], ['OTP', 'OTP']).tolist() == [sides[OTP[1]], sides[LOAN[1]]]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    templates, categories = corpus(3000, 1)
+    clusterer = IncrementalCampaignClusterer(maintenance_interval=2, min_split_size=10)
+    clusterer.assign(templates[:1000], categories[:1000])
+    path = str(tmp_path / 'campaigns.pickle')
+    clusterer.save(path)
+    loaded = IncrementalCampaignClusterer.load(path)
+    assert loaded.campaigns_frame().equals(clusterer.campaigns_frame())
+    # Both continue identically, maintenance included
+    for start in (1000, 2000):
+        batch = slice(start, start + 1000)
+        assert (loaded.assign(templates[batch], categories[batch])
+                == clusterer.assign(templates[batch], categories[batch])).all()
+    assert loaded.merged_into == clusterer.merged_into
+
+
+def test_blocked_similarity_matches_one_block(monkeypatch):
+    templates, categories = corpus(3000, 2)
+    
+    def run():
+        clusterer = IncrementalCampaignClusterer(maintenance_interval=2, min_split_size=10, merge_threshold=0.6)
+        ids = [clusterer.assign(templates[start:start + 1000], categories[start:start + 1000])
+               for start in range(0, 3000, 1000)]
+        return np.concatenate(ids), clusterer.merged_into
+    
+    whole = run()
+    assert whole[1], "the corpus should exercise merges"
+    monkeypatch.setattr(campaign_clusterer, 'SIMILARITY_BLOCK_ROWS', 7)
+    blocked = run()
+    assert (blocked[0] == whole[0]).all()
+    assert blocked[1] == whole[1]
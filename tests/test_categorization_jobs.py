@@ -0,0 +1,106 @@
+import time
+
+import pandas as pd
+import pytest
+
+import categorization_jobs
+from categorization import SMSCategorizer
+from categorization_jobs import CategorizationJob, JobManager
+from conftest import make_messages
+
+
+def wait_for(job, timeout=120):
+    deadline = time.time() + timeout
+    while not job.finished:
+        assert time.time() < deadline, f"job still {job.status}"
+        time.sleep(0.02)
+    return job
+
+
+@pytest.fixture
+def categorizer():
+    return SMSCategorizer()
+
+
+def test_thread_job_matches_the_engine(categorizer, messages):
+    manager = JobManager(processes=0)
+    job = wait_for(manager.submit('a', pd.Series(messages), categorizer, chunk_size=300))
+    expected = [categorizer.pattern_based_categorization(categorizer.preprocess_text(m)) for m in messages]
+    assert job.status == 'done'
+    assert list(job.categories()) == expected
+    assert job.partial_counts() == pd.Series(expected).value_counts().to_dict()
+    manager.shutdown()
+
+
+def test_process_pool_matches_sequential_mode(categorizer, monkeypatch):
+    monkeypatch.setattr(categorization_jobs, 'MIN_PROCESS_MESSAGES', 1000)
+    messages = pd.Series(make_messages(6000, seed=4))
+    sequential = JobManager(processes=0)
+    pooled = JobManager(processes=2)
+    try:
+        expected = wait_for(sequential.submit('a', messages, categorizer))
+        job = wait_for(pooled.submit('a', messages, categorizer))
+        assert pooled._pool is not None
+        assert job.status == 'done'
+        assert list(job.categories()) == list(expected.categories())
+        assert job.partial_counts() == expected.partial_counts()
+    finally:
+        sequential.shutdown()
+        pooled.shutdown()
+
+
+def test_out_of_order_chunks_are_collected_in_order():
+    job = CategorizationJob('a', pd.Series(['m'] * 6), chunk_size=2)
+    job._add_chunk(['c', 'c'], 2)
+    assert job.done == 2 and job.categories() == []
+    job._add_chunk(['a', 'a'], 0)
+    assert job.categories() == ['a', 'a']
+    job._add_chunk(['b', 'b'], 1)
+    assert job.categories() == ['a', 'a', 'b', 'b', 'c', 'c']
+    assert job.progress() == 1.0
+
+
+def test_finished_job_releases_its_input(categorizer, messages):
+    manager = JobManager(processes=0)
+    job = wait_for(manager.submit('a', pd.Series(messages), categorizer))
+    assert job.messages is None
+    assert job.chunks == []
+    assert 0 < job.nbytes < len(messages) * 2
+    assert len(job.categories()) == len(messages)
+    manager.shutdown()
+
+
+def test_finished_results_are_evicted_by_size(categorizer):
+    messages = pd.Series(make_messages(1000))
+    manager = JobManager(processes=0, max_result_bytes=2500)
+    jobs = [wait_for(manager.submit(str(i), messages, categorizer)) for i in range(4)]
+    time.sleep(0.05)
+    # Each result is about 1 KB: the two newest fit, older ones are dropped
+    assert [manager.get(job.id) is not None for job in jobs] == [False, False, True, True]
+    
+    single = JobManager(processes=0, max_result_bytes=1)
+    job = wait_for(single.submit('a', messages, categorizer))
+    time.sleep(0.05)
+    assert single.get(job.id) is job
+    manager.shutdown()
+    single.shutdown()
+
+
+def test_finished_results_are_evicted_by_count(categorizer):
+    manager = JobManager(processes=0, max_jobs=2)
+    jobs = [wait_for(manager.submit(str(i), pd.Series(['hello']), categorizer)) for i in range(3)]
+    time.sleep(0.05)
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[2].id) is jobs[2]
+    manager.shutdown()
+
+
+def test_cancelled_job_stops_early(categorizer):
+    manager = JobManager(processes=0)
+    job = manager.submit('a', pd.Series(make_messages(20000)), categorizer, chunk_size=200)
+    manager.cancel(job.id)
+    wait_for(job)
+    assert job.status == 'cancelled'
+    assert job.done < job.total
+    assert len(job.categories()) == job.done
+    manager.shutdown()
@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+import pytest
+
+from batch_sms_categorizer import batch_categorize_sms
+from checkpoint import JOURNAL, BatchCheckpoint
+
+COLUMNS = ['message', 'predicted_category', 'source_file']
+
+
+@pytest.fixture
+def folder(tmp_path, messages):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    pd.DataFrame({'message': messages[:1200]}).to_csv(folder / 'a.csv', index=False)
+    pd.DataFrame({'message': messages[1200:]}).to_csv(folder / 'b.csv', index=False)
+    return folder
+
+
+def run(folder, tmp_path, name, **options):
+    result = batch_categorize_sms(str(folder), str(tmp_path / name), checkpoint_rows=250, **options)
+    return None if result is None else pd.read_csv(tmp_path / name)
+
+
+def crash_after(monkeypatch, commits):
+    """Make the run die (like a killed process) once ``commits`` chunks are committed"""
+    original = BatchCheckpoint.commit
+    calls = []
+
+    def commit(self, *args, **kwargs):
+        if len(calls) == commits:
+            raise KeyboardInterrupt
+        calls.append(1)
+        return original(self, *args, **kwargs)
+    monkeypatch.setattr(BatchCheckpoint, 'commit', commit)
+
+
+def committed_chunks(checkpoint_dir):
+    with open(os.path.join(checkpoint_dir, JOURNAL)) as f:
+        return len(f.read().splitlines()) - 1
+
+
+@pytest.mark.parametrize('commits', [0, 3, 6])
+def test_resumed_run_matches_an_uninterrupted_one(folder, tmp_path, monkeypatch, commits):
+    expected = run(folder, tmp_path, 'plain.csv')
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    crash_after(monkeypatch, commits)
+    with pytest.raises(KeyboardInterrupt):
+        run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir)
+    monkeypatch.undo()
+    assert committed_chunks(checkpoint_dir) == commits
+    
+    resumed = run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir, resume=True)
+    pd.testing.assert_frame_equal(resumed[COLUMNS], expected[COLUMNS])
+    assert not os.path.exists(checkpoint_dir)
+
+
+def test_torn_journal_line_is_dropped_on_resume(folder, tmp_path, monkeypatch):
+    expected = run(folder, tmp_path, 'plain.csv')
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    crash_after(monkeypatch, 4)
+    with pytest.raises(KeyboardInterrupt):
+        run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir)
+    monkeypatch.undo()
+    with open(os.path.join(checkpoint_dir, JOURNAL), 'a') as f:
+        f.write('{"file": "half a rec')
+    resumed = run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir, resume=True)
+    pd.testing.assert_frame_equal(resumed[COLUMNS], expected[COLUMNS])
+
+
+def test_unfinished_checkpoint_is_not_discarded_without_a_flag(folder, tmp_path, monkeypatch):
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    crash_after(monkeypatch, 3)
+    with pytest.raises(KeyboardInterrupt):
+        run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir)
+    monkeypatch.undo()
+    
+    assert run(folder, tmp_path, 'other.csv', checkpoint_dir=checkpoint_dir) is None
+    assert committed_chunks(checkpoint_dir) == 3
+    # An empty folder must not touch it either, even with --fresh
+    empty = tmp_path / 'empty'
+    empty.mkdir()
+    assert run(empty, tmp_path, 'other.csv', checkpoint_dir=checkpoint_dir, fresh=True) is None
+    assert committed_chunks(checkpoint_dir) == 3
+    
+    assert run(folder, tmp_path, 'fresh.csv', checkpoint_dir=checkpoint_dir, fresh=True) is not None
+    assert not os.path.exists(checkpoint_dir)
+
+
+def test_resume_refuses_a_different_folder(folder, tmp_path, monkeypatch):
+    checkpoint_dir = str(tmp_path / 'ckpt')
+    crash_after(monkeypatch, 2)
+    with pytest.raises(KeyboardInterrupt):
+        run(folder, tmp_path, 'out.csv', checkpoint_dir=checkpoint_dir)
+    monkeypatch.undo()
+    with pytest.raises(ValueError):
+        BatchCheckpoint(checkpoint_dir).resume(str(tmp_path), 'anything')
+
+
+def test_only_checkpoint_files_are_deleted(tmp_path):
+    directory = tmp_path / 'shared'
+    directory.mkdir()
+    (directory / 'notes.txt').write_text('keep me')
+    (directory / 'sub').mkdir()
+    (directory / 'sub' / 'data.csv').write_text('keep me too')
+    source = tmp_path / 'a.csv'
+    source.write_text('message\nhello\n')
+    
+    checkpoint = BatchCheckpoint(str(directory)).start(str(tmp_path), 'hash')
+    checkpoint.commit(str(source), pd.DataFrame({'message': ['hello']}), 0, 1, final=True)
+    BatchCheckpoint(str(directory)).start(str(tmp_path), 'hash')
+    assert sorted(os.listdir(directory)) == [JOURNAL, 'notes.txt', 'parts', 'sub']
+    assert os.listdir(directory / 'parts') == []
+    
+    checkpoint.remove()
+    assert sorted(os.listdir(directory)) == ['notes.txt', 'sub']
+    assert (directory / 'sub' / 'data.csv').read_text() == 'keep me too'
@@ -0,0 +1,73 @@
+import random
+
+import pandas as pd
+import yaml
+
+from categorization import SMSCategorizer
+from rule_pack import DEFAULT_RULE_PACK, rule_pack_from_bytes
+
+
+def categorize(categorizer, messages):
+    return [categorizer.pattern_based_categorization(categorizer.preprocess_text(m)) for m in messages]
+
+
+def shuffled_pack(seed):
+    """The default rules with random weights and priorities, to exercise the bounds"""
+    rng = random.Random(seed)
+    with open(DEFAULT_RULE_PACK, encoding='utf-8') as f:
+        raw = yaml.safe_load(f)
+    for category in raw['categories']:
+        category['priority'] = rng.choice([1, 1.5, 2, 3])
+        category['patterns'] = [{'pattern': p if isinstance(p, str) else p['pattern'], 'weight': rng.randint(1, 6)}
+                                for p in category['patterns']]
+    return rule_pack_from_bytes(yaml.safe_dump(raw).encode('utf-8'), cache_dir=None)
+
+
+def test_early_exit_matches_exhaustive_scoring(messages):
+    exhaustive = SMSCategorizer(early_exit=False)
+    assert categorize(SMSCategorizer(), messages) == categorize(exhaustive, messages)
+
+
+def test_early_exit_matches_with_random_weights(messages):
+    for seed in range(5):
+        pack = shuffled_pack(seed)
+        early = SMSCategorizer(rule_pack=pack)
+        assert categorize(early, messages) == categorize(SMSCategorizer(rule_pack=pack, early_exit=False), messages)
+
+
+def test_profile_guided_order_keeps_results(messages):
+    exhaustive = SMSCategorizer(early_exit=False)
+    expected = categorize(exhaustive, messages)
+    
+    profiled = SMSCategorizer(profile_patterns=True)
+    categorize(profiled, messages)
+    rng = random.Random(1)
+    frequencies = {name: rng.randint(0, 1000) for name in profiled.rule_pack.category_names}
+    
+    tuned = SMSCategorizer()
+    tuned.optimize_rule_order(profiled.pattern_profile_report(), pd.Series(frequencies))
+    assert categorize(tuned, messages) == expected
+
+
+def test_plans_are_kept_for_a_few_recent_packs():
+    categorizer = SMSCategorizer()
+    pinned = categorizer.rule_pack
+    categorizer.pattern_based_categorization('your fido security code is 123456')
+    for seed in range(3):
+        categorizer.reload_rules(shuffled_pack(seed))
+        categorizer.pattern_based_categorization('your fido security code is 123456')
+    assert list(categorizer._evaluation_plans) == [pinned.content_hash] + [
+        shuffled_pack(seed).content_hash for seed in range(3)]
+    
+    # A job pinned to the older pack alternating with the active one reuses both plans
+    plans = dict(categorizer._evaluation_plans)
+    for _ in range(3):
+        categorizer.categorize_processed(['your fido security code is 123456'], pinned)
+        categorizer.categorize_processed(['your fido security code is 123456'])
+    assert categorizer._evaluation_plans == plans
+    
+    # Older plans are dropped once more packs have been loaded
+    categorizer.reload_rules(shuffled_pack(3))
+    categorizer.pattern_based_categorization('your fido security code is 123456')
+    assert len(categorizer._evaluation_plans) == 4
+    assert pinned.content_hash not in categorizer._evaluation_plans
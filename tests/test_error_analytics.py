@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from batch_sms_categorizer import add_error_counts
+from campaign_clusterer import IncrementalCampaignClusterer
+from categorization import SMSCategorizer
+from error_analytics import ErrorAnalytics
+
+
+def sample_frame(messages, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(messages)
+    return pd.DataFrame({
+        'message': messages,
+        'ErrorName': np.where(rng.random(n) < 0.2, 'Delivery failed', 'No Error (code 0 )'),
+        'SentDate': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 86400, n), unit='s'),
+    })
+
+
+def test_rates_per_dimension_match_a_groupby():
+    frame = pd.DataFrame({
+        'errors': ['', 'Failed', 'No Error (code 0 )', 'Failed', None, 'Timeout'],
+        'campaign': [1, 1, 2, 2, 2, 3],
+        'sent': pd.to_datetime(['2025-01-01 00:10', '2025-01-01 00:50', '2025-01-01 01:00',
+                                '2025-01-01 01:30', '2025-01-01 02:00', '2025-01-01 02:59']),
+    })
+    analytics = ErrorAnalytics().add(frame['errors'], campaign=frame['campaign'], timestamps=frame['sent'])
+    campaigns = analytics.rates('campaign').set_index('campaign')
+    assert campaigns.loc[1, ['messages', 'errors']].tolist() == [2, 1]
+    assert campaigns.loc[2, ['messages', 'errors']].tolist() == [3, 1]
+    assert campaigns.loc[3, 'error_rate'] == 1.0
+    assert analytics.rates('window')['errors'].tolist() == [1, 1, 1]
+
+
+def test_relabel_sums_keys_with_the_same_label():
+    analytics = ErrorAnalytics().add(['Failed', '', 'Failed', ''], campaign=[1, 1, 2, 3])
+    analytics.relabel('campaign', {1: 'a', 2: 'a', 3: 'b'})
+    rates = analytics.rates('campaign').set_index('campaign')
+    assert rates.loc['a', ['messages', 'errors']].tolist() == [3, 2]
+    assert rates.loc['b', ['messages', 'errors']].tolist() == [1, 0]
+
+
+def test_merge_matches_a_single_pass():
+    errors = ['Failed', '', 'Failed', '', 'Timeout', '']
+    categories = ['OTP', 'OTP', 'Other', 'Other', 'Other', 'OTP']
+    whole = ErrorAnalytics().add(errors, category=categories)
+    parts = ErrorAnalytics().add(errors[:3], category=categories[:3]).merge(
+        ErrorAnalytics().add(errors[3:], category=categories[3:]))
+    assert whole.report() == parts.report()
+
+
+def test_batch_counts_every_breakdown(messages):
+    categorizer = SMSCategorizer()
+    results = sample_frame(messages[:600])
+    results['predicted_category'] = categorizer.categorize_messages(results['message'].tolist())
+    analytics = ErrorAnalytics()
+    add_error_counts(analytics, results, 'ErrorName', categorizer, IncrementalCampaignClusterer())
+    report = analytics.report()
+    assert set(report) >= {'category', 'campaign', 'template', 'window'}
+    for dimension in ('category', 'campaign', 'template', 'window'):
+        assert analytics.rates(dimension)['messages'].sum() == len(results)
+        assert analytics.rates(dimension)['errors'].sum() == analytics.errors
+
+
+def test_campaigns_are_only_clustered_for_an_error_report(tmp_path, messages):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    sample_frame(messages[:300]).to_csv(folder / 'a.csv', index=False)
+    # A fresh interpreter, since other tests have already imported scikit-learn
+    script = f"""
+import sys
+from batch_sms_categorizer import batch_categorize_sms
+batch_categorize_sms({str(folder)!r}, {str(tmp_path / 'out.csv')!r})
+assert 'sklearn' not in sys.modules, 'plain run clustered campaigns'
+batch_categorize_sms({str(folder)!r}, {str(tmp_path / 'out.csv')!r}, error_report={str(tmp_path / 'report.json')!r})
+assert 'sklearn' in sys.modules
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / 'report.json') as f:
+        report = json.load(f)
+    assert {'category', 'campaign', 'template', 'window'} <= set(report)
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from excel_export import SHEET_NAME, SUMMARY_SHEET, write_excel
+
+
+def chunks(frame, size):
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start:start + size]
+
+
+def test_chunks_are_split_across_sheets(tmp_path):
+    frame = pd.DataFrame({
+        'message': [f"message {i}" for i in range(8)],
+        'Predicted_Category': ['OTP', 'OTP', 'Other', 'OTP', 'Recovery', 'Other', 'OTP', float('nan')],
+        'amount': [1.5, None, 3, 4, 5, 6, 7, 8],
+    })
+    path = str(tmp_path / 'results.xlsx')
+    sheets = write_excel(path, chunks(frame, 2), max_rows=3)
+    assert sheets == [(SHEET_NAME, 1, 3), (f"{SHEET_NAME}_2", 4, 6), (f"{SHEET_NAME}_3", 7, 8)]
+    
+    workbook = pd.read_excel(path, sheet_name=None)
+    assert list(workbook) == [name for name, _, _ in sheets] + [SUMMARY_SHEET]
+    # Every sheet has the header and the rows continue in order
+    data = pd.concat([workbook[name] for name, _, _ in sheets], ignore_index=True)
+    pd.testing.assert_frame_equal(data, frame, check_dtype=False)
+    
+    summary = pd.read_excel(path, sheet_name=SUMMARY_SHEET, header=None).fillna('')
+    rows = summary.values.tolist()
+    assert rows[:4] == [['Category', 'Count', 'Percentage'], ['OTP', 4, 50], ['Other', 2, 25],
+                        ['Recovery', 1, 12.5]]
+    assert ['Total messages', 8, ''] in rows
+    start = rows.index(['Sheet', 'First row', 'Last row'])
+    assert rows[start + 1:] == [[name, first, last] for name, first, last in sheets]
+
+
+def test_empty_input_still_writes_a_workbook(tmp_path):
+    path = str(tmp_path / 'empty.xlsx')
+    assert write_excel(path, iter([])) == [(SHEET_NAME, 0, 0)]
+    workbook = pd.read_excel(path, sheet_name=None)
+    assert list(workbook) == [SHEET_NAME, SUMMARY_SHEET]
@@ -0,0 +1,75 @@
+import json
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from categorization import SMSCategorizer
+from heavy_hitters import CountMinSketch, TemplateTracker
+
+
+def zipf_stream(n, seed):
+    rng = np.random.default_rng(seed)
+    return [f"template {i}" for i in rng.zipf(1.3, n) % 5000]
+
+
+def test_sketch_never_undercounts():
+    counts = Counter(zipf_stream(20000, 0))
+    sketch = CountMinSketch(width=512, depth=4)
+    items = list(counts)
+    sketch.add(items, [counts[i] for i in items])
+    assert (sketch.estimate(items) >= np.array([counts[i] for i in items])).all()
+    assert sketch.total == sum(counts.values())
+
+
+def test_merged_sketch_equals_one_sketch_over_both_streams():
+    left, right = Counter(zipf_stream(10000, 1)), Counter(zipf_stream(10000, 2))
+    a, b, whole = CountMinSketch(1024), CountMinSketch(1024), CountMinSketch(1024)
+    a.add(list(left), list(left.values()))
+    b.add(list(right), list(right.values()))
+    both = left + right
+    whole.add(list(both), list(both.values()))
+    a.merge(b)
+    assert (a.table == whole.table).all()
+    assert a.total == whole.total
+
+
+def test_sketches_of_different_shape_do_not_merge():
+    with pytest.raises(ValueError):
+        CountMinSketch(1024).merge(CountMinSketch(2048))
+    with pytest.raises(ValueError):
+        CountMinSketch(1024, seed=1).merge(CountMinSketch(1024, seed=2))
+
+
+def test_merged_trackers_find_the_heavy_templates():
+    stream = zipf_stream(40000, 3)
+    categories = ['OTP' if i % 2 else 'Other' for i in range(len(stream))]
+    left = TemplateTracker(k=5).add(categories[:20000], stream[:20000])
+    right = TemplateTracker(k=5).add(categories[20000:], stream[20000:])
+    merged = left.merge(right)
+    assert merged.total == len(stream)
+    for category in ('OTP', 'Other'):
+        exact = Counter(t for c, t in zip(categories, stream) if c == category)
+        top = merged.top_templates(category)
+        assert [t for t, _ in top][:3] == [t for t, _ in exact.most_common(3)]
+        assert all(estimate >= exact[t] for t, estimate in top)
+
+
+def test_tracker_round_trips_through_json():
+    stream = zipf_stream(5000, 4)
+    categories = ['OTP' if i % 3 else 'Other' for i in range(len(stream))]
+    tracker = TemplateTracker(k=5).add(categories, stream)
+    restored = TemplateTracker.from_dict(json.loads(json.dumps(tracker.to_dict())))
+    assert (restored.sketch.table == tracker.sketch.table).all()
+    assert restored.total == tracker.total
+    for category in ('OTP', 'Other'):
+        assert restored.top_templates(category) == tracker.top_templates(category)
+
+
+def test_categorizer_tracking_is_opt_in():
+    messages = pd.DataFrame({'message': ["Your Fido security code is 123456.", "Top up your account now!"]})
+    assert SMSCategorizer().template_tracker is None
+    categorizer = SMSCategorizer(track_templates=True)
+    categorizer.analyze_sms_data(messages.copy())
+    assert categorizer.template_tracker.total == 2
@@ -0,0 +1,47 @@
+from categorization import SMSCategorizer
+from rule_pack import rule_pack_from_bytes
+
+# Exponential in the regex module too (unlike (a+)+$, which it short-circuits)
+SLOW = r'(a|aa)+$'
+
+
+def timeout_categorizer(**options):
+    pack = rule_pack_from_bytes(f"""
+name: timeout-test
+fallback_category: Other
+categories:
+  - name: Slow
+    patterns: ['{SLOW}']
+  - name: Code
+    patterns: ['code']
+""".encode('utf-8'), cache_dir=None)
+    return SMSCategorizer(rule_pack=pack, match_timeout=0.05, **options)
+
+
+def test_fast_messages_are_not_affected():
+    categorizer = timeout_categorizer()
+    assert categorizer.pattern_based_categorization('your code') == 'Code'
+    assert categorizer.pattern_based_categorization('aaaa') == 'Slow'
+    assert categorizer.timeout_stats == {'timeouts': 0, 'fallback_matches': 0, 'fallback_failures': 0}
+
+
+def test_timed_out_message_is_retried_on_truncated_text():
+    categorizer = timeout_categorizer(fallback_max_chars=20)
+    # The truncated copy is 'code' plus a run of a's, which matches without backtracking
+    assert categorizer.pattern_based_categorization('code ' + 'a' * 40 + '!') == 'Slow'
+    assert categorizer.timeout_stats == {'timeouts': 1, 'fallback_matches': 1, 'fallback_failures': 0}
+
+
+def test_message_still_too_slow_defaults_to_the_fallback_category():
+    categorizer = timeout_categorizer(fallback_max_chars=60)
+    assert categorizer.pattern_based_categorization('code ' + 'a' * 40 + '!') == 'Other'
+    assert categorizer.timeout_stats == {'timeouts': 1, 'fallback_matches': 0, 'fallback_failures': 1}
+
+
+def test_batches_count_timeouts_per_message():
+    categorizer = timeout_categorizer(fallback_max_chars=20)
+    # Preprocessing drops punctuation, so the run of a's is followed by a word instead
+    slow = 'code ' + 'a' * 40 + ' x'
+    categories = categorizer.categorize_messages(['your code', slow, 'your code'])
+    assert categories.tolist() == ['Code', 'Slow', 'Code']
+    assert categorizer.timeout_stats['timeouts'] == 1
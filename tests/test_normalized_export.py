@@ -0,0 +1,49 @@
+import pandas as pd
+
+from categorization import SMSCategorizer
+
+CLIENT_MESSAGE = ("Hi Mary Your FIDO loan of 500 GHS (minus 1.6% commitment fee) is now in your mobile wallet. "
+                  "Client ID: FID123456.")
+
+
+def test_templates_keep_literal_client_ids():
+    categorizer = SMSCategorizer()
+    template = categorizer.extract_template(categorizer.preprocess_text(CLIENT_MESSAGE))
+    assert template.endswith('client id fid123456.')
+
+
+def test_normalized_rows_carry_slot_values(messages):
+    categorizer = SMSCategorizer()
+    df = categorizer.analyze_sms_data(pd.DataFrame({'message': messages[:300]}))
+    templates, rows = categorizer.normalize_results(df)
+    
+    assert len(rows) == len(df)
+    assert templates['message_count'].sum() == len(df)
+    joined = rows[['template_id']].merge(templates, on='template_id', how='left')
+    expected = df['template'].str.replace(r'client id:?\s*(\w+)', 'client id [CLIENT_ID]', regex=True)
+    assert (joined['template'].to_numpy() == expected.to_numpy()).all()
+    assert (joined['category'].to_numpy() == df['category'].to_numpy()).all()
+    
+    client_row = rows.iloc[messages.index(CLIENT_MESSAGE)]
+    assert client_row['client_id'] == 'fid123456'
+    amount_row = rows.iloc[messages.index("Hi Sarah, Your Fido loan is due! Pay GHS350 by 2024-12-10 to stay eligible "
+                                          "for future loans. Stay on track!")]
+    assert amount_row['amount'] == 350
+    otp_row = rows.iloc[messages.index("Your Fido security code is 123456. Valid for 5 minutes.")]
+    assert otp_row['otp_code'] == '123456'
+
+
+def test_client_ids_share_one_template():
+    categorizer = SMSCategorizer()
+    messages = [CLIENT_MESSAGE, CLIENT_MESSAGE.replace('FID123456', 'FID987654'),
+                CLIENT_MESSAGE.replace('FID123456', 'FID555555')]
+    processed = [categorizer.preprocess_text(m) for m in messages]
+    df = pd.DataFrame({'message': messages, 'processed_message': processed, 'category': 'Mambu', 'campaign_id': 0,
+                       'template': [categorizer.extract_template(text) for text in processed]})
+    assert df['template'].nunique() == 3
+    templates, rows = categorizer.normalize_results(df)
+    assert len(templates) == 1
+    assert rows['template_id'].nunique() == 1
+    assert templates.loc[0, 'template'].endswith('client id [CLIENT_ID].')
+    assert templates.loc[0, 'message_count'] == 3
+    assert rows['client_id'].tolist() == ['fid123456', 'fid987654', 'fid555555']
@@ -0,0 +1,77 @@
+import numpy as np
+import yaml
+
+import pattern_bitmaps
+from categorization import SMSCategorizer
+from pattern_bitmaps import PatternHitIndex
+from rule_pack import DEFAULT_RULE_PACK, rule_pack_from_bytes
+
+
+def edited_pack():
+    """The default rules with a pattern added, one removed, and weights and a priority changed"""
+    with open(DEFAULT_RULE_PACK, encoding='utf-8') as f:
+        raw = yaml.safe_load(f)
+    first, second = raw['categories'][0], raw['categories'][1]
+    first['patterns'] = [p if isinstance(p, str) else p['pattern'] for p in first['patterns']][1:]
+    first['patterns'].append({'pattern': r'verification code', 'weight': 7})
+    second['priority'] = 1
+    second['patterns'] = [{'pattern': p if isinstance(p, str) else p['pattern'], 'weight': 1}
+                          for p in second['patterns']]
+    return rule_pack_from_bytes(yaml.safe_dump(raw).encode('utf-8'), cache_dir=None)
+
+
+def full_run(pack, processed):
+    categorizer = SMSCategorizer(rule_pack=pack)
+    return np.array([categorizer.pattern_based_categorization(text) for text in processed], dtype=object)
+
+
+def test_bitmaps_reproduce_the_engine(messages):
+    categorizer = SMSCategorizer()
+    processed = [categorizer.preprocess_text(m) for m in messages]
+    index = PatternHitIndex.build(categorizer.rule_pack, processed)
+    assert (index.categories(categorizer.rule_pack) == full_run(categorizer.rule_pack, processed)).all()
+
+
+def test_recategorize_matches_a_full_rerun(messages):
+    categorizer = SMSCategorizer()
+    old_pack, new_pack = categorizer.rule_pack, edited_pack()
+    processed = [categorizer.preprocess_text(m) for m in messages]
+    index = PatternHitIndex.build(old_pack, processed)
+    
+    categories, changed = index.recategorize(new_pack, old_pack)
+    before, after = full_run(old_pack, processed), full_run(new_pack, processed)
+    assert (categories == after).all()
+    assert (changed == (before != after)).all()
+    assert changed.any()
+
+
+def test_update_rules_only_evaluates_new_patterns():
+    categorizer = SMSCategorizer()
+    index = PatternHitIndex.build(categorizer.rule_pack, ['your verification code is 1234'])
+    assert index.update_rules(edited_pack()) == [('OTP', 'verification code')]
+
+
+def test_save_and_load_round_trip(tmp_path, messages):
+    categorizer = SMSCategorizer()
+    processed = [categorizer.preprocess_text(m) for m in messages]
+    index = PatternHitIndex.build(categorizer.rule_pack, processed)
+    index.save(str(tmp_path))
+    loaded = PatternHitIndex.load(str(tmp_path))
+    assert (loaded.categories(categorizer.rule_pack) == index.categories(categorizer.rule_pack)).all()
+
+
+def test_blocked_scoring_matches_one_block(messages, monkeypatch):
+    categorizer = SMSCategorizer()
+    old_pack, new_pack = categorizer.rule_pack, edited_pack()
+    processed = [categorizer.preprocess_text(m) for m in messages]
+    whole = PatternHitIndex.build(old_pack, processed)
+    blocked = PatternHitIndex.build(old_pack, processed)
+    whole.update_rules(new_pack)
+    expected = whole.unique_categories(new_pack)
+    
+    # Block boundaries that don't line up with the unique texts
+    monkeypatch.setattr(pattern_bitmaps, 'BLOCK_ROWS', 97)
+    blocked.update_rules(new_pack)
+    assert (blocked.bits == whole.bits).all()
+    assert (blocked.unique_categories(new_pack) == expected).all()
+    assert (blocked.unique_categories(new_pack) == full_run(new_pack, blocked.texts)).all()
@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from preview import ReservoirSample, _z_score, wilson_interval
+
+
+@pytest.mark.parametrize('confidence, z', [(0.5, 0.674490), (0.9, 1.644854), (0.95, 1.959964), (0.99, 2.575829)])
+def test_z_score_matches_normal_quantiles(confidence, z):
+    assert _z_score(confidence) == pytest.approx(z, abs=1e-6)
+
+
+def test_wilson_interval_known_values():
+    assert wilson_interval(5, 10) == pytest.approx((0.236593, 0.763407), abs=1e-6)
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(0, 50)
+    assert low == 0.0 and 0 < high < 0.1
+    # A sample covering the whole population is exact, and a large fraction narrows the interval
+    assert wilson_interval(30, 100, population=100) == (0.3, 0.3)
+    plain = wilson_interval(300, 1000)
+    corrected = wilson_interval(300, 1000, population=2000)
+    assert plain[0] < corrected[0] < 0.3 < corrected[1] < plain[1]
+
+
+@pytest.mark.parametrize('population', [None, 4000])
+def test_wilson_interval_coverage(population):
+    # Samples without replacement from a population where exactly 30% are OTP
+    rng = np.random.default_rng(0)
+    rows = np.zeros(population or 100_000, dtype=bool)
+    rows[:len(rows) * 3 // 10] = True
+    trials, n = 1000, 1500
+    covered = 0
+    for _ in range(trials):
+        successes = int(rng.choice(rows, n, replace=False).sum())
+        low, high = wilson_interval(successes, n, 0.95, population=population)
+        covered += low <= 0.3 <= high
+    # 95% nominal; the binomial spread of 1000 trials is about +-1.4%
+    assert 0.92 <= covered / trials <= 0.98
+
+
+def test_reservoir_sample_is_uniform():
+    population, size, trials = 50, 10, 3000
+    included = np.zeros(population)
+    for seed in range(trials):
+        reservoir = ReservoirSample(size, seed=seed)
+        # Uneven chunks and a merged second stream
+        reservoir.add(range(0, 7)).add(range(7, 30))
+        reservoir.merge(ReservoirSample(size, seed=seed + trials).add(range(30, population)))
+        assert reservoir.seen == population
+        sample = reservoir.sample
+        assert len(sample) == len(set(sample)) == size
+        included[sample] += 1
+    expected = trials * size / population
+    # Each row's inclusion count is Binomial(3000, 0.2): sd ~22
+    assert np.abs(included - expected).max() < 5 * math.sqrt(expected * (1 - size / population))
+
+
+def test_reservoir_sample_is_repeatable_for_a_seed():
+    values = [f"message {i}" for i in range(1000)]
+    
+    def sample(seed, chunk):
+        reservoir = ReservoirSample(25, seed=seed)
+        for start in range(0, len(values), chunk):
+            reservoir.add(values[start:start + chunk])
+        return reservoir.sample
+    
+    assert sample(7, 100) == sample(7, 100)
+    # The keys come from one random stream, so chunking doesn't change the sample
+    assert sorted(sample(7, 100)) == sorted(sample(7, 333))
+    assert sorted(sample(7, 100)) != sorted(sample(8, 100))
+    assert ReservoirSample(25, seed=1).add(values[:10]).sample == values[:10]
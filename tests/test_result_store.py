@@ -0,0 +1,76 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from result_store import ResultStore
+
+
+def results_frame(source, n=6):
+    return pd.DataFrame({
+        'message': [f"{source} message {i}" for i in range(n)],
+        'category': ['OTP' if i % 3 == 0 else 'Other' for i in range(n)],
+        'campaign_id': [i % 2 for i in range(n)],
+        'template': [f"template {i % 3}" for i in range(n)],
+        'source_file': source,
+        'SentDate': pd.date_range('2025-01-01 22:00', periods=n, freq='h'),
+        'ErrorName': ['Failed' if i == 1 else '' for i in range(n)],
+    })
+
+
+def add(store, df, **options):
+    return store.add(df, 'message', 'category', df['template'], 'source_file', 'SentDate', **options)
+
+
+def test_counts_samples_and_templates(tmp_path):
+    df = results_frame('a.csv')
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        assert add(store, df) == 6
+        assert len(store) == 6
+        assert store.counts().set_index('category')['messages'].to_dict() == {'OTP': 2, 'Other': 4}
+        assert store.counts(by='campaign_id').set_index('campaign_id')['messages'].to_dict() == {0: 3, 1: 3}
+        by_date = store.counts(by=['date', 'category'], category=['OTP', 'Other'])
+        assert by_date.groupby('date')['messages'].sum().to_dict() == {'2025-01-01': 2, '2025-01-02': 4}
+        assert store.counts(start='2025-01-02').set_index('category')['messages'].sum() == 4
+        
+        sample = store.sample(2, category='Other')
+        assert sample['message'].tolist() == ['a.csv message 1', 'a.csv message 2']
+        assert sample['template'].tolist() == ['template 1', 'template 2']
+        top = store.top_templates(5, category='OTP')
+        assert top['template'].tolist() == ['template 0'] and top['messages'].tolist() == [2]
+        with pytest.raises(ValueError):
+            store.counts(message='x')
+
+
+def test_reloading_a_file_replaces_its_rows(tmp_path):
+    path = str(tmp_path / 'results.db')
+    with ResultStore(path) as store:
+        add(store, results_frame('a.csv'))
+        add(store, results_frame('b.csv'))
+        add(store, results_frame('a.csv', n=3))
+        assert store.counts(by='source_file').set_index('source_file')['messages'].to_dict() == {'b.csv': 6,
+                                                                                              'a.csv': 3}
+        # Templates are stored once however often they are loaded
+        assert store.connection.execute('SELECT COUNT(*) FROM templates').fetchone()[0] == 3
+
+
+def test_failed_reload_keeps_the_previous_rows(tmp_path):
+    path = str(tmp_path / 'results.db')
+    with ResultStore(path, batch_rows=2) as store:
+        add(store, results_frame('a.csv'))
+        broken = results_frame('a.csv', n=5)
+        # A value sqlite3 can't bind fails the third insert batch, after the delete
+        broken['rule_pack_hash'] = ['h', 'h', 'h', 'h', {'not': 'bindable'}]
+        with pytest.raises(sqlite3.Error):
+            add(store, broken)
+    with ResultStore(path) as store:
+        assert len(store) == 6
+        assert store.sample(10)['message'].tolist() == [f"a.csv message {i}" for i in range(6)]
+
+
+def test_frames_without_campaigns_store_null(tmp_path):
+    df = results_frame('a.csv').drop(columns='campaign_id')
+    with ResultStore(str(tmp_path / 'results.db')) as store:
+        add(store, df)
+        counts = store.counts(by='campaign_id')
+        assert counts['campaign_id'].isna().all() and counts['messages'].tolist() == [6]
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from categorization import SMSCategorizer
+from results_index import ResultsIndex
+
+MESSAGES = [
+    "Your Fido security code is 123456.",
+    "Your Fido security code is 654321.",
+    "Your loan of GHS 500 is overdue. Pay today.",
+    "your fido SECURITY code is 111111.",
+    "Your loan of GHS 20 is overdue. Pay today.",
+    "Top up your account now",
+    "Your Fido security code is 123456.",
+]
+CATEGORIES = ['OTP', 'OTP', 'Recovery', 'Other', 'Recovery', 'Other', 'OTP']
+
+
+def make_index(**options):
+    return ResultsIndex(MESSAGES, CATEGORIES, SMSCategorizer(), **options)
+
+
+def expected_rows(index, category=None, template_id=None, search=None):
+    rows = []
+    for i, (message, predicted) in enumerate(zip(MESSAGES, CATEGORIES)):
+        if category is not None and predicted != category:
+            continue
+        if template_id is not None and index.template_codes[i] != template_id:
+            continue
+        if search is not None and search.strip().lower() not in message.lower():
+            continue
+        rows.append(i)
+    return rows
+
+
+def test_positions_intersect_every_filter():
+    index = make_index()
+    index.build_templates()
+    otp_template = index.template_codes[0]
+    assert index.template_codes[3] == otp_template, "case differences share a template"
+    for category in (None, 'OTP', 'Other', 'Recovery', 'Missing'):
+        for template_id in (None, otp_template, index.template_codes[2], 99):
+            for search in (None, '', 'SECURITY', ' 123456 ', 'overdue', 'nothing'):
+                rows = index.positions(category=category, template_id=template_id, search=search)
+                expected = expected_rows(index, category, template_id, search or None)
+                assert rows.tolist() == expected, (category, template_id, search)
+    assert index.positions(category='Other', template_id=otp_template).tolist() == [3]
+    assert index.positions(category='OTP', search='123456').tolist() == [0, 6]
+
+
+def test_small_cache_evicts_without_changing_results():
+    index = make_index(cache_size=2)
+    first = index.positions(search='fido').tolist()
+    for category in ('OTP', 'Other', 'Recovery'):
+        index.positions(category=category)
+    assert len(index._cache) == 2
+    assert index.positions(search='fido').tolist() == first == [0, 1, 3, 6]
+
+
+def test_top_templates_follow_the_filters():
+    index = make_index()
+    templates = index.build_templates()
+    assert templates['messages'].sum() == len(MESSAGES)
+    top = index.top_templates()
+    assert top['messages'].tolist() == [4, 2, 1]
+    otp_template = top['template_id'].iloc[0]
+    
+    by_category = index.top_templates(category='Other')
+    assert sorted(by_category['messages'].tolist()) == [1, 1]
+    assert otp_template in by_category['template_id'].tolist()
+    searched = index.top_templates(category='OTP', search='654321')
+    assert searched[['template_id', 'messages']].values.tolist() == [[otp_template, 1]]
+    assert index.top_templates(n=1)['template_id'].tolist() == [otp_template]
+    # Templates without matching rows are left out
+    assert index.top_templates(search='nothing').empty
+
+
+def test_page_bounds():
+    index = make_index()
+    frame, total = index.page(0, 3)
+    assert total == len(MESSAGES)
+    assert frame['Row'].tolist() == [1, 2, 3]
+    assert list(frame.columns) == ['Row', 'Message', 'Predicted_Category']
+    
+    last, total = index.page(2, 3)
+    assert (last['Row'].tolist(), total) == ([7], 7)
+    beyond, total = index.page(5, 3)
+    assert beyond.empty and total == 7
+    
+    index.build_templates()
+    filtered, total = index.page(1, 1, category='Recovery')
+    assert total == 2
+    assert filtered[['Row', 'Message']].values.tolist() == [[5, MESSAGES[4]]]
+    assert filtered['Template'].tolist() == [index.template_texts[index.template_codes[4]]]
+    empty, total = index.page(0, 50, category='Missing')
+    assert empty.empty and total == 0
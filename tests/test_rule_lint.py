@@ -0,0 +1,73 @@
+import re
+import time
+import warnings
+
+import pytest
+
+from categorization import SMSCategorizer
+from rule_lint import lint_pattern, lint_rules
+from rule_pack import rule_pack_from_bytes
+
+NESTED = r'(a+)+$'
+
+
+def codes(pattern):
+    return [finding['code'] for finding in lint_pattern(pattern)]
+
+
+def test_nested_quantifier_is_an_error():
+    findings = lint_pattern(NESTED)
+    assert [(f['severity'], f['code']) for f in findings] == [('error', 'nested-quantifier')]
+    # The stdlib engine really does backtrack exponentially on it
+    started = time.perf_counter()
+    re.search(NESTED, 'a' * 18 + '!')
+    assert time.perf_counter() - started > 10 * _linear_time()
+
+
+def _linear_time():
+    started = time.perf_counter()
+    re.search(r'a+$', 'a' * 18 + '!')
+    return max(time.perf_counter() - started, 1e-6)
+
+
+def test_chained_wildcards_are_warnings():
+    assert codes(r'due.*pay.*loan') == ['chained-wildcards']
+    assert 'O(n^3)' in lint_pattern(r'due.*pay.*loan')[0]['message']
+    assert 'O(n^2)' in lint_pattern(r'^due.*pay.*loan')[0]['message']
+    assert lint_pattern(r'due.*pay.*loan')[0]['severity'] == 'warning'
+
+
+@pytest.mark.parametrize('pattern', [r'verification code', r'\d{4,6}', r'due\s+\d+\s+days', r'pay.*now',
+                                     r'client id:?\s*(\w+)'])
+def test_safe_patterns_are_clean(pattern):
+    assert lint_pattern(pattern) == []
+
+
+def test_lint_rules_locates_findings():
+    findings = lint_rules({'OTP': ['code', NESTED], 'Other': ['a.*b.*c']})
+    assert [(f['category'], f['index'], f['code']) for f in findings] == [
+        ('OTP', 1, 'nested-quantifier'), ('Other', 0, 'chained-wildcards')]
+
+
+def test_findings_are_surfaced_when_a_pack_loads():
+    pack = rule_pack_from_bytes(f"""
+name: lint-test
+categories:
+  - name: Slow
+    patterns: ['{NESTED}', 'due.*pay.*loan']
+""".encode('utf-8'), cache_dir=None)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        SMSCategorizer(rule_pack=pack)
+    messages = [str(w.message) for w in caught]
+    assert any('backtrack exponentially: Slow#0' in m for m in messages)
+    assert any('polynomial backtracking): Slow#1' in m for m in messages)
+
+
+def test_default_pack_warnings_are_surfaced():
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        categorizer = SMSCategorizer()
+    warning_count = sum(f['severity'] == 'warning' for f in categorizer.rule_lint)
+    assert warning_count
+    assert any(str(w.message).startswith(f"{warning_count} rule pattern(s) chain") for w in caught)
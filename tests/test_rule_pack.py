@@ -0,0 +1,65 @@
+import json
+import os
+
+from rule_pack import CACHE_FORMAT, DEFAULT_RULE_PACK, rule_pack_from_bytes
+
+
+def read_default_pack():
+    with open(DEFAULT_RULE_PACK, 'rb') as f:
+        return f.read()
+
+
+def test_cache_is_plain_json(tmp_path):
+    data = read_default_pack()
+    pack = rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+    files = os.listdir(tmp_path)
+    assert files == [f"{pack.content_hash}.json"]
+    with open(tmp_path / files[0], encoding='utf-8') as f:
+        cached = json.load(f)
+    assert cached['format'] == CACHE_FORMAT
+    assert cached['lint'] == pack.lint
+    # The rules themselves are never cached
+    assert 'spec' not in cached
+
+
+def test_cached_pack_matches_parsed_pack(tmp_path):
+    data = read_default_pack()
+    parsed = rule_pack_from_bytes(data, cache_dir=None)
+    rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+    cached = rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+    assert cached.rule_keys == parsed.rule_keys
+    assert cached.priorities == parsed.priorities
+    assert cached.lint == parsed.lint
+
+
+def test_corrupt_or_stale_cache_is_ignored(tmp_path):
+    data = read_default_pack()
+    pack = rule_pack_from_bytes(data, cache_dir=None)
+    path = tmp_path / f"{pack.content_hash}.json"
+    for content in ('not json', '[1, 2]', json.dumps({'format': CACHE_FORMAT - 1, 'lint': []}),
+                    json.dumps({'format': CACHE_FORMAT}), json.dumps({'format': CACHE_FORMAT, 'spec': {}})):
+        path.write_text(content, encoding='utf-8')
+        loaded = rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+        assert loaded.rule_keys == pack.rule_keys
+        assert loaded.lint == pack.lint
+
+
+def test_tampered_cache_cannot_change_the_rules(tmp_path):
+    data = read_default_pack()
+    pack = rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+    path = tmp_path / f"{pack.content_hash}.json"
+    cached = json.loads(path.read_text(encoding='utf-8'))
+    
+    # A swapped spec is ignored: the rules always come from the hashed YAML
+    cached['spec'] = {'name': 'evil', 'version': 1, 'fallback_category': 'Other',
+                      'categories': [{'name': 'Evil', 'priority': 1, 'patterns': [{'pattern': '.', 'weight': 1}]}]}
+    path.write_text(json.dumps(cached), encoding='utf-8')
+    loaded = rule_pack_from_bytes(data, cache_dir=str(tmp_path))
+    assert loaded.rule_keys == pack.rule_keys
+    
+    # Findings that don't point at this pack's rules are recomputed
+    for lint in ([{'severity': 'error', 'code': 'x', 'message': 'x', 'category': 'Evil', 'index': 0,
+                   'pattern': '.'}], [{'severity': 'fatal'}], 'none'):
+        cached['lint'] = lint
+        path.write_text(json.dumps(cached), encoding='utf-8')
+        assert rule_pack_from_bytes(data, cache_dir=str(tmp_path)).lint == pack.lint
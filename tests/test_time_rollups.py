@@ -0,0 +1,70 @@
+import pandas as pd
+
+from time_rollups import TimeRollup
+
+
+def test_add_counts_messages_per_hour():
+    rollup = TimeRollup().add(
+        ['2025-01-01 10:05', '2025-01-01 10:55', '2025-01-01 11:00', None, 'not a date'],
+        ['OTP', 'OTP', 'OTP', 'OTP', 'Other'],
+        ['a', 'a', 'a', 'a', 'b'],
+    )
+    frame = rollup.to_frame()
+    assert frame['window'].tolist() == [pd.Timestamp('2025-01-01 10:00'), pd.Timestamp('2025-01-01 11:00')]
+    assert frame['message_count'].tolist() == [2, 1]
+    assert (rollup.total_messages, rollup.undated) == (3, 2)
+
+
+def test_aware_and_naive_timestamps_share_utc_windows():
+    rollup = TimeRollup()
+    rollup.add(pd.Series(pd.to_datetime(['2025-01-01 12:30']).tz_localize('Africa/Lagos')), ['OTP'], ['a'])
+    rollup.add(pd.to_datetime(['2025-01-01 11:10']), ['OTP'], ['a'])
+    # Offsets that differ from row to row, and rows with and without one
+    rollup.add(['2025-01-01T13:45:00+02:00', '2025-01-01 11:20'], ['OTP', 'OTP'], ['a', 'a'])
+    frame = rollup.to_frame()
+    assert frame['window'].dt.tz is None
+    assert frame['window'].tolist() == [pd.Timestamp('2025-01-01 11:00')]
+    assert frame['message_count'].tolist() == [4]
+    
+    other = TimeRollup().add(pd.Series(pd.to_datetime(['2025-01-01 06:15']).tz_localize('US/Eastern')), ['OTP'], ['a'])
+    assert rollup.merge(other).to_frame()['message_count'].tolist() == [5]
+    # Aware query bounds are compared in UTC too
+    assert rollup.query(start=pd.Timestamp('2025-01-01 12:00', tz='Africa/Lagos')).sum().sum() == 5
+    assert rollup.query(end='2025-01-01T12:00+01:00').empty
+
+
+def test_merge_matches_a_single_add():
+    timestamps = pd.Timestamp('2025-01-01') + pd.to_timedelta(range(0, 86400 * 2, 1800), unit='s')
+    categories = ['OTP', 'Other', 'Recovery'] * (len(timestamps) // 3)
+    campaigns = ['a', 'b'] * (len(timestamps) // 2)
+    whole = TimeRollup().add(timestamps, categories, campaigns)
+    half = len(timestamps) // 2
+    parts = TimeRollup().add(timestamps[:half], categories[:half], campaigns[:half]).merge(
+        TimeRollup().add(timestamps[half:], categories[half:], campaigns[half:]))
+    assert parts.counts.equals(whole.counts)
+
+
+def test_resample_and_merge_across_granularities():
+    hourly = TimeRollup().add(['2025-01-01 01:00', '2025-01-01 23:00', '2025-01-02 05:00', None],
+                              ['OTP'] * 4, ['a'] * 4)
+    daily = hourly.resample('D')
+    assert daily.freq == 'D'
+    assert daily.to_frame()['message_count'].tolist() == [2, 1]
+    assert daily.undated == 1
+    # A finer rollup is coarsened to the target's windows
+    merged = TimeRollup('D').merge(hourly)
+    assert merged.counts.equals(daily.counts)
+    assert hourly.query(freq='D')['OTP'].tolist() == [2, 1]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    rollup = TimeRollup().add(['2025-01-01 01:00', '2025-01-01T05:00:00+02:00', 'bad'],
+                              ['OTP', 'Other', 'OTP'], ['NA', '12', 'a'])
+    path = str(tmp_path / 'rollup.csv')
+    rollup.save(path)
+    loaded = TimeRollup.load(path)
+    assert loaded.freq == rollup.freq
+    assert loaded.undated == 1
+    # Campaign labels that look like numbers or missing values stay strings
+    assert loaded.counts.equals(rollup.counts)
+    assert loaded.merge(rollup).total_messages == 4
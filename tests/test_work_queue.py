@@ -0,0 +1,171 @@
+import json
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from batch_sms_categorizer import merge_distributed, merge_template_trackers, run_distributed_worker, track_templates
+from categorization import SMSCategorizer
+from heavy_hitters import TemplateTracker
+from work_queue import WorkQueue, merge_outputs
+
+
+def make_queue(tmp_path, shards=2, **options):
+    files = []
+    for i in range(shards):
+        path = tmp_path / f"in{i}.csv"
+        pd.DataFrame({'message': [f"file {i} message {j}" for j in range(3)]}).to_csv(path, index=False)
+        files.append(str(path))
+    queue = WorkQueue(str(tmp_path / 'queue'), **options)
+    queue.initialize(files, 'hash')
+    return queue
+
+
+def shard_results(shard):
+    return pd.DataFrame({'message': [shard['id']], 'predicted_category': ['Other']})
+
+
+def age_claim(queue, shard_id, seconds):
+    path = queue._path('claims', f"{shard_id}.json")
+    with open(path) as f:
+        claim = json.load(f)
+    claim['heartbeat'] -= seconds
+    with open(path, 'w') as f:
+        json.dump(claim, f)
+
+
+def test_live_claims_are_not_taken(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=60)
+    first = queue.claim('a')
+    second = queue.claim('b')
+    assert first['id'] != second['id']
+    assert queue.claim('c') is None
+    assert queue.status()['running'] == 2
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = make_queue(tmp_path, shards=1, lease_seconds=60)
+    shard = queue.claim('crashed')
+    age_claim(queue, shard['id'], 61)
+    reclaimed = queue.claim('rescuer')
+    assert reclaimed['id'] == shard['id']
+    assert reclaimed['reclaimed_from'] == 'crashed'
+    assert reclaimed['attempt'] == 2
+    # The original worker has lost its claim and can't finish first
+    assert not queue.heartbeat(shard['id'], 'crashed')
+    assert queue.complete(shard['id'], 'rescuer', shard_results(shard))
+    assert not queue.complete(shard['id'], 'crashed', shard_results(shard))
+    assert queue.status() == {'done': 1, 'total': 1}
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    queue = make_queue(tmp_path, shards=1, lease_seconds=60)
+    shard = queue.claim('a')
+    age_claim(queue, shard['id'], 59)
+    assert queue.heartbeat(shard['id'], 'a')
+    time.sleep(0.01)
+    assert queue.claim('b') is None
+
+
+def test_shards_fail_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, shards=1, max_attempts=2)
+    for worker in ('a', 'b'):
+        shard = queue.claim(worker)
+        queue.release(shard['id'], worker)
+    assert queue.claim('c') is None
+    assert queue.status()['failed'] == 1
+
+
+def test_merge_outputs_in_manifest_order(tmp_path):
+    queue = make_queue(tmp_path, shards=3)
+    shards = [queue.claim(worker) for worker in 'abc']
+    for shard, worker in reversed(list(zip(shards, 'abc'))):
+        queue.complete(shard['id'], worker, shard_results(shard))
+    total, counts = merge_outputs(queue, str(tmp_path / 'merged.csv'))
+    merged = pd.read_csv(tmp_path / 'merged.csv')
+    assert merged['message'].tolist() == [shard['id'] for shard in queue.manifest()['shards']]
+    assert (total, counts) == (3, {'Other': 3})
+
+
+def test_merge_refuses_unfinished_queue(tmp_path):
+    queue = make_queue(tmp_path)
+    with pytest.raises(RuntimeError):
+        merge_outputs(queue, str(tmp_path / 'merged.csv'))
+
+
+def test_distributed_run_matches_shards(tmp_path, messages):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    pd.DataFrame({'message': messages}).to_csv(folder / 'a.csv', index=False)
+    queue_dir = str(tmp_path / 'queue')
+    assert run_distributed_worker(str(folder), queue_dir, shard_rows=700, worker_id='w1') == 3
+    total, counts = merge_distributed(queue_dir, str(tmp_path / 'merged.csv'))
+    merged = pd.read_csv(tmp_path / 'merged.csv')
+    assert total == len(messages)
+    assert merged['message'].tolist() == messages
+    assert merged['predicted_category'].value_counts().to_dict() == counts
+
+
+def test_merge_without_manifest(tmp_path, capsys):
+    assert merge_distributed(str(tmp_path)) is None
+    assert 'not a work queue' in capsys.readouterr().out
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_shard_is_completed_not_failed(tmp_path, capsys):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    pd.DataFrame({'message': ["Your Fido security code is 123456.", "Top up your account now!"]}).to_csv(
+        folder / 'a.csv', index=False)
+    pd.DataFrame({'message': [None, None], 'ErrorName': ['x', None]}).to_csv(folder / 'b.csv', index=False)
+    queue_dir = str(tmp_path / 'queue')
+    assert run_distributed_worker(str(folder), queue_dir, worker_id='w1') == 2
+    assert WorkQueue(queue_dir).status() == {'done': 2, 'total': 2}
+    total, counts = merge_distributed(queue_dir, str(tmp_path / 'merged.csv'))
+    assert total == 2
+    assert sum(counts.values()) == 2
+    assert len(pd.read_csv(tmp_path / 'merged.csv')) == 2
+
+
+def test_merge_allow_failed_skips_failed_shards(tmp_path, capsys):
+    queue = make_queue(tmp_path, shards=2)
+    good = queue.claim('a')
+    queue.complete(good['id'], 'a', shard_results(good))
+    for worker in ('a', 'b', 'c'):
+        bad = queue.claim(worker)
+        queue.release(bad['id'], worker)
+    assert queue.failed() == [bad['id']]
+    
+    assert merge_distributed(queue.directory, str(tmp_path / 'merged.csv')) is None
+    out = capsys.readouterr().out
+    assert bad['id'] in out and '--allow-failed' in out
+    assert not (tmp_path / 'merged.csv').exists()
+    
+    total, counts = merge_distributed(queue.directory, str(tmp_path / 'merged.csv'), allow_failed=True)
+    assert (total, counts) == (1, {'Other': 1})
+    assert pd.read_csv(tmp_path / 'merged.csv')['message'].tolist() == [good['id']]
+    assert bad['id'] in capsys.readouterr().out
+
+
+def test_merged_template_tracker_matches_a_single_run(tmp_path, messages, capsys):
+    folder = tmp_path / 'in'
+    folder.mkdir()
+    pd.DataFrame({'message': messages}).to_csv(folder / 'a.csv', index=False)
+    queue_dir = str(tmp_path / 'queue')
+    run_distributed_worker(str(folder), queue_dir, shard_rows=700, worker_id='w1')
+    merged = merge_template_trackers(WorkQueue(queue_dir))
+    
+    categorizer = SMSCategorizer()
+    results = pd.read_csv(folder / 'a.csv').assign(
+        predicted_category=categorizer.categorize_processed([categorizer.preprocess_text(m) for m in messages]))
+    whole = TemplateTracker()
+    track_templates(whole, results, categorizer)
+    assert merged.total == whole.total == len(messages)
+    assert (merged.sketch.table == whole.sketch.table).all()
+    for category in results['predicted_category'].unique():
+        # Templates with tied counts may come back in either order
+        assert [n for _, n in merged.top_templates(category, 3)] == [n for _, n in whole.top_templates(category, 3)]
+    
+    merge_distributed(queue_dir, str(tmp_path / 'merged.csv'))
+    assert 'Sample Templates by Category' in capsys.readouterr().out
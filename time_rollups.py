@@ -0,0 +1,143 @@
+import os
+
+import pandas as pd
+
+ROLLUP_KEYS = ['window', 'category', 'campaign']
+
+
+def _to_utc_naive(timestamps):
+    """Parse timestamps into a UTC-naive datetime Series (NaT where unparseable)
+
+    Timezone-aware values are converted to UTC and naive ones are taken to already be
+    UTC, so batches from sources with and without offsets land in the same windows.
+    """
+    values = pd.Series(timestamps).reset_index(drop=True)
+    parsed = pd.to_datetime(values, errors='coerce', utc=True)
+    # The fast path infers one format from the first value; strings that don't fit
+    # it (e.g. a mix of offsets and none) are parsed again one by one
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors='coerce', utc=True, format='mixed')
+    return parsed.dt.tz_localize(None)
+
+
+def _utc_naive_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+
+class TimeRollup:
+    """Pre-aggregated message counts per (time window, category, campaign)
+
+    Counts are kept at a base granularity (hourly by default) and can be rolled up to
+    coarser windows with ``resample('D')``. Rollups from different batches or files
+    are combined with ``merge``, so dashboards can query days of traffic from the
+    rollup alone instead of rescanning raw messages.
+
+    Campaign IDs from clustering are only meaningful within one analysis run, so
+    campaigns are keyed by a stable label (the campaign's most common template).
+    Windows are UTC-naive: aware timestamps are converted to UTC when added.
+    """
+
+    def __init__(self, freq='h', counts=None):
+        self.freq = freq
+        if counts is None:
+            index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), [], []], names=ROLLUP_KEYS)
+            counts = pd.Series([], index=index, dtype='int64', name='message_count')
+        self.counts = counts
+        # Rows whose timestamp was missing or unparseable, which no window can hold
+        self.undated = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def total_messages(self):
+        return int(self.counts.sum())
+
+    def add(self, timestamps, categories, campaigns):
+        """Count messages into their windows and merge them into the rollup"""
+        windows = _to_utc_naive(timestamps)
+        batch = pd.DataFrame({
+            'window': windows.dt.floor(self.freq),
+            'category': pd.Series(categories).astype(str).to_numpy(),
+            'campaign': pd.Series(campaigns).astype(str).to_numpy(),
+        })
+        dated = batch['window'].notna()
+        self.undated += int((~dated).sum())
+        counts = batch[dated].groupby(ROLLUP_KEYS).size().rename('message_count')
+        self._combine(counts)
+        return self
+
+    def merge(self, other):
+        """Add another rollup's counts into this one (in place)
+
+        ``other`` may be at the same or a finer granularity than this rollup.
+        """
+        if other.freq != self.freq:
+            other = other.resample(self.freq)
+        self._combine(other.counts)
+        self.undated += other.undated
+        return self
+
+    def _combine(self, counts):
+        if len(counts) == 0:
+            return
+        combined = pd.concat([self.counts, counts]) if len(self.counts) else counts
+        self.counts = combined.groupby(level=ROLLUP_KEYS).sum().astype('int64').rename('message_count')
+
+    def resample(self, freq):
+        """Return a new rollup with windows coarsened to ``freq`` (e.g. 'D')"""
+        frame = self.to_frame()
+        frame['window'] = frame['window'].dt.floor(freq)
+        rolled = TimeRollup(freq)
+        rolled._combine(frame.groupby(ROLLUP_KEYS)['message_count'].sum())
+        rolled.undated = self.undated
+        return rolled
+
+    def query(self, start=None, end=None, freq=None, by=('category',), category=None):
+        """Return message volumes per window as a (window x group) table
+
+        ``start``/``end`` bound the windows (end exclusive), ``freq`` rolls up to a
+        coarser window, ``by`` picks the columns ('category', 'campaign' or both) and
+        ``category`` restricts the result to one category.
+        """
+        rollup = self.resample(freq) if freq and freq != self.freq else self
+        frame = rollup.to_frame()
+        if start is not None:
+            frame = frame[frame['window'] >= _utc_naive_timestamp(start)]
+        if end is not None:
+            frame = frame[frame['window'] < _utc_naive_timestamp(end)]
+        if category is not None:
+            frame = frame[frame['category'] == category]
+        by = [by] if isinstance(by, str) else list(by)
+        table = frame.groupby(['window'] + by)['message_count'].sum()
+        if not by:
+            return table.to_frame()
+        return table.unstack(by, fill_value=0)
+
+    def to_frame(self):
+        """Return the rollup as a flat (window, category, campaign, message_count) frame"""
+        return self.counts.reset_index()
+
+    def save(self, path):
+        """Write the rollup to CSV (atomically, so a reader never sees a partial file)"""
+        frame = self.to_frame()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(f"# freq={self.freq} undated={self.undated}\n")
+            frame.to_csv(f, index=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            header = dict(item.split('=', 1) for item in f.readline()[1:].split())
+            frame = pd.read_csv(f, parse_dates=['window'], dtype={'category': str, 'campaign': str},
+                                keep_default_na=False)
+        rollup = cls(header.get('freq', 'h'))
+        rollup._combine(frame.groupby(ROLLUP_KEYS)['message_count'].sum())
+        rollup.undated = int(header.get('undated', 0))
+        return rollup
@@ -0,0 +1,321 @@
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+from filelock import FileLock, Timeout
+
+MANIFEST = 'manifest.json'
+
+
+def _write_json_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def count_csv_rows(path, chunk_rows=500_000):
+    """Count data rows of a CSV (quoted newlines included) by parsing only its first column"""
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=chunk_rows))
+
+
+class WorkQueue:
+    """Work queue in a directory shared between hosts (NFS or similar)
+
+    Layout::
+
+        manifest.json      shards to process and the rule pack hash they must use
+        locks/<shard>.lock file locks guarding each shard's claim
+        claims/<shard>.json  owner and heartbeat of the current claim
+        done/<shard>.json  completion record with the output path and category counts
+        outputs/<shard>.csv  per-shard results
+
+    A worker claims a shard under its lock, renews the claim's heartbeat while it
+    works, writes the output atomically and then records completion. A claim whose
+    heartbeat is older than ``lease_seconds`` belongs to a crashed or stuck worker
+    and can be reclaimed. Heartbeats use wall-clock time, so hosts need
+    synchronised clocks (NTP).
+    """
+
+    def __init__(self, directory, lease_seconds=120, heartbeat_seconds=15, max_attempts=3):
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        for sub in ('locks', 'claims', 'done', 'outputs'):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    def _path(self, sub, name):
+        return os.path.join(self.directory, sub, name)
+
+    def lock(self, name, timeout=-1):
+        return FileLock(self._path('locks', f"{name}.lock"), timeout=timeout)
+
+    def initialize(self, files, rule_pack_hash, shard_rows=None):
+        """Create the manifest, or check an existing one was built with the same rules
+
+        Every worker may call this; the first one plans the shards. With
+        ``shard_rows`` CSV files are split into row ranges of that size.
+        """
+        with self.lock('manifest'):
+            manifest = self.manifest()
+            if manifest is not None:
+                if manifest['rule_pack_hash'] != rule_pack_hash:
+                    raise ValueError(f"Queue was created for rule pack {manifest['rule_pack_hash']}, "
+                                     f"this worker has {rule_pack_hash}")
+                return manifest
+            shards = []
+            for file_path in sorted(files):
+                ranges = [(None, None)]
+                if shard_rows and file_path.endswith('.csv'):
+                    total = count_csv_rows(file_path)
+                    ranges = [(start, min(start + shard_rows, total)) for start in range(0, total, shard_rows)]
+                for start, stop in ranges:
+                    name = re.sub(r'[^\w.-]', '_', os.path.basename(file_path))
+                    suffix = f"-{start}-{stop}" if start is not None else ''
+                    shards.append({'id': f"{len(shards):05d}-{name}{suffix}", 'path': os.path.abspath(file_path),
+                                   'start': start, 'stop': stop})
+            manifest = {'rule_pack_hash': rule_pack_hash, 'created_at': time.time(), 'shards': shards}
+            _write_json_atomic(os.path.join(self.directory, MANIFEST), manifest)
+            return manifest
+
+    def manifest(self):
+        return _read_json(os.path.join(self.directory, MANIFEST))
+
+    def is_done(self, shard_id):
+        return os.path.exists(self._path('done', f"{shard_id}.json"))
+
+    def done_record(self, shard_id):
+        """Completion record of a finished shard (None while it isn't done)"""
+        return _read_json(self._path('done', f"{shard_id}.json"))
+
+    def output_path(self, shard_id):
+        return self._path('outputs', f"{shard_id}.csv")
+
+    def _claim_is_live(self, claim, now):
+        return claim is not None and now - claim['heartbeat'] < self.lease_seconds
+
+    def claim(self, worker_id):
+        """Claim the next pending (or abandoned) shard; returns it or None"""
+        for shard in self.manifest()['shards']:
+            if self.is_done(shard['id']):
+                continue
+            try:
+                with self.lock(shard['id'], timeout=0):
+                    if self.is_done(shard['id']):
+                        continue
+                    claim_path = self._path('claims', f"{shard['id']}.json")
+                    claim = _read_json(claim_path)
+                    now = time.time()
+                    if self._claim_is_live(claim, now) and claim['worker'] != worker_id:
+                        continue
+                    attempts = (claim or {}).get('attempts', 0)
+                    if attempts >= self.max_attempts:
+                        continue
+                    _write_json_atomic(claim_path, {
+                        'worker': worker_id, 'claimed_at': now, 'heartbeat': now, 'attempts': attempts + 1,
+                        'reclaimed_from': claim['worker'] if claim else None,
+                    })
+                    return dict(shard, attempt=attempts + 1, reclaimed_from=claim['worker'] if claim else None)
+            except Timeout:
+                # Another worker is claiming this shard right now
+                continue
+        return None
+
+    def heartbeat(self, shard_id, worker_id):
+        """Renew a claim; returns False if the shard was reclaimed by another worker"""
+        with self.lock(shard_id):
+            claim_path = self._path('claims', f"{shard_id}.json")
+            claim = _read_json(claim_path)
+            if claim is None or claim['worker'] != worker_id:
+                return False
+            claim['heartbeat'] = time.time()
+            _write_json_atomic(claim_path, claim)
+            return True
+
+    def complete(self, shard_id, worker_id, results, extra=None):
+        """Write a shard's results and mark it done; returns False if another worker finished first
+
+        ``extra`` holds further JSON-serialisable fields for the completion record.
+        """
+        output_path = self.output_path(shard_id)
+        # Each attempt writes to its own temporary file, so concurrent attempts never mix
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            results.to_csv(f, index=False)
+        with self.lock(shard_id):
+            if self.is_done(shard_id):
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, output_path)
+            counts = results['predicted_category'].value_counts()
+            _write_json_atomic(self._path('done', f"{shard_id}.json"), {
+                'worker': worker_id, 'finished_at': time.time(), 'rows': len(results),
+                'output': os.path.basename(output_path),
+                'counts': {str(k): int(v) for k, v in counts.items()},
+                **(extra or {}),
+            })
+            try:
+                os.remove(self._path('claims', f"{shard_id}.json"))
+            except OSError:
+                pass
+            return True
+
+    def release(self, shard_id, worker_id):
+        """Give a shard back after a failure; it is retried until max_attempts"""
+        with self.lock(shard_id):
+            claim_path = self._path('claims', f"{shard_id}.json")
+            claim = _read_json(claim_path)
+            if claim is not None and claim['worker'] == worker_id:
+                claim['heartbeat'] = 0
+                _write_json_atomic(claim_path, claim)
+
+    def state(self, shard_id, now=None):
+        """State of one shard: done, running (live claim), failed or pending"""
+        if self.is_done(shard_id):
+            return 'done'
+        claim = _read_json(self._path('claims', f"{shard_id}.json"))
+        if self._claim_is_live(claim, time.time() if now is None else now):
+            return 'running'
+        if claim is not None and claim.get('attempts', 0) >= self.max_attempts:
+            return 'failed'
+        return 'pending'
+
+    def status(self):
+        """Count shards by state: done, running (live claim), failed, pending"""
+        now = time.time()
+        shards = self.manifest()['shards']
+        states = Counter(self.state(shard['id'], now) for shard in shards)
+        states['total'] = len(shards)
+        return dict(states)
+
+    def failed(self):
+        """IDs of the shards that used up their attempts, in manifest order"""
+        now = time.time()
+        return [shard['id'] for shard in self.manifest()['shards'] if self.state(shard['id'], now) == 'failed']
+
+
+class Heartbeat:
+    """Renews a claim from a background thread while a shard is being processed"""
+
+    def __init__(self, queue, shard_id, worker_id):
+        self.queue = queue
+        self.shard_id = shard_id
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"heartbeat-{shard_id}")
+
+    def _run(self):
+        while not self._stop.wait(self.queue.heartbeat_seconds):
+            if not self.queue.heartbeat(self.shard_id, self.worker_id):
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def run_worker(queue, process_shard, worker_id=None, wait=True, poll_seconds=5, log=print, summarize=None):
+    """Claim and process shards until none are left
+
+    ``process_shard(shard)`` returns the results DataFrame for one shard (empty for
+    a shard without messages), or None if it failed. ``summarize(results)`` may
+    return extra fields for the shard's completion record. With ``wait`` the worker
+    keeps polling while other workers hold live claims, so it can take over their
+    shards if they crash. Returns the number of shards this worker completed.
+    """
+    worker_id = worker_id or default_worker_id()
+    completed = 0
+    while True:
+        shard = queue.claim(worker_id)
+        if shard is None:
+            status = queue.status()
+            if wait and status.get('running', 0):
+                time.sleep(poll_seconds)
+                continue
+            return completed
+        if shard['reclaimed_from'] and shard['reclaimed_from'] != worker_id:
+            log(f"♻️  {worker_id} reclaimed {shard['id']} from {shard['reclaimed_from']}")
+        log(f"🔒 {worker_id} claimed {shard['id']} (attempt {shard['attempt']})")
+        try:
+            with Heartbeat(queue, shard['id'], worker_id) as heartbeat:
+                results = process_shard(shard)
+                extra = summarize(results) if summarize is not None and results is not None else None
+        except Exception as e:
+            log(f"❌ {worker_id} failed on {shard['id']}: {e}")
+            results = None
+        if results is None:
+            queue.release(shard['id'], worker_id)
+            continue
+        if heartbeat.lost.is_set():
+            log(f"⚠️  {worker_id} lost its claim on {shard['id']} while processing")
+        if queue.complete(shard['id'], worker_id, results, extra):
+            completed += 1
+            log(f"✅ {worker_id} finished {shard['id']} ({len(results)} messages)")
+
+
+def merge_outputs(queue, output_file, skip=()):
+    """Concatenate every shard output (in manifest order) into one CSV and sum the counts
+
+    Outputs are streamed file by file, so memory use doesn't grow with the backfill.
+    Shards in ``skip`` (e.g. failed ones) are left out. Returns (total rows, category
+    counts); raises if other shards are still unfinished.
+    """
+    skip = set(skip)
+    shards = [shard for shard in queue.manifest()['shards'] if shard['id'] not in skip]
+    missing = [shard['id'] for shard in shards if not queue.is_done(shard['id'])]
+    if missing:
+        raise RuntimeError(f"{len(missing)} shard(s) are not finished yet, e.g. {missing[0]}")
+
+    # Input files may differ in columns (text column name, optional ErrorName), so
+    # the merged file uses the union; matching outputs are copied byte for byte
+    paths = [queue.output_path(shard['id']) for shard in shards]
+    columns = []
+    for path in paths:
+        columns.extend(c for c in pd.read_csv(path, nrows=0).columns if c not in columns)
+
+    counts = Counter()
+    total = 0
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as out:
+        out.write((pd.DataFrame(columns=columns).to_csv(index=False)).encode('utf-8'))
+        for shard, path in zip(shards, paths):
+            record = queue.done_record(shard['id'])
+            counts.update(record['counts'])
+            total += record['rows']
+            if list(pd.read_csv(path, nrows=0).columns) == columns:
+                with open(path, 'rb') as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out)
+            else:
+                for chunk in pd.read_csv(path, chunksize=200_000):
+                    out.write(chunk.reindex(columns=columns).to_csv(index=False, header=False).encode('utf-8'))
+    os.replace(tmp_path, output_file)
+    return total, dict(counts)